@@ -1,19 +1,68 @@
 import streamlit as st
-import io
+import os
 from modules.api_key_utils import get_google_api_key
-from modules.pdf_utils import extract_pdf_text, clean_extracted_text
-from modules.vectorstore_utils import create_vector_store, split_text
+from modules.pdf_utils import (
+    PDFTooLargeError,
+    clean_extracted_text,
+    extract_pdf_text,
+)
+from modules.embeddings import warm_up_embeddings
+from modules.knowledge_base import (
+    DEFAULT_GUIDE,
+    guide_filter,
+    load_or_create_knowledge_base,
+    validate_guide,
+)
+from modules.llm_cache import get_default_cache
+from modules.jobs import CANCELLED, SUCCEEDED, TIMED_OUT, get_job_manager
 from modules.llm_pipeline import setup_rag_pipeline
-from modules.resume_parser import process_resume, process_full_resume
-from modules.markdown_to_docx import convert_markdown_to_docx
+from modules.pipeline import ResumePipeline
+from modules.rate_limiter import get_rate_limiter, rate_limit_session
+from modules.resume_cache import ResumeCache, get_resume_cache
+from modules.tracing import start_trace, tracing_enabled
+from modules.markdown_to_docx import get_docx_bytes
 from st_copy_to_clipboard import st_copy_to_clipboard  # For copying the resume text
 from modules.ui_components import (
     display_original_resume,
     display_feedback,
+    display_job_progress,
     display_rewritten_resume,
+    display_timing_panel,
 )
 from st_social_media_links import SocialMediaIcons
 
+# Optionally load the embedding model when the server starts, so the first
+# "Rewrite Resume" click does not pay for it. Repeated calls are no-ops.
+if os.environ.get("EMBEDDINGS_WARMUP") == "1":
+    warm_up_embeddings()
+
+# Maximum number of Gemini calls a single rewrite keeps in flight.
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "4"))
+
+# Set LLM_CACHE=0 to always call Gemini, e.g. to get a fresh sample.
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") != "0"
+
+# The guide of the knowledge base that rewrites follow; empty searches all guides.
+RESUME_GUIDE = os.environ.get("RESUME_GUIDE", DEFAULT_GUIDE)
+
+# Fail at startup on a misspelt guide instead of rewriting without guidelines
+validate_guide(RESUME_GUIDE)
+
+# Session state that belongs to the currently uploaded PDF
+SESSION_RESULT_KEYS = (
+    "resume_text",
+    "feedback",
+    "full_resume",
+    "trace_summary",
+    "trace_rows",
+)
+
+# Stages of a rewrite job, in the order they run
+REWRITE_JOB_STAGES = ("sections", "retrieve", "feedback", "full_rewrite")
+
+# Seconds between two progress checks of a running rewrite job
+JOB_POLL_SECONDS = 1.0
+
 
 def save_markdown_to_file(markdown_text, file_path):
     """
@@ -27,6 +76,113 @@ def save_markdown_to_file(markdown_text, file_path):
         f.write(markdown_text)
 
 
+def rewrite_resume_job(job, resume_text, resume_key, section_memo=None):
+    """
+    Generate the feedback and the full rewrite of a resume as a background job.
+
+    Runs in a worker thread of the job manager, outside of any script run, so
+    it must not call Streamlit.
+
+    Args:
+        job (Job): The handle used to report progress and to stop once cancelled.
+        resume_text (str): The extracted resume text.
+        resume_key (str): The resume cache key of the uploaded PDF.
+        section_memo (dict, optional): Section results of the session's previous
+            rewrite; only sections edited since then are sent to the LLM.
+
+    Returns:
+        dict: The feedback, full_resume and the updated section_memo, plus
+            trace_summary and trace_rows when tracing.
+    """
+    # Each session runs one job at a time, so queueing LLM calls fairly
+    # across jobs shares the Gemini quota fairly across sessions
+    with start_trace("rewrite_resume") as request_trace, rate_limit_session(job.id):
+        # Load the knowledge base of all guides, building it only if a guide changed
+        vector_store = load_or_create_knowledge_base()
+        job.checkpoint()
+
+        # Set up pipelines
+        chains = setup_rag_pipeline(
+            vector_store,
+            cache=get_default_cache(),
+            use_cache=LLM_CACHE_ENABLED,
+            limiter=get_rate_limiter(),
+        )
+
+        # Only the feedback and the full rewrite are displayed, so the
+        # per-section rewrites are never computed
+        pipeline = ResumePipeline(
+            *chains,
+            vector_store,
+            resume_text=resume_text,
+            max_concurrency=LLM_MAX_CONCURRENCY,
+            on_stage=job.stage,
+            section_memo=section_memo,
+            guide_filter=guide_filter(RESUME_GUIDE),
+        )
+        feedback = pipeline.get("feedback")
+
+        # Publish the full rewrite as it is generated
+        for chunk in pipeline.stream_full_rewrite():
+            job.append_partial(chunk)
+        full_resume = pipeline.get("full_rewrite")
+
+    # Cache the finished work even if the session that asked for it is gone
+    get_resume_cache().put(resume_key, feedback=feedback, full_resume=full_resume)
+
+    result = {
+        "feedback": feedback,
+        "full_resume": full_resume,
+        "section_memo": section_memo,
+    }
+    if request_trace:
+        result["trace_summary"] = request_trace.summary()
+        result["trace_rows"] = request_trace.rows()
+    return result
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_rewrite_job(job_id):
+    """
+    Display the progress of the session's rewrite job and collect its result once finished.
+
+    Only this fragment reruns while polling; the whole app reruns once the
+    job has finished or was cancelled.
+
+    Args:
+        job_id (str): The id returned by `JobManager.submit`.
+    """
+    job_manager = get_job_manager()
+    job = job_manager.get(job_id)
+
+    if job is None:
+        st.session_state.job_message = (
+            "The rewrite result has expired. Please try again."
+        )
+    elif job["status"] == SUCCEEDED:
+        # Store feedback, full resume and timings in session state
+        for name, value in job["result"].items():
+            st.session_state[name] = value
+    elif job["status"] == TIMED_OUT:
+        st.session_state.job_message = (
+            "The rewrite took too long and was stopped. Please try again."
+        )
+    elif job["status"] == CANCELLED:
+        st.session_state.job_message = "The rewrite was cancelled."
+    elif job["error"] is not None:
+        st.session_state.job_message = f"The rewrite failed: {job['error']}"
+    else:
+        display_job_progress(job)
+        if st.button("Cancel ✋"):
+            job_manager.cancel(job_id)
+            st.session_state.job_message = "The rewrite was cancelled."
+        else:
+            return
+
+    st.session_state.pop("rewrite_job", None)
+    st.rerun()
+
+
 def main():
 
     st.set_page_config(
@@ -74,6 +230,12 @@ def main():
 
         social_media_icons.render()
 
+        # Timings of the last rewrite, recorded when AI_RESUME_TRACING=1
+        if tracing_enabled() and "trace_rows" in st.session_state:
+            display_timing_panel(
+                st.session_state.trace_summary, st.session_state.trace_rows
+            )
+
     st.title("✨AI Resume Rewriter✨")
     st.subheader("Using Harvard Resume Guidelines to Rewrite Your Resume")
 
@@ -118,46 +280,59 @@ def main():
         )
 
         if uploaded_file:
+            # Results are cached across sessions by the hash of the PDF bytes;
+            # a different upload invalidates this session's results
+            resume_cache = get_resume_cache()
+            resume_key = ResumeCache.key_for(uploaded_file.getvalue())
+            if st.session_state.get("resume_key") != resume_key:
+                # A rewrite of the previous upload is no longer needed
+                if "rewrite_job" in st.session_state:
+                    get_job_manager().cancel(st.session_state.pop("rewrite_job"))
+                for name in SESSION_RESULT_KEYS:
+                    st.session_state.pop(name, None)
+                st.session_state.resume_key = resume_key
+
+                cached = resume_cache.get(resume_key) or {}
+                if "resume_text" in cached:
+                    st.session_state.resume_text = cached["resume_text"]
+                if LLM_CACHE_ENABLED and "full_resume" in cached:
+                    st.session_state.feedback = cached["feedback"]
+                    st.session_state.full_resume = cached["full_resume"]
+
             # Extract and display the original resume
             if "resume_text" not in st.session_state:
-                with st.spinner("Extracting text from PDF..."):
-                    resume_text = extract_pdf_text(uploaded_file)
-                    resume_text = clean_extracted_text(resume_text)
-                    st.session_state.resume_text = resume_text
-                    st.success("✅ Resume text extracted!")
+                with start_trace("extract_resume"):
+                    with st.spinner("Extracting text from PDF..."):
+                        try:
+                            resume_text = extract_pdf_text(uploaded_file)
+                        except PDFTooLargeError as error:
+                            st.error(f"❌ {error}")
+                            st.stop()
+                        resume_text = clean_extracted_text(resume_text)
+                        st.session_state.resume_text = resume_text
+                        resume_cache.put(resume_key, resume_text=resume_text)
+                        st.success("✅ Resume text extracted!")
 
             display_original_resume(st.session_state.resume_text)
 
-            # Add a button to rewrite the resume
-            if st.button("Rewrite Resume ✍️"):
-                with st.spinner("Generating feedback and rewriting your resume..."):
-                    # Load Harvard Resume Guide
-                    with open("assets/harvard_resume_guide.md", "r") as file:
-                        guide_text = file.read()
-
-                    # Create vector store
-                    chunks = split_text(guide_text)
-                    vector_store = create_vector_store(chunks)
-
-                    # Set up pipelines
-                    feedback_chain, rewrite_chain, full_rewrite_chain = (
-                        setup_rag_pipeline(vector_store)
-                    )
-
-                    # Process the resume for feedback and full resume
-                    feedback, _ = process_resume(
-                        st.session_state.resume_text,
-                        feedback_chain,
-                        rewrite_chain,
-                        vector_store,
-                    )
-                    full_resume = process_full_resume(
-                        feedback, st.session_state.resume_text, full_rewrite_chain
-                    )
-
-                    # Store feedback and full resume in session state
-                    st.session_state.feedback = feedback
-                    st.session_state.full_resume = full_resume
+            if "job_message" in st.session_state:
+                st.warning(f"⚠️ {st.session_state.pop('job_message')}")
+
+            # The rewrite runs as a background job, so reruns and widget
+            # interactions do not throw the work away
+            if "rewrite_job" in st.session_state:
+                poll_rewrite_job(st.session_state.rewrite_job)
+            elif st.button("Rewrite Resume ✍️"):
+                st.session_state.rewrite_job = get_job_manager().submit(
+                    rewrite_resume_job,
+                    st.session_state.resume_text,
+                    resume_key,
+                    # Kept across uploads, so resubmitting an edited resume
+                    # reuses the results of its unchanged sections
+                    dict(st.session_state.get("section_memo", {})),
+                    stages=REWRITE_JOB_STAGES,
+                )
+                st.rerun()
 
             # Display results if available
             if "feedback" in st.session_state and "full_resume" in st.session_state:
@@ -185,20 +360,16 @@ def main():
                     )
 
                 with col3:
-                    # Download DOCX button (handled within the same column)
-                    docx_buffer = io.BytesIO()
-                    convert_markdown_to_docx(
-                        st.session_state.full_resume, "full_resume.docx"
+                    # Download DOCX button, converted in memory and only when
+                    # the resume changed since the last rerun
+                    docx_bytes = get_docx_bytes(
+                        st.session_state.full_resume,
+                        st.session_state.setdefault("docx_artifacts", {}),
                     )
 
-                    with open("full_resume.docx", "rb") as f:
-                        docx_buffer.write(f.read())
-
-                    docx_buffer.seek(0)
-
                     st.download_button(
                         label="💾 Download DOCX Resume",
-                        data=docx_buffer,
+                        data=docx_bytes,
                         file_name="full_resume.docx",
                         mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
                     )
@@ -0,0 +1,186 @@
+import random
+
+SIZES = {
+    # name: (sections, bullet lines per section)
+    "small": (5, 4),
+    "medium": (8, 10),
+    "large": (12, 40),
+}
+
+_SECTION_TITLES = [
+    "Education",
+    "Work Experience",
+    "Skills",
+    "Projects",
+    "Certifications",
+    "Awards",
+    "Research Experience",
+    "Leadership Experience",
+    "Volunteer Experience",
+    "Interests",
+    "Hobbies",
+    "Professional Experience",
+]
+_VERBS = [
+    "Built",
+    "Led",
+    "Designed",
+    "Reduced",
+    "Automated",
+    "Launched",
+    "Improved",
+    "Mentored",
+]
+_OBJECTS = [
+    "a data pipeline processing 2M events per day",
+    "the onboarding flow used by 50,000 customers",
+    "an internal analytics dashboard",
+    "cloud infrastructure costs by 30%",
+    "a team of four engineers",
+    "the release process from weekly to daily",
+    "a recommendation service in Python and Go",
+    "test coverage from 40% to 85%",
+]
+
+
+def synthetic_resume(size="medium", seed=0):
+    """
+    Generate a plain-text resume of the given size.
+
+    Args:
+        size (str): One of the keys of `SIZES`.
+        seed (int): Random seed; the same seed always gives the same resume.
+
+    Returns:
+        str: The resume text.
+    """
+    rng = random.Random(seed)
+    section_count, line_count = SIZES[size]
+    lines = ["Jane Doe", "jane.doe@example.com | (555) 010-0000 | Boston, MA"]
+    for title in _SECTION_TITLES[:section_count]:
+        lines.append(title)
+        for _ in range(line_count):
+            lines.append(f"- {rng.choice(_VERBS)} {rng.choice(_OBJECTS)}")
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_corpus(seed=0):
+    """Return {size name: resume text} for every size in `SIZES`."""
+    return {size: synthetic_resume(size, seed) for size in SIZES}
+
+
+def noisy_extracted_text(text, lines_per_page=50, seed=0):
+    """
+    Add the artifacts of PDF text extraction to a plain-text resume.
+
+    Pages (separated by form feeds, like `extract_pdf_text` output) get a
+    running header and a page number footer; bullets become glyphs, "fi"
+    and "ff" become ligatures, and lines get indentation, doubled spaces,
+    trailing spaces, blank lines, zero-width characters and words
+    hyphenated across line breaks.
+
+    Args:
+        text (str): The resume text, e.g. from `synthetic_resume`.
+        lines_per_page (int): Lines per page.
+        seed (int): Random seed; the same seed always gives the same text.
+
+    Returns:
+        str: The noisy text.
+    """
+    rng = random.Random(seed)
+    lines = text.splitlines()
+    pages = [
+        lines[i : i + lines_per_page] for i in range(0, len(lines), lines_per_page)
+    ]
+
+    noisy_pages = []
+    for number, page_lines in enumerate(pages, start=1):
+        noisy = [f"{lines[0]}  |  Resume", ""]
+        for line in page_lines:
+            if line.startswith("- "):
+                line = rng.choice(["\u2022 ", "\uf0b7  ", "  \u25cf "]) + line[2:]
+            line = line.replace("fi", "\ufb01").replace("ff", "\ufb00")
+            line = line.replace(" ", "  ", rng.randint(0, 2))
+            words = line.split(" ")
+            if len(words) > 6 and rng.random() < 0.2:
+                # Break a long word across two lines with a hyphen
+                i = max(range(len(words)), key=lambda j: len(words[j]))
+                word = words[i]
+                if len(word) > 6 and word.isalpha():
+                    half = len(word) // 2
+                    noisy.append(" ".join(words[:i] + [word[:half] + "-"]))
+                    line = " ".join([word[half:]] + words[i + 1 :])
+            noisy.append(rng.choice(["", " ", "\t"]) + line + rng.choice(["", "  "]))
+            if rng.random() < 0.1:
+                noisy.append("")
+            if rng.random() < 0.05:
+                noisy[-1] += "\u200b"
+        noisy += ["", f"Page {number} of {len(pages)}"]
+        noisy_pages.append("\n".join(noisy))
+    return "\f".join(noisy_pages)
+
+
+def _escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def text_to_pdf(text, lines_per_page=50):
+    """
+    Render plain text into a minimal multi-page PDF using the built-in Helvetica font.
+
+    Args:
+        text (str): The text; each line becomes one line in the PDF.
+        lines_per_page (int): Lines per page.
+
+    Returns:
+        bytes: The PDF file.
+    """
+    lines = text.splitlines() or [""]
+    pages = [
+        lines[i : i + lines_per_page] for i in range(0, len(lines), lines_per_page)
+    ]
+
+    # Objects 1-3 are the catalog, the page tree and the font; each page then
+    # takes two objects, the page and its content stream.
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_lines in pages:
+        stream_lines = ["BT", "/F1 10 Tf", "14 TL", "50 760 Td"]
+        for line in page_lines:
+            stream_lines.append(f"({_escape_pdf_text(line)}) Tj T*")
+        stream_lines.append("ET")
+        stream = "\n".join(stream_lines).encode("latin-1", "replace")
+
+        page_id = len(objects) + 1
+        page_ids.append(page_id)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objects.append(
+            b"<< /Length "
+            + str(len(stream)).encode()
+            + b" >>\nstream\n"
+            + stream
+            + b"\nendstream"
+        )
+
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    return bytes(pdf)
@@ -0,0 +1,117 @@
+"""
+DOCX conversion time of the single-pass converter against the previous HTML round trip.
+
+Usage:
+    python -m benchmarks.docx_conversion
+    python -m benchmarks.docx_conversion --repeats 1 10 100 --rounds 3
+
+A short Markdown resume is repeated --repeats times, and for each size the
+report shows the best time of `convert_markdown_to_docx` and of the
+Markdown -> HTML -> BeautifulSoup converter it replaced.
+"""
+
+import argparse
+import io
+import sys
+import time
+
+from modules.markdown_to_docx import convert_markdown_to_docx
+
+SAMPLE_MARKDOWN = (
+    "## Jane Doe\n"
+    "Data engineer with **5 years** of experience in *distributed systems*.\n\n"
+    "### Work Experience\n"
+    "- **Software Engineer**, ACME Corp, 2020 - Present\n"
+    "  - Cut pipeline latency by **40%** using `Spark`\n"
+    "  - Mentored *four* junior engineers\n"
+    "- **Intern**, Example Inc, 2019\n\n"
+    "### Skills\n"
+    "1. Python, SQL\n"
+    "2. Docker, Kubernetes\n\n"
+)
+
+
+def convert_via_html(markdown_string):
+    """The previous Markdown -> HTML -> BeautifulSoup converter."""
+    import markdown
+    from bs4 import BeautifulSoup
+    from docx import Document
+
+    soup = BeautifulSoup(markdown.markdown(markdown_string), "html.parser")
+    doc = Document()
+    for element in soup:
+        if element.name == "h1":
+            doc.add_heading(element.text, level=1)
+        elif element.name == "h2":
+            doc.add_heading(element.text, level=2)
+        elif element.name == "p":
+            doc.add_paragraph(element.text)
+        elif element.name == "ul":
+            for li in element.find_all("li"):
+                doc.add_paragraph(li.text, style="List Bullet")
+        elif element.name in ["strong", "b"]:
+            p = doc.add_paragraph()
+            p.add_run(element.text).bold = True
+        elif element.name in ["em", "i"]:
+            p = doc.add_paragraph()
+            p.add_run(element.text).italic = True
+
+    docx_buffer = io.BytesIO()
+    doc.save(docx_buffer)
+    return docx_buffer
+
+
+def benchmark_docx_conversion(repeats=(1, 10, 100), rounds=3):
+    """
+    Compare `convert_markdown_to_docx` with the previous HTML round trip on growing documents.
+
+    Args:
+        repeats (iterable): How many times the sample resume is repeated per document.
+        rounds (int): Timing rounds per document; the best round is reported.
+
+    Returns:
+        list: One dict per document size with the timings in milliseconds.
+    """
+    results = []
+    for repeat in repeats:
+        text = SAMPLE_MARKDOWN * repeat
+        timings = {}
+        for name, convert in (
+            ("html_round_trip_ms", convert_via_html),
+            ("single_pass_ms", convert_markdown_to_docx),
+        ):
+            best = float("inf")
+            for _ in range(rounds):
+                start = time.perf_counter()
+                convert(text)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best * 1000
+        results.append({"chars": len(text), **timings})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare DOCX conversion with the previous HTML round trip."
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100],
+        help="How many times the sample resume is repeated.",
+    )
+    parser.add_argument("--rounds", type=int, default=3, help="Timed runs per size.")
+    args = parser.parse_args(argv)
+
+    for row in benchmark_docx_conversion(sorted(args.repeats), args.rounds):
+        print(
+            f"{row['chars']:>9} chars  "
+            f"html round trip {row['html_round_trip_ms']:9.1f} ms  "
+            f"single pass {row['single_pass_ms']:9.1f} ms"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Accuracy and throughput of the CPU embedding backends on the Harvard guide.
+
+Usage:
+    python -m benchmarks.embedding_backends
+    python -m benchmarks.embedding_backends --backends torch int8 onnx --k 3
+    python -m benchmarks.embedding_backends --min-overlap 0.9
+
+The guide is chunked as in the app and indexed once per backend. Every
+section heading the parser recognises is turned into the guideline query
+the app sends, and the top-k chunks each backend retrieves are compared
+with those of the torch backend. The report shows the mean top-k overlap,
+embedding throughput over the guide chunks and the model's load time and
+resident memory. With --min-overlap the command exits with a non-zero
+status when a backend retrieves too differently from torch.
+
+The backends load real models, so the first run needs network access (or
+a local model directory passed as --model) and writes the converted models
+to the model cache.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from modules.embeddings import get_embedding_stats, get_local_embeddings
+from modules.resume_parser import SECTION_HEADERS, _guideline_query
+from modules.vectorstore_utils import (
+    batch_similarity_search,
+    create_vector_store,
+    split_text,
+    with_backend,
+)
+
+GUIDE_PATH = os.path.join("assets", "harvard_resume_guide.md")
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def guide_queries():
+    """Return the guideline query of every section heading the parser knows."""
+    headings = [
+        heading for headings in SECTION_HEADERS.values() for heading in headings
+    ]
+    return [_guideline_query(heading) for heading in dict.fromkeys(headings)]
+
+
+def top_k_chunks(chunks, queries, model_name, backend, k=3):
+    """
+    Index the chunks with a backend and return the chunks retrieved per query.
+
+    Returns:
+        list: One list of chunk texts per query.
+    """
+    vector_store = create_vector_store(chunks, model_name=model_name, backend=backend)
+    return [
+        [document.page_content for document in documents]
+        for documents in batch_similarity_search(vector_store, queries, k=k)
+    ]
+
+
+def mean_overlap(results, reference):
+    """Return the mean fraction of the reference top-k that `results` also retrieved."""
+    fractions = [
+        len(set(found) & set(expected)) / len(expected)
+        for found, expected in zip(results, reference)
+        if expected
+    ]
+    return sum(fractions) / len(fractions) if fractions else 1.0
+
+
+def throughput(chunks, model_name, backend, rounds=3):
+    """Return the best-of-`rounds` embedding throughput in texts per second."""
+    embeddings = get_local_embeddings(with_backend(model_name, backend))
+    best = float("inf")
+    for _ in range(max(rounds, 1)):
+        start = time.perf_counter()
+        embeddings.embed_documents(chunks)
+        best = min(best, time.perf_counter() - start)
+    return len(chunks) / best
+
+
+def compare_backends(
+    backends=("torch", "int8"), model_name=DEFAULT_MODEL, k=3, rounds=3
+):
+    """
+    Compare embedding backends against the torch backend on the Harvard guide.
+
+    Args:
+        backends (iterable): The backends to measure; torch is always included.
+        model_name (str): The sentence-transformers model name or directory.
+        k (int): Chunks retrieved per query.
+        rounds (int): Embedding passes over the guide per throughput measurement.
+
+    Returns:
+        list: One dict per backend with its overlap, throughput and load stats.
+    """
+    with open(GUIDE_PATH, "r", encoding="utf-8") as f:
+        chunks = split_text(f.read())
+    queries = guide_queries()
+    # Import torch up front so the first backend's load stats cover only its model
+    import sentence_transformers  # noqa: F401
+
+    reference = top_k_chunks(chunks, queries, model_name, "torch", k)
+    reports = []
+    for backend in dict.fromkeys(("torch", *backends)):
+        results = (
+            reference
+            if backend == "torch"
+            else top_k_chunks(chunks, queries, model_name, backend, k)
+        )
+        texts_per_second = throughput(chunks, model_name, backend, rounds)
+        stats = get_embedding_stats()[with_backend(model_name, backend)]
+        reports.append(
+            {
+                "backend": backend,
+                "overlap": mean_overlap(results, reference),
+                "texts_per_second": texts_per_second,
+                "load_seconds": stats["load_seconds"],
+                "rss_delta_mib": stats["rss_delta_bytes"] / 2**20,
+            }
+        )
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare retrieval overlap and speed of the embedding backends."
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=["torch", "int8"],
+        choices=["torch", "int8", "onnx"],
+        help="Backends to measure against torch.",
+    )
+    parser.add_argument(
+        "--model", default=DEFAULT_MODEL, help="Model name or local directory."
+    )
+    parser.add_argument("--k", type=int, default=3, help="Chunks retrieved per query.")
+    parser.add_argument(
+        "--rounds", type=int, default=3, help="Embedding passes per measurement."
+    )
+    parser.add_argument(
+        "--min-overlap",
+        type=float,
+        help="Fail when a backend's mean top-k overlap with torch is lower.",
+    )
+    args = parser.parse_args(argv)
+
+    reports = compare_backends(args.backends, args.model, args.k, args.rounds)
+
+    print(
+        f"{'backend':<8} {'top-' + str(args.k) + ' overlap':>14} {'texts/s':>9} "
+        f"{'load s':>7} {'+RSS MiB':>9}"
+    )
+    for report in reports:
+        print(
+            f"{report['backend']:<8} {report['overlap']:14.3f} "
+            f"{report['texts_per_second']:9.1f} {report['load_seconds']:7.2f} "
+            f"{report['rss_delta_mib']:9.1f}"
+        )
+
+    failing = [
+        report["backend"]
+        for report in reports
+        if args.min_overlap is not None and report["overlap"] < args.min_overlap
+    ]
+    if failing:
+        print(
+            f"OVERLAP BELOW {args.min_overlap:.2f}: {', '.join(failing)}",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
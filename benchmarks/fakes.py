@@ -0,0 +1,184 @@
+import hashlib
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+FAKE_EMBEDDING_MODEL = "fake/deterministic-embeddings"
+
+FAKE_REWRITE = """## Jane Doe
+jane.doe@example.com | (555) 010-0000
+
+### Education
+**B.Sc. Computer Science**, Example University, May 2020
+
+### Work Experience
+- **Data Engineer**, ACME Corp, June 2020 - Present
+  - Reduced pipeline latency by **40%** by migrating batch jobs to *Spark*
+  - Led a team of four engineers delivering a real-time analytics platform
+
+### Skills
+- Python, SQL, Docker, Kubernetes
+"""
+
+
+class FakeRateLimitError(Exception):
+    """The HTTP 429 a `FakeQuota` raises, carrying the server's retry hint."""
+
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__(
+            f"429 Resource has been exhausted. Please retry in {retry_after:.2f}s."
+        )
+        self.retry_after = retry_after
+
+
+class FakeQuota:
+    """
+    A server-side request quota: more than `requests` calls within `window` seconds get a 429.
+
+    One quota can be shared by several `FakeLLM` instances, like an API key.
+
+    Args:
+        requests (int): Calls allowed per window.
+        window (float): Length of the sliding window in seconds.
+        send_hint (bool): Whether the 429 carries a retry hint.
+    """
+
+    def __init__(self, requests, window=60.0, send_hint=True):
+        self.requests = requests
+        self.window = window
+        self.send_hint = send_hint
+        self.accepted = 0
+        self.rejected = 0
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Count a call, raising `FakeRateLimitError` if it is over the quota."""
+        with self._lock:
+            now = time.monotonic()
+            while self._calls and now - self._calls[0] >= self.window:
+                self._calls.popleft()
+            if len(self._calls) >= self.requests:
+                self.rejected += 1
+                error = FakeRateLimitError(self._calls[0] + self.window - now)
+                if not self.send_hint:
+                    error.retry_after = None
+                    error.args = ("429 Resource has been exhausted.",)
+                raise error
+            self._calls.append(now)
+            self.accepted += 1
+
+
+class FakeLLM(LLM):
+    """
+    A local LLM stand-in that sleeps for a configurable latency and returns a canned response.
+
+    Streaming yields the response word by word, spread over the same latency.
+    With a `quota`, calls over it fail with an HTTP 429 like Gemini's.
+    """
+
+    response: str = FAKE_REWRITE
+    latency: float = 0.0
+    model: str = "fake-llm"
+    temperature: float = 0.0
+    quota: Any = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> str:
+        if self.quota is not None:
+            self.quota.check()
+        if self.latency:
+            time.sleep(self.latency)
+        return self.response
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        if self.quota is not None:
+            self.quota.check()
+        words = self.response.split(" ")
+        delay = self.latency / max(len(words), 1)
+        for i, word in enumerate(words):
+            if delay:
+                time.sleep(delay)
+            yield GenerationChunk(text=word if i == 0 else " " + word)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic embeddings derived from a hash of the text, with simulated latency.
+
+    Args:
+        size (int): Embedding dimension; 384 matches all-MiniLM-L6-v2.
+        call_latency (float): Seconds slept once per embedding call.
+        text_latency (float): Seconds slept per embedded text.
+    """
+
+    def __init__(self, size=384, call_latency=0.0, text_latency=0.0):
+        self.size = size
+        self.call_latency = call_latency
+        self.text_latency = text_latency
+
+    def _embed(self, text):
+        seed = int.from_bytes(
+            hashlib.sha256(text.encode("utf-8")).digest()[:4], "little"
+        )
+        vector = np.random.default_rng(seed).standard_normal(self.size)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        delay = self.call_latency + self.text_latency * len(texts)
+        if delay:
+            time.sleep(delay)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class ClusteredEmbeddings(FakeEmbeddings):
+    """
+    Deterministic embeddings of "topic <n> ..." texts scattered around one centroid per topic.
+
+    Unlike the uniform vectors of `FakeEmbeddings`, texts about the same
+    topic are close to each other, so approximate nearest-neighbour indexes
+    behave as they do on real embeddings.
+
+    Args:
+        size (int): Embedding dimension.
+        spread (float): Noise scale relative to the distance between centroids.
+    """
+
+    def __init__(self, size=384, spread=0.3):
+        super().__init__(size)
+        self.spread = spread
+
+    def _embed(self, text):
+        match = re.match(r"topic (\d+)", text)
+        centroid = np.random.default_rng(int(match.group(1)) if match else 0)
+        noise = super()._embed(text)
+        vector = centroid.standard_normal(self.size) / np.sqrt(self.size)
+        vector += self.spread * np.array(noise)
+        return (vector / np.linalg.norm(vector)).tolist()
@@ -0,0 +1,144 @@
+"""
+Cold-start import time profile of the app.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --top 40 --module modules.pipeline
+    python -m benchmarks.import_time --budget 1.0
+
+Each round imports the module in a fresh interpreter with
+`python -X importtime` and parses its report. The slowest round is
+discarded by taking the minimum per module, and the modules with the
+largest cumulative import time are listed.
+
+The command is also the regression check for the cold start: it exits
+with a non-zero status when the cold import of the module takes longer
+than the budget (DEFAULT_BUDGET_SECONDS unless --budget is given; 0
+disables it), or when it imports one of DEFERRED_MODULES, which the app
+only imports on first use. Run it in CI to catch a heavy dependency
+sneaking back into the startup path.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Repository root, so `app` and `modules` resolve from any working directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold import budget of the app. Importing it takes about 0.6 s on a laptop;
+# importing LangChain, sentence-transformers or faiss at startup adds seconds.
+DEFAULT_BUDGET_SECONDS = 1.5
+
+# Heavy dependencies that must only be imported on first use
+DEFERRED_MODULES = (
+    "faiss",
+    "torch",
+    "sentence_transformers",
+    "transformers",
+    "langchain",
+    "langchain_core",
+    "langchain_community",
+    "langchain_google_genai",
+    "docx",
+)
+
+
+def profile_imports(module="app"):
+    """
+    Import a module in a fresh interpreter and return its import time report.
+
+    Args:
+        module (str): The module to import.
+
+    Returns:
+        dict: Imported module name -> (self microseconds, cumulative microseconds).
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in completed.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        timings[name] = (int(fields[0]), int(fields[1]))
+    return timings
+
+
+def profile_cold_start(module="app", rounds=3):
+    """
+    Return the best-of-`rounds` import time report of a module.
+
+    Args:
+        module (str): The module to import.
+        rounds (int): Fresh interpreters to start.
+
+    Returns:
+        dict: Imported module name -> (self microseconds, cumulative microseconds).
+    """
+    best = {}
+    for _ in range(max(rounds, 1)):
+        for name, (self_us, cumulative_us) in profile_imports(module).items():
+            previous = best.get(name)
+            if previous is None or cumulative_us < previous[1]:
+                best[name] = (self_us, cumulative_us)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Report the cold-start import time of the app per module."
+    )
+    parser.add_argument("--module", default="app", help="The module to import.")
+    parser.add_argument(
+        "--rounds", type=int, default=3, help="Fresh interpreters to start."
+    )
+    parser.add_argument("--top", type=int, default=25, help="Modules to list.")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET_SECONDS,
+        help="Fail when the cold import takes longer than this many seconds; 0 disables.",
+    )
+    args = parser.parse_args(argv)
+
+    timings = profile_cold_start(args.module, args.rounds)
+    total = timings[args.module][1] / 1e6
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, (self_us, cumulative_us) in sorted(
+        timings.items(), key=lambda item: item[1][1], reverse=True
+    )[: args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name}")
+    print(f"\nimport {args.module}: {total:.2f} s")
+
+    status = 0
+    if args.budget and total > args.budget:
+        print(
+            f"OVER BUDGET: import {args.module} took {total:.2f} s "
+            f"(budget {args.budget:.2f} s)",
+            file=sys.stderr,
+        )
+        status = 1
+    eager = [name for name in DEFERRED_MODULES if name in timings]
+    if eager:
+        print(
+            f"EAGER IMPORTS: import {args.module} imports {', '.join(eager)}",
+            file=sys.stderr,
+        )
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Query latency and recall of the knowledge base index as the corpus grows.
+
+Usage:
+    python -m benchmarks.knowledge_base
+    python -m benchmarks.knowledge_base --sizes 1000 20000 100000 --guides 40
+    python -m benchmarks.knowledge_base --max-growth 3
+
+For every corpus size a vector store is built from synthetic chunks spread
+evenly over --guides guides and over --topics topics, with the index type
+`choose_index_type` picks for that size. Embeddings come from the clustered
+stand-in in benchmarks/fakes.py, so the numbers measure FAISS and this
+project's code.
+The report shows the index type, build time, median query latency without
+a filter, the latency of the first single-guide query on the store, which
+also selects the guide's chunks, the median latency of later single-guide
+queries, and the recall@k of the unfiltered search against exact search. With --max-growth the command
+exits with a non-zero status when the filtered query latency at the
+largest size exceeds that multiple of the latency at the smallest size.
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+from benchmarks.fakes import FAKE_EMBEDDING_MODEL, ClusteredEmbeddings
+from modules.embeddings import register_embeddings
+from modules.vectorstore_utils import (
+    batch_similarity_search,
+    clear_search_memo,
+    create_vector_store,
+)
+
+
+def _median_query_ms(vector_store, queries, k, filter=None):
+    """Return the median latency of single-query searches in milliseconds."""
+    timings = []
+    for query in queries:
+        clear_search_memo(vector_store)
+        start = time.perf_counter()
+        batch_similarity_search(vector_store, [query], k=k, filter=filter)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def _recall(vector_store, queries, k):
+    """Return the fraction of the exact top-k that the unfiltered index search finds."""
+    import faiss
+    import numpy as np
+
+    query_embeddings = np.array(
+        vector_store.embedding_function.embed_documents(queries), dtype="float32"
+    )
+    index = vector_store.index
+    _, found = index.search(query_embeddings, k)
+    _, exact = faiss.knn(query_embeddings, index.reconstruct_n(0, index.ntotal), k)
+    hits = sum(len(set(row) & set(truth)) for row, truth in zip(found, exact))
+    return hits / exact.size
+
+
+def measure_size(size, guides=20, topics=200, queries=50, k=3):
+    """
+    Build a synthetic knowledge base of `size` chunks and measure its searches.
+
+    Returns:
+        dict: Index type, build seconds, query latencies and recall.
+    """
+    chunks = [f"topic {i % topics} guide {i % guides} chunk {i}" for i in range(size)]
+    metadatas = [{"guide": f"guide-{i % guides}"} for i in range(size)]
+
+    start = time.perf_counter()
+    vector_store = create_vector_store(
+        chunks, model_name=FAKE_EMBEDDING_MODEL, metadatas=metadatas
+    )
+    build_seconds = time.perf_counter() - start
+
+    query_texts = [f"topic {i % topics} query {i}" for i in range(queries)]
+    guide_filter = {"guide": "guide-0"}
+    # The first filtered search on a store also collects the matching ids,
+    # which later searches with the same filter reuse
+    start = time.perf_counter()
+    batch_similarity_search(vector_store, ["cold query"], k=k, filter=guide_filter)
+    cold_filtered_query_ms = (time.perf_counter() - start) * 1000
+    return {
+        "size": size,
+        "index": type(vector_store.index).__name__,
+        "build_s": build_seconds,
+        "query_ms": _median_query_ms(vector_store, query_texts, k),
+        "cold_filtered_query_ms": cold_filtered_query_ms,
+        "filtered_query_ms": _median_query_ms(
+            vector_store, query_texts, k, guide_filter
+        ),
+        "recall": _recall(vector_store, query_texts, k),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure knowledge base query latency as the corpus grows."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000, 60_000],
+        help="Corpus sizes in chunks.",
+    )
+    parser.add_argument(
+        "--guides", type=int, default=20, help="Guides the chunks are spread over."
+    )
+    parser.add_argument(
+        "--topics", type=int, default=200, help="Clusters the chunks are spread over."
+    )
+    parser.add_argument("--queries", type=int, default=50, help="Queries per size.")
+    parser.add_argument("--k", type=int, default=3, help="Chunks retrieved per query.")
+    parser.add_argument(
+        "--max-growth",
+        type=float,
+        help="Fail when filtered latency grows more than this factor across sizes.",
+    )
+    args = parser.parse_args(argv)
+
+    register_embeddings(FAKE_EMBEDDING_MODEL, ClusteredEmbeddings())
+
+    print(
+        f"{'chunks':>8} {'index':<14} {'build s':>8} {'query ms':>9} "
+        f"{'cold filt. ms':>14} {'filtered ms':>12} {'recall@' + str(args.k):>9}"
+    )
+    reports = []
+    for size in sorted(args.sizes):
+        report = measure_size(size, args.guides, args.topics, args.queries, args.k)
+        reports.append(report)
+        print(
+            f"{report['size']:>8} {report['index']:<14} {report['build_s']:8.2f} "
+            f"{report['query_ms']:9.2f} {report['cold_filtered_query_ms']:14.2f} "
+            f"{report['filtered_query_ms']:12.2f} "
+            f"{report['recall']:9.3f}"
+        )
+
+    growth = reports[-1]["filtered_query_ms"] / reports[0]["filtered_query_ms"]
+    print(f"\nfiltered latency growth: {growth:.2f}x")
+    if args.max_growth is not None and growth > args.max_growth:
+        print(
+            f"OVER BUDGET: filtered latency grew {growth:.2f}x "
+            f"(budget {args.max_growth:.2f}x)",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Load test of the shared LLM rate limiter against a local stub that enforces a quota.
+
+Usage:
+    python -m benchmarks.rate_limit
+    python -m benchmarks.rate_limit --sessions 6 --quota 10 --window 1.0
+
+Several sessions send LLM calls at once, one of them several times as many
+as the others. The stub LLM (benchmarks/fakes.py) answers calls over its
+quota with HTTP 429 and a retry hint. The load is run once without and once
+with a `RateLimiter` sized to the quota, and the report shows failed calls,
+429s, queue depth, wait times and when each session finished. The command
+exits with a non-zero status if any call failed with the limiter in place.
+"""
+
+import argparse
+import contextvars
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fakes import FakeLLM, FakeQuota
+from modules.llm_pipeline import run_chain, setup_rag_pipeline
+from modules.rate_limiter import RateLimiter, rate_limit_session
+
+
+def _run_session(chain, session_id, calls, concurrency, start):
+    """Send `calls` LLM calls as one session; return (failures, seconds until done)."""
+    inputs = {"resume_section": "Skills: Python", "guide_section": "Be concise."}
+    with rate_limit_session(session_id):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, run_chain, chain, inputs)
+                for _ in range(calls)
+            ]
+            failures = 0
+            for future in futures:
+                try:
+                    future.result()
+                except Exception:
+                    failures += 1
+    return failures, time.monotonic() - start
+
+
+def run_load(
+    sessions=4,
+    calls=6,
+    heavy_factor=3,
+    quota=10,
+    window=1.0,
+    latency=0.01,
+    concurrency=4,
+    limited=True,
+):
+    """
+    Run concurrent sessions against a quota-enforcing stub LLM.
+
+    Args:
+        sessions (int): Number of concurrent sessions.
+        calls (int): LLM calls per session; the first session sends `heavy_factor` times as many.
+        heavy_factor (int): Load multiplier of the first session.
+        quota (int): Calls the stub accepts per window.
+        window (float): Quota window in seconds.
+        latency (float): Simulated seconds per LLM call.
+        concurrency (int): Calls a session keeps in flight.
+        limited (bool): Route the calls through a `RateLimiter` sized to the quota.
+
+    Returns:
+        dict: Failure and 429 counts, limiter metrics and per-session finish times.
+    """
+    server_quota = FakeQuota(quota, window)
+    limiter = (
+        RateLimiter(
+            requests_per_minute=quota,
+            tokens_per_minute=0,
+            base_delay=window / 10,
+            max_delay=window,
+            period=window,
+        )
+        if limited
+        else None
+    )
+    # The caches stay off so every call reaches the stub
+    chain = setup_rag_pipeline(
+        None, llm=FakeLLM(latency=latency, quota=server_quota), limiter=limiter
+    )[0]
+
+    start = time.monotonic()
+    outcomes = {}
+    threads = []
+    for i in range(sessions):
+        session_id = f"session-{i}"
+        session_calls = calls * heavy_factor if i == 0 else calls
+
+        def target(session_id=session_id, session_calls=session_calls):
+            outcomes[session_id] = _run_session(
+                chain, session_id, session_calls, concurrency, start
+            )
+
+        threads.append(threading.Thread(target=target))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "limited": limited,
+        "failed_calls": sum(failures for failures, _ in outcomes.values()),
+        "server_429s": server_quota.rejected,
+        "elapsed_s": round(time.monotonic() - start, 3),
+        "finished_s": {
+            session_id: round(seconds, 3)
+            for session_id, (_, seconds) in sorted(outcomes.items())
+        },
+        "limiter": limiter.stats() if limiter is not None else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load test the LLM rate limiter against a stub that returns 429s."
+    )
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions.")
+    parser.add_argument("--calls", type=int, default=6, help="LLM calls per session.")
+    parser.add_argument(
+        "--heavy-factor",
+        type=int,
+        default=3,
+        help="Load multiplier of the first session.",
+    )
+    parser.add_argument(
+        "--quota", type=int, default=10, help="Calls the stub accepts per window."
+    )
+    parser.add_argument(
+        "--window", type=float, default=1.0, help="Quota window in seconds."
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.01, help="Simulated seconds per call."
+    )
+    args = parser.parse_args(argv)
+
+    limited_failures = 0
+    for limited in (False, True):
+        report = run_load(
+            args.sessions,
+            args.calls,
+            args.heavy_factor,
+            args.quota,
+            args.window,
+            args.llm_latency,
+            limited=limited,
+        )
+        print("with limiter" if limited else "without limiter")
+        print(
+            f"  failed calls {report['failed_calls']}  429s {report['server_429s']}  "
+            f"elapsed {report['elapsed_s']:.2f} s"
+        )
+        for session_id, seconds in report["finished_s"].items():
+            print(f"  {session_id:<12} finished after {seconds:.2f} s")
+        if report["limiter"]:
+            print("  " + "  ".join(f"{k} {v}" for k, v in report["limiter"].items()))
+            limited_failures = report["failed_calls"]
+    return 1 if limited_failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+Offline per-stage benchmarks.
+
+Usage:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --compare bench.json --threshold 0.2
+
+LLM and embedding calls go to local stand-ins (benchmarks/fakes.py) with
+configurable simulated latency, so no network access or API key is needed
+and the numbers measure this project's own overhead.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.corpus import SIZES, synthetic_corpus, text_to_pdf
+from benchmarks.fakes import FAKE_EMBEDDING_MODEL, FakeEmbeddings, FakeLLM
+from modules.embeddings import register_embeddings
+from modules.llm_pipeline import setup_rag_pipeline
+from modules.markdown_to_docx import convert_markdown_to_docx
+from modules.pdf_utils import clean_extracted_text, extract_pdf_text
+from modules.pipeline import ResumePipeline
+from modules.resume_parser import (
+    detect_resume_sections,
+    resume_sections,
+    retrieve_guidelines_batch,
+)
+from modules.vectorstore_utils import clear_search_memo, create_vector_store, split_text
+
+GUIDE_PATH = os.path.join("assets", "harvard_resume_guide.md")
+
+
+def _measure(fn, rounds, setup=None):
+    """Call fn `rounds` times and return the wall times in milliseconds."""
+    timings = []
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _summary(stage, size, timings):
+    ordered = sorted(timings)
+    return {
+        "stage": stage,
+        "size": size,
+        "rounds": len(ordered),
+        "min_ms": ordered[0],
+        "median_ms": statistics.median(ordered),
+        "p95_ms": ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))],
+    }
+
+
+def _as_markdown(resume_text):
+    """Turn a plain-text synthetic resume into the Markdown shape the rewrite produces."""
+    lines = []
+    for title, content in resume_sections(resume_text):
+        lines.append(f"### {title}")
+        lines.append(content)
+        lines.append("")
+    return "\n".join(lines)
+
+
+def run_benchmarks(rounds=5, llm_latency=0.0, embedding_latency=0.0, max_concurrency=4):
+    """
+    Run every stage benchmark on the synthetic corpus.
+
+    Args:
+        rounds (int): Timed rounds per stage and size.
+        llm_latency (float): Simulated seconds per LLM call.
+        embedding_latency (float): Simulated seconds per embedding call.
+        max_concurrency (int): LLM concurrency for the end-to-end pipeline.
+
+    Returns:
+        list: One result dict per (stage, size).
+    """
+    register_embeddings(
+        FAKE_EMBEDDING_MODEL, FakeEmbeddings(call_latency=embedding_latency)
+    )
+    llm = FakeLLM(latency=llm_latency)
+
+    with open(GUIDE_PATH, "r") as file:
+        guide_text = file.read()
+
+    results = []
+    results.append(
+        _summary(
+            "split_text", "guide", _measure(lambda: split_text(guide_text), rounds)
+        )
+    )
+    chunks = split_text(guide_text)
+    results.append(
+        _summary(
+            "create_vector_store",
+            "guide",
+            _measure(
+                lambda: create_vector_store(chunks, model_name=FAKE_EMBEDDING_MODEL),
+                rounds,
+            ),
+        )
+    )
+    vector_store = create_vector_store(chunks, model_name=FAKE_EMBEDDING_MODEL)
+    chains = setup_rag_pipeline(vector_store, llm=llm)
+
+    for size, resume_text in synthetic_corpus().items():
+        pdf_bytes = text_to_pdf(resume_text)
+        results.append(
+            _summary(
+                "extract_pdf_text[tiered]",
+                size,
+                _measure(lambda: extract_pdf_text(pdf_bytes), rounds),
+            )
+        )
+        results.append(
+            _summary(
+                "extract_pdf_text[pdfplumber]",
+                size,
+                _measure(lambda: extract_pdf_text(pdf_bytes, tiered=False), rounds),
+            )
+        )
+        results.append(
+            _summary(
+                "clean_extracted_text",
+                size,
+                _measure(lambda: clean_extracted_text(resume_text), rounds),
+            )
+        )
+        results.append(
+            _summary(
+                "detect_resume_sections",
+                size,
+                _measure(lambda: detect_resume_sections(resume_text), rounds),
+            )
+        )
+
+        sections = resume_sections(resume_text)
+        titles = [title for title, _ in sections]
+        results.append(
+            _summary(
+                "retrieval[batched]",
+                size,
+                _measure(
+                    lambda: retrieve_guidelines_batch(vector_store, titles),
+                    rounds,
+                    setup=lambda: clear_search_memo(vector_store),
+                ),
+            )
+        )
+
+        guides = retrieve_guidelines_batch(vector_store, titles)
+
+        def render_prompts():
+            for chain in chains:
+                for (title, content), guide_text in zip(sections, guides):
+                    chain.prompt.format(
+                        section_title=title,
+                        resume_section=content,
+                        guide_section=guide_text,
+                    )
+
+        results.append(
+            _summary("prompt_rendering", size, _measure(render_prompts, rounds))
+        )
+
+        markdown_text = _as_markdown(resume_text)
+        results.append(
+            _summary(
+                "convert_markdown_to_docx",
+                size,
+                _measure(lambda: convert_markdown_to_docx(markdown_text), rounds),
+            )
+        )
+
+        def end_to_end():
+            pipeline = ResumePipeline(
+                *chains,
+                vector_store,
+                pdf_file=pdf_bytes,
+                max_concurrency=max_concurrency,
+            )
+            pipeline.run("feedback", "full_rewrite")
+
+        results.append(
+            _summary(
+                "pipeline[feedback+full_rewrite]",
+                size,
+                _measure(
+                    end_to_end, rounds, setup=lambda: clear_search_memo(vector_store)
+                ),
+            )
+        )
+
+    return results
+
+
+def compare_results(results, baseline, threshold=0.2):
+    """
+    Find stages whose median got slower than the baseline by more than `threshold`.
+
+    Args:
+        results (list): Results from `run_benchmarks`.
+        baseline (list): Results from an earlier run.
+        threshold (float): Allowed relative slowdown, e.g. 0.2 for 20%.
+
+    Returns:
+        list: One dict per regression with the old and new medians.
+    """
+    previous = {(row["stage"], row["size"]): row for row in baseline}
+    regressions = []
+    for row in results:
+        old = previous.get((row["stage"], row["size"]))
+        if old is None or old["median_ms"] <= 0:
+            continue
+        change = row["median_ms"] / old["median_ms"] - 1
+        if change > threshold:
+            regressions.append(
+                {
+                    "stage": row["stage"],
+                    "size": row["size"],
+                    "baseline_median_ms": old["median_ms"],
+                    "median_ms": row["median_ms"],
+                    "change": change,
+                }
+            )
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the offline per-stage benchmarks."
+    )
+    parser.add_argument(
+        "--rounds", type=int, default=5, help="Timed rounds per stage and size."
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.0, help="Simulated seconds per LLM call."
+    )
+    parser.add_argument(
+        "--embedding-latency",
+        type=float,
+        default=0.0,
+        help="Simulated seconds per embedding call.",
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Baseline JSON file from an earlier run.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed relative slowdown before failing.",
+    )
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.rounds, args.llm_latency, args.embedding_latency)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "rounds": args.rounds,
+            "llm_latency": args.llm_latency,
+            "embedding_latency": args.embedding_latency,
+            "sizes": {name: list(shape) for name, shape in SIZES.items()},
+        },
+        "results": results,
+    }
+
+    for row in results:
+        print(
+            f"{row['stage']:<34} {row['size']:<7} median {row['median_ms']:9.2f} ms  "
+            f"p95 {row['p95_ms']:9.2f} ms"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare_results(results, baseline, args.threshold)
+        for row in regressions:
+            print(
+                f"REGRESSION {row['stage']} [{row['size']}]: "
+                f"{row['baseline_median_ms']:.2f} ms -> {row['median_ms']:.2f} ms "
+                f"(+{row['change']:.0%})",
+                file=sys.stderr,
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Section detection time of the line-anchored indexer against the previous regex.
+
+Usage:
+    python -m benchmarks.section_detection
+    python -m benchmarks.section_detection --repeats 1 10 100 1000 --rounds 5
+
+A short sample resume is repeated --repeats times, and for each size the
+report shows the best time of `index_resume_sections` and of the lookahead
+regex it replaced, together with the speedup.
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from modules.resume_parser import index_resume_sections
+
+SAMPLE_RESUME = (
+    "Jane Doe\njane@example.com\n"
+    "Education\nB.Sc. Computer Science, Example University, 2020\n"
+    "Work Experience\nSoftware Engineer, ACME, 2020 - Present\n"
+    "- Built data pipelines with strong engineering skills and experience\n"
+    "Skills: Python, SQL, Docker\n"
+    "Projects\nResume rewriter using retrieval-augmented generation\n"
+    "Awards\nDean's list\n"
+)
+
+
+def legacy_detect_resume_sections(text):
+    """The previous lookahead-regex section detector."""
+    section_headers = [
+        "Education",
+        "Work Experience",
+        "Experience",
+        "Skills",
+        "Certifications",
+        "Hobbies",
+        "Interests",
+        "Projects",
+        "Awards",
+    ]
+    regex = (
+        r"(?i)(\b(?:"
+        + "|".join(map(re.escape, section_headers))
+        + r")\b.*?)(?=\b(?:"
+        + "|".join(map(re.escape, section_headers))
+        + r")\b|$)"
+    )
+    return re.findall(regex, text, re.DOTALL)
+
+
+def benchmark_section_detection(repeats=(1, 10, 100, 1000), rounds=5):
+    """
+    Compare `index_resume_sections` with the previous lookahead regex on growing inputs.
+
+    Args:
+        repeats (iterable): How many times the sample resume is repeated per input.
+        rounds (int): Timing rounds per input; the best round is reported.
+
+    Returns:
+        list: One dict per input size with the timings in milliseconds.
+    """
+    results = []
+    for repeat in repeats:
+        text = SAMPLE_RESUME * repeat
+        timings = {}
+        for name, detect in (
+            ("legacy_ms", legacy_detect_resume_sections),
+            ("indexed_ms", index_resume_sections),
+        ):
+            best = float("inf")
+            for _ in range(rounds):
+                start = time.perf_counter()
+                detect(text)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best * 1000
+        results.append({"chars": len(text), **timings})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare section detection with the previous lookahead regex."
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100, 1000],
+        help="How many times the sample resume is repeated.",
+    )
+    parser.add_argument("--rounds", type=int, default=5, help="Timed runs per size.")
+    args = parser.parse_args(argv)
+
+    for row in benchmark_section_detection(sorted(args.repeats), args.rounds):
+        print(
+            f"{row['chars']:>10} chars  legacy {row['legacy_ms']:9.2f} ms  "
+            f"indexed {row['indexed_ms']:9.2f} ms  "
+            f"speedup {row['legacy_ms'] / max(row['indexed_ms'], 1e-9):6.1f}x"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
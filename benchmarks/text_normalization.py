@@ -0,0 +1,159 @@
+"""
+Throughput and savings of the extracted-text normalization passes on large inputs.
+
+Usage:
+    python -m benchmarks.text_normalization
+    python -m benchmarks.text_normalization --copies 1 10 100 --rounds 5
+    python -m benchmarks.text_normalization --min-throughput 5
+
+The large synthetic resume (benchmarks/corpus.py) is repeated --copies
+times and given the artifacts of PDF extraction: running headers, page
+numbers, bullet glyphs, ligatures, hyphenated line breaks and stray
+whitespace. For each size the report shows the time of the single-pass
+`normalize_text` with all passes, the time of applying the same passes one
+after another, the throughput, and the characters and estimated tokens
+each pass removed. With --min-throughput the command exits with a non-zero
+status when the single pass normalizes fewer MB per second on the largest
+input. Before timing, the command checks the output of `EXPECTED_OUTPUTS`,
+small inputs with a known normalization, and exits with a non-zero status
+on any difference.
+"""
+
+import argparse
+import sys
+import time
+
+from benchmarks.corpus import noisy_extracted_text, synthetic_resume
+from modules.llm_pipeline import estimate_tokens
+from modules.pdf_utils import NORMALIZATION_PASSES, normalize_text
+
+# Extracted text -> the text `normalize_text` must turn it into with all passes
+EXPECTED_OUTPUTS = [
+    # Words hyphenated across a line break keep their hyphen
+    ("A self-\nmotivated engineer", "A self-motivated engineer"),
+    # An icon-font glyph between words separates them instead of joining them
+    ("Skills: Python\uf0b7 SQL \ue001 Docker", "Skills: Python SQL Docker"),
+    ("\ue001 +1 555 0100\n\uf0b7 Python", "+1 555 0100\n- Python"),
+    # Lines repeated on the two pages of a short resume are content
+    (
+        "EXPERIENCE\nAcme Corp\n2019 - 2021\fEDUCATION\nMIT\n2019 - 2021",
+        "EXPERIENCE\nAcme Corp\n2019 - 2021\nEDUCATION\nMIT\n2019 - 2021",
+    ),
+    (
+        "Jane Doe\nSkills\nPage 1 of 2\fEducation\nMIT\nPage 2 of 2",
+        "Jane Doe\nSkills\nEducation\nMIT",
+    ),
+]
+
+
+def check_outputs():
+    """Return the (input, expected, actual) of the `EXPECTED_OUTPUTS` that differ."""
+    failures = []
+    for text, expected in EXPECTED_OUTPUTS:
+        actual, _ = normalize_text(text)
+        if actual != expected:
+            failures.append((text, expected, actual))
+    return failures
+
+
+def _best_seconds(fn, rounds):
+    best = float("inf")
+    for _ in range(max(rounds, 1)):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _one_pass_at_a_time(text):
+    """Apply every pass on its own, one scan of the text per pass."""
+    for name in NORMALIZATION_PASSES:
+        text, _ = normalize_text(text, (name,))
+    return text
+
+
+def measure(copies, rounds=3, seed=0):
+    """
+    Normalize a noisy resume repeated `copies` times.
+
+    Returns:
+        dict: Input size, timings, throughput and the per-pass report.
+    """
+    text = noisy_extracted_text(synthetic_resume("large", seed) * copies, seed=seed)
+    normalized, report = normalize_text(text)
+    single = _best_seconds(lambda: normalize_text(text), rounds)
+    sequential = _best_seconds(lambda: _one_pass_at_a_time(text), rounds)
+    return {
+        "copies": copies,
+        "chars": len(text),
+        "tokens_before": estimate_tokens(text),
+        "tokens_after": estimate_tokens(normalized),
+        "single_pass_ms": single * 1000,
+        "pass_by_pass_ms": sequential * 1000,
+        "mb_per_s": len(text.encode("utf-8")) / single / 1e6,
+        "report": report,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the text normalization passes on large inputs."
+    )
+    parser.add_argument(
+        "--copies",
+        type=int,
+        nargs="+",
+        default=[1, 10, 100],
+        help="How many times the large resume is repeated.",
+    )
+    parser.add_argument("--rounds", type=int, default=3, help="Timed runs per size.")
+    parser.add_argument(
+        "--min-throughput",
+        type=float,
+        help="Fail when the single pass is slower than this many MB/s.",
+    )
+    args = parser.parse_args(argv)
+
+    failures = check_outputs()
+    for text, expected, actual in failures:
+        print(
+            f"WRONG OUTPUT: {text!r} -> {actual!r}, expected {expected!r}",
+            file=sys.stderr,
+        )
+    if failures:
+        return 1
+
+    reports = [measure(copies, args.rounds) for copies in sorted(args.copies)]
+
+    print(
+        f"{'copies':>6} {'chars':>10} {'tokens':>17} {'single ms':>10} "
+        f"{'pass-by-pass ms':>16} {'MB/s':>7}"
+    )
+    for report in reports:
+        tokens = f"{report['tokens_before']} -> {report['tokens_after']}"
+        print(
+            f"{report['copies']:>6} {report['chars']:>10} {tokens:>17} "
+            f"{report['single_pass_ms']:10.1f} {report['pass_by_pass_ms']:16.1f} "
+            f"{report['mb_per_s']:7.1f}"
+        )
+
+    largest = reports[-1]
+    print(f"\nremoved per pass ({largest['copies']} copies)")
+    for name, removed in largest["report"].items():
+        print(
+            f"  {name:<15} {removed['chars_removed']:>9} chars "
+            f"{removed['tokens_removed']:>8} tokens"
+        )
+
+    if args.min_throughput is not None and largest["mb_per_s"] < args.min_throughput:
+        print(
+            f"TOO SLOW: {largest['mb_per_s']:.1f} MB/s "
+            f"(minimum {args.min_throughput:.1f} MB/s)",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
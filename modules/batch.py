@@ -0,0 +1,305 @@
+"""
+Headless batch rewriting of resumes.
+
+Usage:
+    python -m modules.batch resumes/ "intake/*.pdf" --output-dir batch_output
+
+Results are appended to <output-dir>/results.jsonl as each resume finishes,
+and rewritten resumes are written to <output-dir>/docx/. Resumes already
+recorded in results.jsonl are skipped, so an interrupted run picks up where
+it stopped.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from modules.llm_cache import get_default_cache
+from modules.llm_pipeline import setup_rag_pipeline
+from modules.markdown_to_docx import convert_markdown_to_docx
+from modules.pdf_utils import clean_extracted_text, extract_pdf_text
+from modules.rate_limiter import get_rate_limiter
+from modules.knowledge_base import (
+    DEFAULT_GUIDE,
+    guide_filter,
+    load_or_create_knowledge_base,
+    validate_guide,
+)
+from modules.resume_parser import process_full_resume, process_resume
+from modules.tracing import start_trace
+
+
+def find_pdfs(inputs):
+    """
+    Expand directories and glob patterns into a sorted list of PDF paths.
+
+    Args:
+        inputs (list): Directories, PDF paths or glob patterns.
+
+    Returns:
+        list: Unique PDF paths.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(glob.glob(os.path.join(item, "**", "*.pdf"), recursive=True))
+        else:
+            paths.update(
+                path
+                for path in glob.glob(item, recursive=True)
+                if path.lower().endswith(".pdf")
+            )
+    return sorted(paths)
+
+
+def file_digest(path):
+    """Return the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_checkpoint(results_path):
+    """Return the digests of resumes that already completed successfully."""
+    done = set()
+    if not os.path.exists(results_path):
+        return done
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run
+                continue
+            if record.get("status") == "ok":
+                done.add(record["sha256"])
+    return done
+
+
+def rewrite_resume(
+    path, digest, chains, vector_store, docx_dir, max_concurrency, guide_filter=None
+):
+    """
+    Run the rewrite pipeline for one PDF.
+
+    Returns:
+        dict: The JSONL record for the resume.
+    """
+    feedback_chain, rewrite_chain, full_rewrite_chain, map_rewrite_chain = chains
+    start = time.perf_counter()
+
+    with start_trace("batch_resume", path=path):
+        resume_text = clean_extracted_text(extract_pdf_text(path))
+        feedback, improved_sections = process_resume(
+            resume_text,
+            feedback_chain,
+            rewrite_chain,
+            vector_store,
+            max_concurrency,
+            guide_filter=guide_filter,
+        )
+        full_resume = process_full_resume(
+            feedback,
+            resume_text,
+            full_rewrite_chain,
+            max_concurrency,
+            map_rewrite_chain=map_rewrite_chain,
+        )
+
+        docx_path = None
+        if docx_dir is not None:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            docx_path = os.path.join(docx_dir, f"{stem}-{digest[:8]}.docx")
+            convert_markdown_to_docx(full_resume, docx_path)
+
+    return {
+        "path": path,
+        "sha256": digest,
+        "status": "ok",
+        "feedback": feedback,
+        "improved_sections": improved_sections,
+        "full_resume": full_resume,
+        "docx_path": docx_path,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def run_batch(
+    inputs,
+    output_dir="batch_output",
+    workers=4,
+    llm_concurrency=8,
+    write_docx=True,
+    use_cache=True,
+    guide=DEFAULT_GUIDE,
+):
+    """
+    Rewrite every PDF matched by `inputs`, appending results to a JSONL file.
+
+    Args:
+        inputs (list): Directories, PDF paths or glob patterns.
+        output_dir (str): Directory for results.jsonl and the DOCX files.
+        workers (int): Number of resumes processed at once.
+        llm_concurrency (int): Maximum number of LLM calls in flight across all workers.
+        write_docx (bool): Write a DOCX file for every rewritten resume.
+        use_cache (bool): Answer repeated LLM calls from the response cache.
+        guide (str): The knowledge base guide to follow; empty searches all guides.
+
+    Returns:
+        dict: Counts of processed, skipped and failed resumes, elapsed seconds
+            and throughput in resumes per minute.
+
+    Raises:
+        ValueError: If `guide` is not a guide of the knowledge base.
+    """
+    validate_guide(guide)
+    os.makedirs(output_dir, exist_ok=True)
+    docx_dir = os.path.join(output_dir, "docx") if write_docx else None
+    if docx_dir is not None:
+        os.makedirs(docx_dir, exist_ok=True)
+    results_path = os.path.join(output_dir, "results.jsonl")
+
+    done = load_checkpoint(results_path)
+    pending = []
+    skipped = 0
+    for path in find_pdfs(inputs):
+        digest = file_digest(path)
+        if digest in done:
+            skipped += 1
+        else:
+            done.add(digest)  # Also skips duplicate files within this run
+            pending.append((path, digest))
+
+    vector_store = load_or_create_knowledge_base()
+
+    # Caps the LLM calls in flight; cache hits and rate limiter waits do not count
+    chains = setup_rag_pipeline(
+        vector_store,
+        cache=get_default_cache() if use_cache else None,
+        limiter=get_rate_limiter(),
+        semaphore=threading.BoundedSemaphore(llm_concurrency),
+    )
+
+    write_lock = threading.Lock()
+    processed = failed = 0
+    start = time.perf_counter()
+
+    with open(results_path, "a", encoding="utf-8") as results_file, ThreadPoolExecutor(
+        max_workers=max(workers, 1)
+    ) as pool:
+        futures = {
+            pool.submit(
+                rewrite_resume,
+                path,
+                digest,
+                chains,
+                vector_store,
+                docx_dir,
+                llm_concurrency,
+                guide_filter(guide),
+            ): (path, digest)
+            for path, digest in pending
+        }
+        for future in as_completed(futures):
+            path, digest = futures[future]
+            try:
+                record = future.result()
+                processed += 1
+            except Exception as error:
+                record = {
+                    "path": path,
+                    "sha256": digest,
+                    "status": "error",
+                    "error": repr(error),
+                }
+                failed += 1
+
+            with write_lock:
+                results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                results_file.flush()
+                os.fsync(results_file.fileno())
+            print(
+                f"[{processed + failed}/{len(pending)}] {record['status']}: {path}",
+                file=sys.stderr,
+            )
+
+    elapsed = time.perf_counter() - start
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": elapsed,
+        "resumes_per_minute": processed / elapsed * 60 if elapsed > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Rewrite a directory of PDF resumes with the Harvard guideline pipeline."
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="Directories, PDF files or glob patterns."
+    )
+    parser.add_argument(
+        "--output-dir",
+        default="batch_output",
+        help="Where results.jsonl and DOCX files are written.",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Number of resumes processed at once."
+    )
+    parser.add_argument(
+        "--llm-concurrency",
+        type=int,
+        default=8,
+        help="Maximum LLM calls in flight across all workers.",
+    )
+    parser.add_argument(
+        "--no-docx", action="store_true", help="Only write results.jsonl."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always call the LLM instead of the response cache.",
+    )
+    parser.add_argument(
+        "--guide",
+        default=DEFAULT_GUIDE,
+        help='Guide of the knowledge base to follow; "" searches all guides.',
+    )
+    args = parser.parse_args(argv)
+
+    if not os.environ.get("GOOGLE_API_KEY"):
+        parser.error("GOOGLE_API_KEY must be set in the environment.")
+    try:
+        validate_guide(args.guide)
+    except ValueError as error:
+        parser.error(str(error))
+
+    summary = run_batch(
+        args.inputs,
+        output_dir=args.output_dir,
+        workers=args.workers,
+        llm_concurrency=args.llm_concurrency,
+        write_docx=not args.no_docx,
+        use_cache=not args.no_cache,
+        guide=args.guide,
+    )
+    print(
+        f"Processed {summary['processed']} resumes ({summary['skipped']} skipped, "
+        f"{summary['failed']} failed) in {summary['seconds']:.1f}s: "
+        f"{summary['resumes_per_minute']:.1f} resumes/minute"
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+CPU inference backends for sentence-transformers embedding models.
+
+torch: The full-precision PyTorch model through `HuggingFaceEmbeddings`.
+int8: The PyTorch model with its Linear layers dynamically quantized to int8.
+onnx: An ONNX Runtime export of the model (requires `optimum[onnxruntime]`).
+
+ONNX exports are cached under `DEFAULT_MODEL_CACHE_DIR`, so the export
+runs once per host. This module imports torch and is only
+imported once a model is loaded.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_MODEL_CACHE_DIR = os.path.join(".cache", "embedding_models")
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """LangChain embeddings over a loaded `SentenceTransformer`, encoding like `HuggingFaceEmbeddings`."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def embed_documents(self, texts):
+        texts = [text.replace("\n", " ") for text in texts]
+        return self.client.encode(texts, show_progress_bar=False).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def _cache_path(cache_dir, model_name, backend):
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name)
+    return os.path.join(cache_dir, f"{slug}-{backend}")
+
+
+def _save_atomically(path, save):
+    """Call save(tmp_path) and move the result into place, so readers never see a partial model."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(path))
+    try:
+        save(tmp_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    try:
+        os.replace(tmp_dir, path)
+    except OSError:
+        # Another process won the race; its model is just as good as ours.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_torch(model_name, cache_dir=DEFAULT_MODEL_CACHE_DIR):
+    """Load the full-precision PyTorch model."""
+    from langchain.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def load_int8(model_name, cache_dir=DEFAULT_MODEL_CACHE_DIR):
+    """
+    Load the model with int8 dynamic quantization of its Linear layers.
+
+    Quantizing takes well under a second on load, so unlike the ONNX export
+    the result is not cached.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = torch.quantization.quantize_dynamic(
+        SentenceTransformer(model_name, device="cpu"),
+        {torch.nn.Linear},
+        dtype=torch.qint8,
+    )
+    return SentenceTransformerEmbeddings(model)
+
+
+def load_onnx(model_name, cache_dir=DEFAULT_MODEL_CACHE_DIR):
+    """Load an ONNX Runtime export of the model, exporting it on first use."""
+    try:
+        import onnxruntime  # noqa: F401
+        import optimum  # noqa: F401
+    except ImportError as error:
+        raise ImportError(
+            "The onnx embedding backend requires `pip install optimum[onnxruntime]`."
+        ) from error
+    from sentence_transformers import SentenceTransformer
+
+    path = _cache_path(cache_dir, model_name, "onnx")
+    if os.path.isdir(path):
+        return SentenceTransformerEmbeddings(
+            SentenceTransformer(path, backend="onnx", device="cpu")
+        )
+
+    model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+    _save_atomically(path, model.save_pretrained)
+    return SentenceTransformerEmbeddings(model)
+
+
+LOADERS = {"torch": load_torch, "int8": load_int8, "onnx": load_onnx}
+
+
+def load_backend(model_name, backend="torch", cache_dir=DEFAULT_MODEL_CACHE_DIR):
+    """
+    Load a sentence-transformers model with an inference backend.
+
+    Args:
+        model_name (str): The HuggingFace model name or a local model directory.
+        backend (str): One of "torch", "int8" and "onnx".
+        cache_dir (str): Where converted models are cached.
+
+    Returns:
+        Embeddings: A LangChain embeddings object.
+    """
+    if backend not in LOADERS:
+        raise ValueError(
+            f"Unknown embedding backend {backend!r}; choose one of {', '.join(LOADERS)}."
+        )
+    return LOADERS[backend](model_name, cache_dir)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,477 @@
+"""
+A local embedding server shared by all Streamlit worker processes of a host.
+
+Usage:
+    python -m modules.embedding_service --address 127.0.0.1:8765
+    EMBEDDING_SERVICE=127.0.0.1:8765 streamlit run app.py
+
+The server loads each embedding model once and merges the requests of all
+connected processes into micro-batches, bounded by --max-batch-size texts
+and --max-wait-ms of added latency. Processes talk to it through
+`RemoteEmbeddings`, which `get_embeddings` returns when EMBEDDING_SERVICE
+is set, and which embeds in-process while the server is unreachable.
+
+`multiprocessing.connection` unpickles what it receives, so a client that
+knows the shared secret can run code in the server. The secret is taken
+from EMBEDDING_SERVICE_KEY, or else generated by the server into a key
+file only its user can read (see `load_authkey`). The server refuses to
+listen on a non-loopback address unless EMBEDDING_SERVICE_KEY is set.
+"""
+
+import argparse
+import ipaddress
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+from langchain_core.embeddings import Embeddings
+
+from modules.embeddings import DEFAULT_EMBEDDING_MODEL, get_local_embeddings
+
+logger = logging.getLogger(__name__)
+
+# Shared secret of the server and its clients; when unset, the server
+# generates one into AUTHKEY_FILE and clients on the same host read it there
+AUTHKEY_ENV = "EMBEDDING_SERVICE_KEY"
+AUTHKEY_FILE = os.path.join(".cache", "embedding_service.key")
+
+DEFAULT_MAX_BATCH_SIZE = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+
+
+def parse_address(address):
+    """Turn "host:port" into a (host, port) tuple; anything else is a Unix socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def load_authkey(create=False, path=AUTHKEY_FILE):
+    """
+    Return the shared secret of the embedding server and its clients.
+
+    Args:
+        create (bool): Generate the key file if it does not exist, as the
+            server does on start.
+        path (str): The key file used when EMBEDDING_SERVICE_KEY is unset.
+
+    Returns:
+        bytes or None: The secret, or None when it is neither set nor created.
+    """
+    key = os.environ.get(AUTHKEY_ENV)
+    if key:
+        return key.encode("utf-8")
+    try:
+        with open(path, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        if not create:
+            return None
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    key = secrets.token_hex(32).encode("ascii")
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another server created it first
+        return load_authkey(path=path)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+
+def is_loopback(address):
+    """Return True if an address from `parse_address` is only reachable from this host."""
+    if isinstance(address, str):
+        return True  # A Unix socket path
+    host = address[0]
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _concatenated(futures):
+    """Return a Future of the results of `futures` concatenated in order."""
+    combined = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        for future in futures:
+            if future.exception() is not None:
+                combined.set_exception(future.exception())
+                return
+        combined.set_result(
+            [vector for future in futures for vector in future.result()]
+        )
+
+    for future in futures:
+        future.add_done_callback(on_done)
+    return combined
+
+
+class MicroBatcher:
+    """
+    Merge concurrent embedding requests into batches and embed each batch with one call.
+
+    A batch is closed when the next request would take it over
+    `max_batch_size` texts or when `max_wait` seconds have passed since its
+    first request arrived, whichever comes first. Under low load a request
+    therefore waits at most `max_wait`; under high load batches fill up
+    immediately. A request with more than `max_batch_size` texts is split
+    across batches.
+    """
+
+    def __init__(self, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=0.005):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._texts = 0
+        self._batches = 0
+        self._max_batch = 0
+        self._carry = None  # A request that did not fit the previous batch
+        self._thread = threading.Thread(
+            target=self._loop, name="embedding-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, model_name, texts):
+        """
+        Queue texts for embedding.
+
+        Returns:
+            concurrent.futures.Future: Resolves to one vector per text.
+        """
+        texts = list(texts)
+        if len(texts) <= self.max_batch_size:
+            future = Future()
+            self._queue.put((model_name, texts, future))
+            return future
+
+        futures = []
+        for start in range(0, len(texts), self.max_batch_size):
+            futures.append(Future())
+            self._queue.put(
+                (model_name, texts[start : start + self.max_batch_size], futures[-1])
+            )
+        return _concatenated(futures)
+
+    def _collect(self):
+        if self._carry is not None:
+            batch, self._carry = [self._carry], None
+        else:
+            batch = [self._queue.get()]
+        size = len(batch[0][1])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(item[1]) > self.max_batch_size:
+                # Starts the next batch instead
+                self._carry = item
+                break
+            batch.append(item)
+            size += len(item[1])
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+
+            by_model = {}
+            for item in batch:
+                by_model.setdefault(item[0], []).append(item)
+
+            for model_name, items in by_model.items():
+                texts = [text for _, item_texts, _ in items for text in item_texts]
+                try:
+                    vectors = get_local_embeddings(model_name).embed_documents(texts)
+                except Exception as error:
+                    for _, _, future in items:
+                        future.set_exception(error)
+                    continue
+
+                start = 0
+                for _, item_texts, future in items:
+                    future.set_result(vectors[start : start + len(item_texts)])
+                    start += len(item_texts)
+
+                with self._stats_lock:
+                    self._requests += len(items)
+                    self._texts += len(texts)
+                    self._batches += 1
+                    self._max_batch = max(self._max_batch, len(texts))
+
+    def stats(self):
+        """Return request, text and batch counters."""
+        with self._stats_lock:
+            return {
+                "requests": self._requests,
+                "texts": self._texts,
+                "batches": self._batches,
+                "mean_batch_size": self._texts / self._batches if self._batches else 0,
+                "max_batch_size": self._max_batch,
+                "queued": self._queue.qsize(),
+            }
+
+
+class EmbeddingServer:
+    """
+    Serve embedding requests over `multiprocessing.connection`, one thread per client connection.
+
+    Messages are tuples: ("embed", model_name, texts) is answered with
+    ("ok", vectors), ("stats",) with ("ok", stats) and ("ping",) with
+    ("ok", None). Failures are answered with ("error", message).
+    """
+
+    def __init__(
+        self,
+        address,
+        authkey=None,
+        max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+        max_wait_ms=DEFAULT_MAX_WAIT_MS,
+    ):
+        """
+        Args:
+            address (str): "host:port" or a Unix socket path to listen on.
+            authkey (bytes, optional): The shared secret. Defaults to
+                EMBEDDING_SERVICE_KEY, or a key generated into AUTHKEY_FILE,
+                which is only accepted for loopback addresses.
+            max_batch_size (int): Maximum texts embedded in one batch.
+            max_wait_ms (float): Maximum time a request waits for its batch to fill.
+        """
+        address = parse_address(address)
+        if authkey is None:
+            if not is_loopback(address) and not os.environ.get(AUTHKEY_ENV):
+                raise ValueError(
+                    f"Refusing to serve embeddings on {address} without a key: set "
+                    f"{AUTHKEY_ENV} on the server and its clients, or listen on "
+                    "127.0.0.1 or a Unix socket."
+                )
+            authkey = load_authkey(create=True)
+        # The default backlog of 1 drops connections when several processes
+        # connect at once
+        self.listener = Listener(address, backlog=64, authkey=authkey)
+        self.batcher = MicroBatcher(max_batch_size, max_wait_ms / 1000)
+
+    @property
+    def address(self):
+        return self.listener.address
+
+    def serve_forever(self):
+        """Accept client connections until the listener is closed."""
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:
+                # Closed by `close`
+                return
+            except Exception:
+                # E.g. a client with the wrong authkey
+                logger.exception("Rejected an embedding client")
+                continue
+            threading.Thread(
+                target=self._serve_connection, args=(connection,), daemon=True
+            ).start()
+
+    def _serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    return
+                response = self._handle(message)
+                try:
+                    connection.send(response)
+                except (EOFError, OSError):
+                    # The client disconnected while its request was embedded
+                    return
+
+    def _handle(self, message):
+        try:
+            if message[0] == "embed":
+                _, model_name, texts = message
+                return "ok", self.batcher.submit(model_name, texts).result()
+            if message[0] == "stats":
+                return "ok", self.batcher.stats()
+            if message[0] == "ping":
+                return "ok", None
+            return "error", f"Unknown request: {message[0]!r}"
+        except Exception as error:
+            return "error", f"{type(error).__name__}: {error}"
+
+    def close(self):
+        self.listener.close()
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    LangChain embeddings backed by a shared `EmbeddingServer`, with in-process fallback.
+
+    Connections are pooled and reused across calls and threads. When the
+    server cannot be reached, or answers with an error, the texts are
+    embedded in-process with `get_local_embeddings`, and the server is not
+    tried again for `retry_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        model_name,
+        address,
+        authkey=None,
+        pool_size=4,
+        timeout=30.0,
+        retry_interval=30.0,
+    ):
+        """
+        Args:
+            model_name (str): The model the server embeds with.
+            address (str): "host:port" or a Unix socket path of the server.
+            authkey (bytes, optional): The server's shared secret; defaults to
+                `load_authkey()`, read when the first connection is opened.
+            pool_size (int): Maximum connections open to the server at once.
+            timeout (float): Seconds to wait for an answer before falling back.
+            retry_interval (float): Seconds to embed in-process after a failure.
+        """
+        self.model_name = model_name
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.fallbacks = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._down_until = 0.0
+
+    def _request(self, message):
+        with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                if self.authkey is None:
+                    self.authkey = load_authkey()
+                if self.authkey is None:
+                    raise ConnectionError(
+                        f"No key for the embedding server: set {AUTHKEY_ENV} "
+                        f"or start the server on this host to create {AUTHKEY_FILE}."
+                    )
+                connection = Client(self.address, authkey=self.authkey)
+            try:
+                connection.send(message)
+                if not connection.poll(self.timeout):
+                    raise TimeoutError("The embedding server did not answer in time.")
+                reply = connection.recv()
+            except BaseException:
+                connection.close()
+                raise
+            self._idle.put(connection)
+        return reply
+
+    def embed_documents(self, texts):
+        """Embed texts on the server, or in-process while it is unavailable."""
+        if not texts:
+            return []
+
+        if time.monotonic() >= self._down_until:
+            try:
+                status, payload = self._request(("embed", self.model_name, list(texts)))
+            except Exception as error:
+                status, payload = "error", f"{type(error).__name__}: {error}"
+            if status == "ok":
+                return payload
+            self._down_until = time.monotonic() + self.retry_interval
+            logger.warning(
+                "Embedding server at %s failed (%s); embedding in-process for %.0fs",
+                self.address,
+                payload,
+                self.retry_interval,
+            )
+
+        self.fallbacks += 1
+        return get_local_embeddings(self.model_name).embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def server_stats(self):
+        """Return the server's batching statistics, or None if it is unreachable."""
+        try:
+            status, payload = self._request(("stats",))
+        except Exception:
+            return None
+        return payload if status == "ok" else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve embeddings to all app processes of this host."
+    )
+    parser.add_argument(
+        "--address",
+        default="127.0.0.1:8765",
+        help='"host:port" or a Unix socket path to listen on.',
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=DEFAULT_MAX_BATCH_SIZE,
+        help="Maximum texts embedded in one batch.",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=DEFAULT_MAX_WAIT_MS,
+        help="Maximum time a request waits for its batch to fill.",
+    )
+    parser.add_argument(
+        "--preload",
+        default=DEFAULT_EMBEDDING_MODEL,
+        help="Model to load before accepting requests.",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        server = EmbeddingServer(
+            args.address,
+            max_batch_size=args.max_batch_size,
+            max_wait_ms=args.max_wait_ms,
+        )
+    except ValueError as error:
+        parser.error(str(error))
+
+    # Connections wait in the listen backlog until the model is loaded
+    if args.preload:
+        get_local_embeddings(args.preload)
+    logger.info("Serving embeddings on %s", server.address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
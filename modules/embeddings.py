@@ -0,0 +1,228 @@
+import logging
+import os
+import sys
+import threading
+import time
+
+from modules.tracing import span
+
+# CPU inference backend of in-process models: "torch", "int8" or "onnx",
+# see modules/embedding_backends.py
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx")
+
+
+def embedding_model_spec(model_name, backend="torch"):
+    """
+    Combine a model name and an inference backend into the name models are keyed by.
+
+    The torch backend keeps the bare model name, so existing vector store
+    caches stay valid; the others append "@<backend>".
+
+    Args:
+        model_name (str): The HuggingFace sentence-transformers model name.
+        backend (str): One of `EMBEDDING_BACKENDS`.
+
+    Returns:
+        str: The model spec, e.g. "sentence-transformers/all-MiniLM-L6-v2@int8".
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(
+            f"Unknown embedding backend {backend!r}; "
+            f"choose one of {', '.join(EMBEDDING_BACKENDS)}."
+        )
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def split_model_spec(model_spec):
+    """Return the (model name, backend) pair of a spec built by `embedding_model_spec`."""
+    model_name, _, backend = model_spec.rpartition("@")
+    if model_name and backend in EMBEDDING_BACKENDS:
+        return model_name, backend
+    return model_spec, "torch"
+
+
+DEFAULT_EMBEDDING_MODEL = embedding_model_spec(
+    "sentence-transformers/all-MiniLM-L6-v2", EMBEDDING_BACKEND
+)
+
+# Address of a shared embedding server ("host:port" or a Unix socket path),
+# see modules/embedding_service.py. Unset embeds in-process.
+EMBEDDING_SERVICE_ADDRESS = os.environ.get("EMBEDDING_SERVICE")
+
+logger = logging.getLogger(__name__)
+
+# Process-wide registry: model name -> loaded embeddings and load statistics.
+_models = {}
+_stats = {}
+_registry_lock = threading.Lock()
+_model_locks = {}
+_clients = {}
+
+
+def _resident_memory_bytes():
+    """Return the resident set size of this process in bytes, or 0 where unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0
+    # Not on Linux: fall back to the peak RSS, which macOS reports in bytes
+    # and the other Unixes in KiB.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def get_embeddings(model_name=DEFAULT_EMBEDDING_MODEL):
+    """
+    Return the embeddings object for a model that all sessions of the process share.
+
+    With `EMBEDDING_SERVICE` set this is a client of the shared embedding
+    server, which falls back to `get_local_embeddings` while the server is
+    unreachable. Otherwise the model is loaded in this process. Embeddings
+    registered with `register_embeddings` take precedence over both.
+
+    Args:
+        model_name (str): The HuggingFace sentence-transformers model name.
+
+    Returns:
+        Embeddings: A LangChain embeddings object.
+    """
+    embeddings = _models.get(model_name)
+    if embeddings is not None or not EMBEDDING_SERVICE_ADDRESS:
+        return embeddings or get_local_embeddings(model_name)
+
+    with _registry_lock:
+        client = _clients.get(model_name)
+        if client is None:
+            from modules.embedding_service import RemoteEmbeddings
+
+            client = RemoteEmbeddings(model_name, EMBEDDING_SERVICE_ADDRESS)
+            _clients[model_name] = client
+    return client
+
+
+def get_local_embeddings(model_name=DEFAULT_EMBEDDING_MODEL):
+    """
+    Return the in-process embeddings object for a model, loading it on first use.
+
+    The model weights and tokenizer are loaded once per process. Concurrent
+    callers asking for the same model wait for the single load in progress
+    instead of starting their own. A spec from `embedding_model_spec` loads
+    the model with that inference backend.
+
+    Args:
+        model_name (str): The HuggingFace sentence-transformers model name or spec.
+
+    Returns:
+        Embeddings: The embeddings object shared by all sessions.
+    """
+    embeddings = _models.get(model_name)
+    if embeddings is not None:
+        return embeddings
+
+    with _registry_lock:
+        model_lock = _model_locks.setdefault(model_name, threading.Lock())
+
+    with model_lock:
+        embeddings = _models.get(model_name)
+        if embeddings is None:
+            rss_before = _resident_memory_bytes()
+            start = time.perf_counter()
+            name, backend = split_model_spec(model_name)
+            with span("embeddings.load", model=name, backend=backend):
+                # Imported here: sentence-transformers pulls in torch
+                from modules.embedding_backends import load_backend
+
+                embeddings = load_backend(name, backend)
+            load_seconds = time.perf_counter() - start
+            rss_after = _resident_memory_bytes()
+
+            _stats[model_name] = {
+                "backend": backend,
+                "load_seconds": load_seconds,
+                "rss_delta_bytes": max(rss_after - rss_before, 0),
+                "rss_after_bytes": rss_after,
+            }
+            _models[model_name] = embeddings
+            logger.info(
+                "Loaded embedding model %s in %.2fs (+%.1f MiB RSS)",
+                model_name,
+                load_seconds,
+                _stats[model_name]["rss_delta_bytes"] / 2**20,
+            )
+    return embeddings
+
+
+def register_embeddings(model_name, embeddings):
+    """
+    Register an already constructed embeddings object under a model name.
+
+    Later `get_embeddings(model_name)` calls return it instead of loading a
+    model, e.g. to plug in a local stand-in for benchmarks.
+
+    Args:
+        model_name (str): The name to register the embeddings under.
+        embeddings: Any LangChain `Embeddings` implementation.
+    """
+    with _registry_lock:
+        _models[model_name] = embeddings
+
+
+def get_embedding_stats():
+    """
+    Return load statistics for every model loaded so far.
+
+    Returns:
+        dict: Model name -> {"backend", "load_seconds", "rss_delta_bytes",
+            "rss_after_bytes"}.
+    """
+    return {name: dict(stats) for name, stats in _stats.items()}
+
+
+_warm_up_started = set()
+
+
+def warm_up_embeddings(model_names=(DEFAULT_EMBEDDING_MODEL,), background=True):
+    """
+    Load embedding models ahead of the first request.
+
+    Calling this more than once is cheap: each model is only warmed up once.
+
+    Args:
+        model_names (iterable): The models to load.
+        background (bool): Load in a daemon thread instead of blocking the caller.
+
+    Returns:
+        threading.Thread or None: The loader thread when `background` is True.
+    """
+    with _registry_lock:
+        pending = [name for name in model_names if name not in _warm_up_started]
+        _warm_up_started.update(pending)
+
+    if not pending:
+        return None
+
+    def _load():
+        for name in pending:
+            try:
+                get_embeddings(name)
+            except Exception:
+                logger.exception("Warm-up of embedding model %s failed", name)
+
+    if not background:
+        _load()
+        return None
+
+    thread = threading.Thread(target=_load, name="embedding-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Pipeline runs executed at once per server process; further jobs queue
+DEFAULT_MAX_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+
+# Seconds a job may run before it is abandoned
+DEFAULT_TIMEOUT_SECONDS = float(os.environ.get("JOB_TIMEOUT_SECONDS", "300"))
+
+# Seconds a finished job and its result stay retrievable
+DEFAULT_RESULT_TTL_SECONDS = float(os.environ.get("JOB_RESULT_TTL_SECONDS", "900"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job at its next checkpoint once it was cancelled or timed out."""
+
+
+class Job:
+    """
+    A unit of work run by the `JobManager`, and the handle the work uses to report progress.
+
+    The work is cancelled cooperatively: `checkpoint` (and `stage` and
+    `append_partial`, which call it) raise `JobCancelled` once the job was
+    cancelled or ran past its deadline, so the work stops at the next stage
+    boundary or streamed chunk.
+    """
+
+    def __init__(self, job_id, timeout, stages=()):
+        self.id = job_id
+        self.timeout = timeout
+        self.status = QUEUED
+        self.stages = {name: "pending" for name in stages}
+        self.partial = ""
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def deadline_passed(self):
+        """Return True if the job has been running for longer than its timeout."""
+        return (
+            self.timeout is not None
+            and self.started is not None
+            and time.time() - self.started > self.timeout
+        )
+
+    def checkpoint(self):
+        """Raise `JobCancelled` if the job should stop."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        if self.deadline_passed():
+            raise JobCancelled(self.id)
+
+    def stage(self, name, status):
+        """
+        Record the status of a stage, e.g. "running" or "done".
+
+        Matches the `on_stage` callback of `ResumePipeline`.
+        """
+        self.checkpoint()
+        with self._lock:
+            self.stages[name] = status
+
+    def append_partial(self, text):
+        """Append streamed output so pollers can show it before the job finishes."""
+        self.checkpoint()
+        with self._lock:
+            self.partial += text
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            if self.status in FINISHED_STATES:
+                return
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+
+    def snapshot(self):
+        """Return a copy of the job's state that is safe to read from another thread."""
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "stages": dict(self.stages),
+                "partial": self.partial,
+                "result": self.result,
+                "error": self.error,
+                "created": self.created,
+                "started": self.started,
+                "finished": self.finished,
+            }
+
+
+class JobManager:
+    """
+    Runs jobs in a thread pool outside of the Streamlit script run.
+
+    Submitting returns a job id that stays valid across reruns and sessions.
+    Finished jobs, including their results, are kept for `result_ttl`
+    seconds and then dropped.
+    """
+
+    def __init__(
+        self,
+        max_workers=DEFAULT_MAX_WORKERS,
+        timeout=DEFAULT_TIMEOUT_SECONDS,
+        result_ttl=DEFAULT_RESULT_TTL_SECONDS,
+    ):
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="resume-job"
+        )
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, timeout=None, stages=(), **kwargs):
+        """
+        Queue `fn(job, *args, **kwargs)` and return the job id.
+
+        Args:
+            fn (callable): The work. Receives the `Job` as its first argument.
+            *args: Passed on to `fn`.
+            timeout (float, optional): Seconds the job may run; defaults to the manager's timeout.
+            stages (tuple): Stage names to report as pending until the job reaches them.
+            **kwargs: Passed on to `fn`.
+
+        Returns:
+            str: The job id.
+        """
+        self._purge_expired()
+        job = Job(
+            uuid.uuid4().hex,
+            self.timeout if timeout is None else timeout,
+            stages,
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        with job._lock:
+            if job.status in FINISHED_STATES:
+                return
+            job.started = time.time()
+            job.status = RUNNING
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish(TIMED_OUT if job.deadline_passed() else CANCELLED)
+        except Exception as error:
+            job._finish(FAILED, error=f"{type(error).__name__}: {error}")
+        else:
+            job._finish(SUCCEEDED, result=result)
+
+    def get(self, job_id):
+        """
+        Return a snapshot of a job, or None if the id is unknown or its result expired.
+
+        A running job past its deadline is reported as timed out right away,
+        even while its current step is still finishing in the background.
+        """
+        self._purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.status == RUNNING and job.deadline_passed():
+            job._cancel.set()
+            job._finish(TIMED_OUT)
+        return job.snapshot()
+
+    def cancel(self, job_id):
+        """
+        Cancel a job. Queued jobs never start; running jobs stop at their next checkpoint.
+
+        Returns:
+            bool: True if the job was still queued or running.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        job._cancel.set()
+        job.future.cancel()
+        job._finish(CANCELLED)
+        return True
+
+    def _purge_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.finished is not None and now - job.finished > self.result_ttl
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def stats(self):
+        """Return the number of known jobs per status."""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+
+_default_manager = None
+_default_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Return the process-wide job manager shared by all sessions."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            _default_manager = JobManager()
+        return _default_manager
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,246 @@
+"""
+A knowledge base of resume guides in one persisted FAISS vector store.
+
+Every guide is split at its Markdown headings and then into chunks, and
+each chunk carries metadata for filtered retrieval:
+
+    guide: The guide's file name without extension, e.g. "harvard_resume_guide".
+    heading: The headings the chunk is under, e.g. "2. Resume Sections > Skills Section".
+    section_type: The resume section the heading is about, e.g. "Skills",
+        or "General" for guidance that applies to the whole resume.
+
+The index type follows the corpus size (see `choose_index_type`), and
+searches filtered to one guide only score that guide's chunks, so adding
+guides does not slow down retrieval for the others.
+"""
+
+import glob
+import os
+import re
+import threading
+
+from modules.embeddings import DEFAULT_EMBEDDING_MODEL
+from modules.resume_parser import SECTION_HEADERS
+from modules.vectorstore_utils import (
+    DEFAULT_INDEX_CACHE_DIR,
+    create_vector_store,
+    load_or_build_vector_store,
+    split_text,
+    vector_store_cache_key,
+    with_backend,
+)
+
+DEFAULT_GUIDE = "harvard_resume_guide"
+DEFAULT_GUIDE_PATH = os.path.join("assets", f"{DEFAULT_GUIDE}.md")
+
+# Additional guides, e.g. industry- or language-specific ones, as Markdown files
+GUIDES_DIR = os.path.join("assets", "guides")
+
+GENERAL_SECTION = "General"
+
+# Knowledge base cache keys by the (path, mtime, size) of the guides and the
+# build parameters, so a process only reads and hashes the guides once
+# until one of them changes.
+_cache_keys = {}
+_cache_keys_lock = threading.Lock()
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$", re.MULTILINE)
+
+# Header variants, longest first, so "Work Experience" wins over "Experience"
+_SECTION_VARIANTS = sorted(
+    (
+        (variant.lower(), title)
+        for title, variants in SECTION_HEADERS.items()
+        for variant in variants
+    ),
+    key=lambda item: len(item[0]),
+    reverse=True,
+)
+
+
+def guide_paths(guides_dir=GUIDES_DIR):
+    """Return the default guide followed by every Markdown guide in `guides_dir`."""
+    return [DEFAULT_GUIDE_PATH] + sorted(glob.glob(os.path.join(guides_dir, "*.md")))
+
+
+def guide_name(path):
+    """Return the name a guide is filtered by: its file name without extension."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def validate_guide(name, paths=None):
+    """
+    Check that `name` is a guide of the knowledge base.
+
+    Args:
+        name (str): The guide name, or "" to search all guides.
+        paths (list, optional): Markdown guide files; defaults to `guide_paths()`.
+
+    Raises:
+        ValueError: If no guide file has that name.
+    """
+    if not name:
+        return
+    names = [
+        guide_name(path) for path in (paths if paths is not None else guide_paths())
+    ]
+    if name not in names:
+        raise ValueError(
+            f"Unknown guide {name!r}; the knowledge base has: {', '.join(names)}."
+        )
+
+
+def _read_guides(paths):
+    """Return guide name -> Markdown text."""
+    guides = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as file:
+            guides[guide_name(path)] = file.read()
+    return guides
+
+
+def _knowledge_base_key(paths, chunk_size, chunk_overlap, model_name, index_type):
+    """Return the cache key of the knowledge base, hashing the guides only when they changed."""
+    stats = [os.stat(path) for path in paths]
+    signature = (
+        tuple(
+            (path, stat.st_mtime_ns, stat.st_size) for path, stat in zip(paths, stats)
+        ),
+        chunk_size,
+        chunk_overlap,
+        model_name,
+        index_type,
+    )
+    with _cache_keys_lock:
+        key = _cache_keys.get(signature)
+    if key is None:
+        guides = _read_guides(paths)
+        key = vector_store_cache_key(
+            "\0".join(f"{name}\0{text}" for name, text in sorted(guides.items())),
+            chunk_size,
+            chunk_overlap,
+            f"{model_name}\0knowledge-base\0{index_type}",
+        )
+        with _cache_keys_lock:
+            _cache_keys[signature] = key
+    return key
+
+
+def section_type(headings):
+    """
+    Return the resume section a chunk is about, judging by the headings it is under.
+
+    Args:
+        headings (list): The heading titles, outermost first.
+
+    Returns:
+        str: A key of `SECTION_HEADERS`, or "General".
+    """
+    for heading in reversed(headings):
+        heading = heading.lower()
+        for variant, title in _SECTION_VARIANTS:
+            if re.search(rf"\b{re.escape(variant)}\b", heading):
+                return title
+    return GENERAL_SECTION
+
+
+def split_guide(name, text, chunk_size=500, chunk_overlap=50):
+    """
+    Split a Markdown guide into chunks that do not cross headings.
+
+    Args:
+        name (str): The guide name stored in each chunk's metadata.
+        text (str): The guide's Markdown text.
+        chunk_size (int): Chunk size passed to `split_text`.
+        chunk_overlap (int): Chunk overlap passed to `split_text`.
+
+    Returns:
+        tuple: The chunk texts and one metadata dict per chunk.
+    """
+    matches = list(_HEADING.finditer(text))
+    starts = [0] + [match.start() for match in matches] + [len(text)]
+
+    chunks = []
+    metadatas = []
+    stack = []  # (level, title) of the headings above the current part
+    for i, (start, end) in enumerate(zip(starts, starts[1:])):
+        if i > 0:
+            match = matches[i - 1]
+            level = len(match.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, match.group(2)))
+
+        part = text[start:end].strip()
+        if not part:
+            continue
+        headings = [title for _, title in stack]
+        metadata = {
+            "guide": name,
+            "heading": " > ".join(headings),
+            "section_type": section_type(headings),
+        }
+        for chunk in split_text(part, chunk_size, chunk_overlap):
+            chunks.append(chunk)
+            metadatas.append(dict(metadata))
+    return chunks, metadatas
+
+
+def load_or_create_knowledge_base(
+    paths=None,
+    chunk_size=500,
+    chunk_overlap=50,
+    model_name=DEFAULT_EMBEDDING_MODEL,
+    cache_dir=DEFAULT_INDEX_CACHE_DIR,
+    backend=None,
+    index_type="auto",
+):
+    """
+    Load the vector store of all guides from disk, building and saving it on a miss.
+
+    Editing, adding or removing a guide, or changing the chunking, the
+    embedding model or the index type, results in a rebuild. The guides are
+    only read and hashed again when one of their files changed, and the
+    store is loaded once per process, so repeated calls are cheap.
+
+    Args:
+        paths (list, optional): Markdown guide files; defaults to `guide_paths()`.
+        chunk_size (int): Chunk size passed to `split_text`.
+        chunk_overlap (int): Chunk overlap passed to `split_text`.
+        model_name (str): The embedding model name.
+        cache_dir (str): The directory that holds the persisted indexes.
+        backend (str, optional): The embedding backend, see `with_backend`.
+        index_type (str): "flat", "hnsw", "ivf" or "auto" to pick by corpus size.
+
+    Returns:
+        FAISS: The LangChain FAISS vector store; pass e.g.
+            {"guide": "harvard_resume_guide"} as `guide_filter` to search one guide.
+    """
+    paths = list(paths if paths is not None else guide_paths())
+    model_name = with_backend(model_name, backend)
+    key = _knowledge_base_key(paths, chunk_size, chunk_overlap, model_name, index_type)
+
+    def build():
+        chunks = []
+        metadatas = []
+        for name, text in _read_guides(paths).items():
+            guide_chunks, guide_metadatas = split_guide(
+                name, text, chunk_size, chunk_overlap
+            )
+            chunks.extend(guide_chunks)
+            metadatas.extend(guide_metadatas)
+        vector_store = create_vector_store(
+            chunks, model_name, metadatas=metadatas, index_type=index_type
+        )
+        return vector_store, len(chunks)
+
+    return load_or_build_vector_store(key, build, model_name, cache_dir)
+
+
+def guide_filter(name):
+    """Return the retrieval filter for one guide, or None to search all of them."""
+    return {"guide": name} if name else None
+
+
+if __name__ == "__main__":
+    pass
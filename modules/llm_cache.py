@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from modules.tracing import current_span
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "llm_responses.sqlite3")
+
+# A hit only refreshes an entry's access time when the stored one is older
+# than this, and refreshed times are written in batches, so hits stay reads.
+ACCESS_RESOLUTION_SECONDS = 60.0
+MAX_PENDING_ACCESSES = 1024
+
+
+class LLMResponseCache:
+    """
+    A durable, SQLite-backed cache for LLM responses.
+
+    Entries older than `ttl_seconds` are treated as misses and removed, and the
+    least recently used entries are evicted once more than `max_entries` are
+    stored. The instance is safe to share between threads.
+
+    Hits do not write to the database: access times are tracked to within
+    `ACCESS_RESOLUTION_SECONDS` and written with the next `set`, or once
+    `MAX_PENDING_ACCESSES` have accumulated. Access times not yet written
+    when the process exits are lost, which only makes eviction less exact.
+    """
+
+    def __init__(
+        self, path=DEFAULT_CACHE_PATH, ttl_seconds=7 * 24 * 3600, max_entries=10000
+    ):
+        """
+        Args:
+            path (str): The SQLite database file. ":memory:" keeps the cache in memory.
+            ttl_seconds (float or None): Lifetime of an entry. None disables expiry.
+            max_entries (int or None): Maximum number of stored entries. None disables the limit.
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending_accesses = {}  # key -> access time not yet written
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name, temperature, template, rendered_prompt, max_tokens=None):
+        """
+        Build the cache key for one LLM call.
+
+        Args:
+            model_name (str): The LLM model name.
+            temperature (float): The sampling temperature.
+            template (str): The prompt template; only its hash enters the key.
+            rendered_prompt (str): The prompt with all inputs filled in.
+            max_tokens (int, optional): The output token limit, so that answers
+                cut off at a lower limit are not served after it is raised.
+
+        Returns:
+            str: A hex digest identifying the call.
+        """
+        template_hash = hashlib.sha256(template.encode("utf-8")).hexdigest()
+        payload = json.dumps(
+            [model_name, temperature, template_hash, rendered_prompt, max_tokens],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for the key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created, accessed FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if (
+                row is not None
+                and self.ttl_seconds is not None
+                and now - row[1] > self.ttl_seconds
+            ):
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            if now - row[2] > ACCESS_RESOLUTION_SECONDS:
+                self._pending_accesses[key] = now
+                if len(self._pending_accesses) >= MAX_PENDING_ACCESSES:
+                    self._write_accesses()
+                    self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def _write_accesses(self):
+        """Write the pending access times; the caller holds the lock and commits."""
+        if self._pending_accesses:
+            self._conn.executemany(
+                "UPDATE responses SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._pending_accesses.items()],
+            )
+            self._pending_accesses.clear()
+
+    def set(self, key, response):
+        """Store a response and evict the least recently used entries over the limit."""
+        now = time.time()
+        with self._lock:
+            # Eviction below needs the access times of recent hits
+            self._write_accesses()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, accessed) "
+                "VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._pending_accesses.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Return the cache counters.
+
+        Returns:
+            dict: "hits", "misses", "hit_rate" and the number of stored "entries".
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+
+class CachedChain:
+    """
+    Wrap an LLMChain so that `run` and `arun` are answered from an `LLMResponseCache`.
+
+    Every other attribute is forwarded to the wrapped chain.
+    """
+
+    def __init__(self, chain, cache, enabled=True):
+        """
+        Args:
+            chain: The LLMChain to wrap.
+            cache (LLMResponseCache): The response cache.
+            enabled (bool): False bypasses the cache, e.g. when sampling randomness is wanted.
+        """
+        self.chain = chain
+        self.cache = cache
+        self.enabled = enabled
+
+    def __getattr__(self, name):
+        return getattr(self.chain, name)
+
+    def cache_key(self, inputs):
+        """Return the cache key for a call with the given inputs."""
+        llm = self.chain.llm
+        return LLMResponseCache.make_key(
+            getattr(llm, "model", None)
+            or getattr(llm, "model_name", type(llm).__name__),
+            getattr(llm, "temperature", None),
+            self.chain.prompt.template,
+            self.chain.prompt.format(**inputs),
+            getattr(llm, "max_output_tokens", None) or getattr(llm, "max_tokens", None),
+        )
+
+    def run(self, inputs, **kwargs):
+        """Return the cached response for the inputs, calling the chain on a miss."""
+        if not self.enabled:
+            return self.chain.run(inputs, **kwargs)
+
+        key = self.cache_key(inputs)
+        response = self.cache.get(key)
+        current_span().set(cache_hit=response is not None)
+        if response is None:
+            response = self.chain.run(inputs, **kwargs)
+            self.cache.set(key, response)
+        return response
+
+    async def arun(self, inputs, **kwargs):
+        """Asyncio variant of `run`."""
+        if not self.enabled:
+            return await self.chain.arun(inputs, **kwargs)
+
+        key = self.cache_key(inputs)
+        response = self.cache.get(key)
+        current_span().set(cache_hit=response is not None)
+        if response is None:
+            response = await self.chain.arun(inputs, **kwargs)
+            self.cache.set(key, response)
+        return response
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Return the process-wide response cache stored at `DEFAULT_CACHE_PATH`."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMResponseCache(DEFAULT_CACHE_PATH)
+        return _default_cache
+
+
+if __name__ == "__main__":
+    pass
@@ -1,18 +1,321 @@
-from langchain.chains import LLMChain
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import PromptTemplate
+import asyncio
+from functools import lru_cache
 
-def setup_rag_pipeline(vector_store):
-    """Set up the custom Retrieval-Augmented Generation pipeline with the LLM."""
-    
-    llm = ChatGoogleGenerativeAI(
+# LangChain and the Gemini client are imported on first use, so importing
+# this module (and starting the app) does not pay for them.
+from modules.llm_cache import CachedChain
+from modules.tracing import current_span, span
+
+# Output token limit of the LLM for feedback and section rewrites
+MAX_OUTPUT_TOKENS = 500
+
+# Output token limit of the LLM for the full rewrite, which has to fit a
+# whole resume; resumes whose rewrite would not fit are rewritten section by
+# section (see `plan_full_rewrite`)
+FULL_REWRITE_MAX_OUTPUT_TOKENS = 4096
+
+# Prompt token budget of a single call; larger rewrites are split up
+MAX_PROMPT_TOKENS = 8000
+
+
+def estimate_tokens(text):
+    """Estimate the number of LLM tokens in a text (about four characters per token)."""
+    return -(-len(text) // 4)
+
+
+@lru_cache(maxsize=None)
+def _token_usage_handler_class():
+    """Define `TokenUsageHandler` on first use, as its base class is slow to import."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsageHandler(BaseCallbackHandler):
+        """Record prompt and completion token counts and retries of LLM calls on a tracing span."""
+
+        def __init__(self, trace_span):
+            self.span = trace_span
+
+        def on_llm_start(self, serialized, prompts, **kwargs):
+            self.span.add("prompt_tokens", sum(estimate_tokens(p) for p in prompts))
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            self.span.add(
+                "prompt_tokens",
+                sum(
+                    estimate_tokens(str(message.content))
+                    for batch in messages
+                    for message in batch
+                ),
+            )
+
+        def on_llm_end(self, response, **kwargs):
+            completion_tokens = 0
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    usage = getattr(message, "usage_metadata", None)
+                    if usage:
+                        # Replace the estimate made at start with the reported counts
+                        self.span.set(prompt_tokens=usage.get("input_tokens", 0))
+                        completion_tokens += usage.get("output_tokens", 0)
+                    else:
+                        completion_tokens += estimate_tokens(generation.text)
+            self.span.add("completion_tokens", completion_tokens)
+
+        def on_retry(self, retry_state, **kwargs):
+            self.span.add("retries")
+
+    return TokenUsageHandler
+
+
+class RateLimitedChain:
+    """
+    Wrap an LLMChain so that every LLM call is admitted by a shared `RateLimiter`.
+
+    Each call reserves its estimated prompt tokens plus the output token
+    limit, and returns what it did not use once it completes. Every other
+    attribute is forwarded to the wrapped chain.
+    """
+
+    def __init__(self, chain, limiter, max_output_tokens=MAX_OUTPUT_TOKENS):
+        """
+        Args:
+            chain: The LLMChain to wrap.
+            limiter (RateLimiter): The limiter shared by all sessions.
+            max_output_tokens (int): Completion tokens reserved per call.
+        """
+        self.chain = chain
+        self.limiter = limiter
+        self.max_output_tokens = max_output_tokens
+
+    def __getattr__(self, name):
+        return getattr(self.chain, name)
+
+    def _prompt_tokens(self, inputs):
+        return estimate_tokens(self.chain.prompt.format(**inputs))
+
+    def run(self, inputs, **kwargs):
+        """Run the chain once admitted, retrying calls rejected with HTTP 429."""
+        prompt_tokens = self._prompt_tokens(inputs)
+        reserved = prompt_tokens + self.max_output_tokens
+        response = self.limiter.call(
+            lambda: self.chain.run(inputs, **kwargs), reserved
+        )
+        self.limiter.settle(reserved, prompt_tokens + estimate_tokens(response))
+        return response
+
+    async def arun(self, inputs, **kwargs):
+        """Asyncio variant of `run`."""
+        prompt_tokens = self._prompt_tokens(inputs)
+        reserved = prompt_tokens + self.max_output_tokens
+        response = await self.limiter.acall(
+            lambda: self.chain.arun(inputs, **kwargs), reserved
+        )
+        self.limiter.settle(reserved, prompt_tokens + estimate_tokens(response))
+        return response
+
+    def stream(self, inputs):
+        """
+        Yield the output of the chain chunk by chunk once admitted.
+
+        Only a rejection before the first chunk is retried. The reservation
+        is settled however the stream ends, including when it fails or its
+        consumer stops early, e.g. because the job was cancelled.
+        """
+        prompt_tokens = self._prompt_tokens(inputs)
+        reserved = prompt_tokens + self.max_output_tokens
+
+        def start():
+            chunks = _stream_chain(self.chain, inputs)
+            return next(chunks, None), chunks
+
+        first, chunks = self.limiter.call(start, reserved)
+        completion = []
+        try:
+            if first is not None:
+                completion.append(first)
+                yield first
+            for chunk in chunks:
+                completion.append(chunk)
+                yield chunk
+        finally:
+            chunks.close()
+            self.limiter.settle(
+                reserved, prompt_tokens + estimate_tokens("".join(completion))
+            )
+
+
+class ConcurrencyLimitedChain:
+    """
+    Wrap an LLMChain so that all wrappers sharing a semaphore keep at most N LLM calls in flight.
+
+    The semaphore is only held while the LLM is called: `setup_rag_pipeline`
+    places this wrapper below the response cache and the rate limiter, so
+    cache hits and calls waiting for admission do not take a slot. Every
+    other attribute is forwarded to the wrapped chain.
+    """
+
+    def __init__(self, chain, semaphore):
+        """
+        Args:
+            chain: The LLMChain to wrap.
+            semaphore (threading.Semaphore): Shared by all chains of the limit.
+        """
+        self.chain = chain
+        self.semaphore = semaphore
+
+    def __getattr__(self, name):
+        return getattr(self.chain, name)
+
+    def run(self, inputs, **kwargs):
+        with self.semaphore:
+            return self.chain.run(inputs, **kwargs)
+
+    async def arun(self, inputs, **kwargs):
+        """Asyncio variant of `run`; waits for a slot without blocking the event loop."""
+        await asyncio.to_thread(self.semaphore.acquire)
+        try:
+            return await self.chain.arun(inputs, **kwargs)
+        finally:
+            self.semaphore.release()
+
+    def stream(self, inputs):
+        """Yield the output of the chain chunk by chunk, holding a slot until it ends."""
+        with self.semaphore:
+            yield from _stream_chain(self.chain, inputs)
+
+
+def run_chain(chain, inputs):
+    """
+    Run an LLM chain, recording the call on a tracing span when tracing is on.
+
+    Args:
+        chain: An LLMChain or a wrapper around one.
+        inputs (dict): The prompt inputs.
+
+    Returns:
+        str: The chain output.
+    """
+    with span("llm.call") as call_span:
+        if not call_span:
+            return chain.run(inputs)
+        handler = _token_usage_handler_class()(call_span)
+        return chain.run(inputs, callbacks=[handler])
+
+
+async def arun_chain(chain, inputs):
+    """Asyncio variant of `run_chain`."""
+    with span("llm.call") as call_span:
+        if not call_span:
+            return await chain.arun(inputs)
+        handler = _token_usage_handler_class()(call_span)
+        return await chain.arun(inputs, callbacks=[handler])
+
+
+def stream_chain(chain, inputs):
+    """
+    Yield the output of an LLM chain call chunk by chunk as it is generated.
+
+    Cached chains yield a cached response in one piece, and store a streamed
+    response once it is complete.
+
+    Args:
+        chain: An LLMChain, or a CachedChain wrapping one.
+        inputs (dict): The prompt inputs.
+
+    Yields:
+        str: The next piece of generated text.
+    """
+    with span("llm.stream") as stream_span:
+        chunks = []
+        for chunk in _stream_chain(chain, inputs):
+            chunks.append(chunk)
+            yield chunk
+        stream_span.set(completion_tokens=estimate_tokens("".join(chunks)))
+
+
+def _stream_chain(chain, inputs):
+    if isinstance(chain, CachedChain):
+        if not chain.enabled:
+            yield from _stream_chain(chain.chain, inputs)
+            return
+
+        key = chain.cache_key(inputs)
+        cached = chain.cache.get(key)
+        current_span().set(cache_hit=cached is not None)
+        if cached is not None:
+            yield cached
+            return
+
+        chunks = []
+        for chunk in _stream_chain(chain.chain, inputs):
+            chunks.append(chunk)
+            yield chunk
+        chain.cache.set(key, "".join(chunks))
+        return
+
+    if isinstance(chain, (RateLimitedChain, ConcurrencyLimitedChain)):
+        yield from chain.stream(inputs)
+        return
+
+    for chunk in chain.llm.stream(chain.prompt.format(**inputs)):
+        # Chat models stream message chunks, completion models plain strings
+        text = getattr(chunk, "content", chunk)
+        if text:
+            yield text
+
+
+def _gemini(max_output_tokens, limiter=None):
+    """Return the Gemini chat model with the given output token limit."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
         model="gemini-1.5-flash",
         temperature=0.7,
-        max_tokens=500,
+        max_output_tokens=max_output_tokens,
         timeout=None,
-        max_retries=2,
+        # With a limiter, retries on HTTP 429 and on transient errors are left
+        # to it, so a 429 pauses every session instead of only this call
+        max_retries=0 if limiter is not None else 2,
     )
 
+
+def setup_rag_pipeline(
+    vector_store, cache=None, use_cache=True, llm=None, limiter=None, semaphore=None
+):
+    """
+    Set up the custom Retrieval-Augmented Generation pipeline with the LLM.
+
+    Args:
+        vector_store: The vector store for retrieval.
+        cache (LLMResponseCache, optional): When given, every chain answers
+            repeated calls from this cache instead of calling the LLM.
+        use_cache (bool): False bypasses the cache, e.g. when sampling
+            randomness is wanted.
+        llm (optional): The LLM shared by the chains. Defaults to Gemini, with
+            a higher output token limit for the full rewrite; benchmarks pass
+            a local stand-in.
+        limiter (RateLimiter, optional): When given, LLM calls that miss the
+            cache wait for admission and are retried by the limiter on HTTP 429
+            and on server errors, timeouts and dropped connections.
+        semaphore (threading.Semaphore, optional): When given, caps the LLM
+            calls in flight across every chain sharing it; cache hits and
+            calls waiting for the limiter do not count.
+
+    Returns:
+        tuple: The feedback, section rewrite, full rewrite and map rewrite
+            chains. The map rewrite chain rewrites one section of a resume too
+            long for a single full rewrite from that section's feedback.
+    """
+
+    from langchain.chains import LLMChain
+    from langchain_core.prompts import PromptTemplate
+
+    if llm is None:
+        llm = _gemini(MAX_OUTPUT_TOKENS, limiter)
+        full_rewrite_llm = _gemini(FULL_REWRITE_MAX_OUTPUT_TOKENS, limiter)
+    else:
+        full_rewrite_llm = llm
+
     # Feedback Prompt
     feedback_prompt_template = """
     Based on the provided Harvard resume guidelines, provide feedback for improving the resume section. Include suggestions such as quantifying achievements, avoiding personal pronouns, and using active language. Add emojis to make the feedback engaging and actionable. Don"t say "Feedback for Resume Section:" in the rewritten section. Just give the feedback. Don't make it too long, keep it concise and impactful.
@@ -52,6 +355,22 @@ def setup_rag_pipeline(vector_store):
     Rewritten Full Resume:
     """
 
+    # Section Rewrite Prompt for the map step of long resumes
+    map_rewrite_prompt_template = """
+    Based on the feedback provided for one section of a resume, rewrite that section. Ensure the rewritten section follows professional standards and avoids any errors. Do not include the feedback itself or the section heading, only the improved section. Don't use Emojis in the rewritten section.
+
+    Section:
+    {section_title}
+
+    Feedback:
+    {guide_section}
+
+    Original Section:
+    {resume_section}
+
+    Rewritten Section:
+    """
+
     # Create prompt templates
     feedback_prompt = PromptTemplate(
         template=feedback_prompt_template,
@@ -68,6 +387,11 @@ def setup_rag_pipeline(vector_store):
         input_variables=["resume_section", "guide_section"]
     )
 
+    map_rewrite_prompt = PromptTemplate(
+        template=map_rewrite_prompt_template,
+        input_variables=["section_title", "resume_section", "guide_section"]
+    )
+
     # Create two LLMChains, one for feedback and one for rewriting
     feedback_chain = LLMChain(
         llm=llm,
@@ -81,8 +405,36 @@ def setup_rag_pipeline(vector_store):
 
     # Create a chain for rewriting the entire resume
     full_rewrite_chain = LLMChain(
-        llm=llm,
+        llm=full_rewrite_llm,
         prompt=full_rewrite_prompt
     )
 
-    return feedback_chain, rewrite_chain, full_rewrite_chain
+    # Create a chain for rewriting one section of a long resume from its feedback
+    map_rewrite_chain = LLMChain(
+        llm=full_rewrite_llm,
+        prompt=map_rewrite_prompt
+    )
+
+    if semaphore is not None:
+        feedback_chain = ConcurrencyLimitedChain(feedback_chain, semaphore)
+        rewrite_chain = ConcurrencyLimitedChain(rewrite_chain, semaphore)
+        full_rewrite_chain = ConcurrencyLimitedChain(full_rewrite_chain, semaphore)
+        map_rewrite_chain = ConcurrencyLimitedChain(map_rewrite_chain, semaphore)
+
+    if limiter is not None:
+        feedback_chain = RateLimitedChain(feedback_chain, limiter)
+        rewrite_chain = RateLimitedChain(rewrite_chain, limiter)
+        full_rewrite_chain = RateLimitedChain(
+            full_rewrite_chain, limiter, FULL_REWRITE_MAX_OUTPUT_TOKENS
+        )
+        map_rewrite_chain = RateLimitedChain(
+            map_rewrite_chain, limiter, FULL_REWRITE_MAX_OUTPUT_TOKENS
+        )
+
+    if cache is not None:
+        feedback_chain = CachedChain(feedback_chain, cache, enabled=use_cache)
+        rewrite_chain = CachedChain(rewrite_chain, cache, enabled=use_cache)
+        full_rewrite_chain = CachedChain(full_rewrite_chain, cache, enabled=use_cache)
+        map_rewrite_chain = CachedChain(map_rewrite_chain, cache, enabled=use_cache)
+
+    return feedback_chain, rewrite_chain, full_rewrite_chain, map_rewrite_chain
@@ -1,42 +1,265 @@
-import markdown
-from docx import Document
-from bs4 import BeautifulSoup
+import hashlib
+import io
+import re
 
+from modules.tracing import span
 
-def convert_markdown_to_docx(markdown_string, output_file):
+# Number of DOCX artifacts kept per session cache
+MAX_CACHED_ARTIFACTS = 4
+
+# Block-level Markdown syntax, matched line by line
+_HEADING = re.compile(r"^(#{1,6})[ \t]+(.*?)[ \t]*#*[ \t]*$")
+_LIST_ITEM = re.compile(r"^([ \t]*)([-*+]|\d+[.)])[ \t]+(.*)$")
+_RULE = re.compile(r"^[ \t]*([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+_QUOTE = re.compile(r"^[ \t]*>[ \t]?(.*)$")
+_FENCE = re.compile(r"^[ \t]*(```|~~~)")
+
+# Inline Markdown syntax: escapes, code spans, links and emphasis markers
+_INLINE = re.compile(
+    r"\\(?P<escaped>[\\`*_\[\]()#+\-.!])"
+    r"|`(?P<code>[^`]+)`"
+    r"|\[(?P<link>[^\]]+)\]\([^)]*\)"
+    r"|(?P<marker>\*{1,3}|_{1,3})"
+)
+
+_BULLET_STYLES = ["List Bullet", "List Bullet 2", "List Bullet 3"]
+_NUMBER_STYLES = ["List Number", "List Number 2", "List Number 3"]
+_LIST_STYLES = set(_BULLET_STYLES + _NUMBER_STYLES)
+
+
+def _add_run(paragraph, text, bold, italic):
+    """Add a run, only writing the formatting properties that are switched on."""
+    run = paragraph.add_run(text)
+    if bold:
+        run.bold = True
+    if italic:
+        run.italic = True
+    return run
+
+
+def _paired_markers(text, matches):
+    """
+    Return the indexes of the emphasis markers among `matches` that open or close a span.
+
+    A marker opens a span when it is followed by a non-space character and
+    closes the innermost open span of the same marker when it follows one.
+    Underscores do not open or close within a word, as in snake_case. Markers
+    without a partner, like the stray asterisk in "5 * 3", are plain text.
+    """
+    paired = set()
+    openers = []  # (marker, index) of the spans still open, innermost last
+    for i, match in enumerate(matches):
+        marker = match.group("marker")
+        if marker is None:
+            continue
+        before = text[match.start() - 1 : match.start()]
+        after = text[match.end() : match.end() + 1]
+        can_open = bool(after) and not after.isspace()
+        can_close = bool(before) and not before.isspace()
+        if marker[0] == "_":
+            can_open = can_open and not before.isalnum()
+            can_close = can_close and not after.isalnum()
+
+        opener = None
+        if can_close:
+            opener = next(
+                (j for j in range(len(openers) - 1, -1, -1) if openers[j][0] == marker),
+                None,
+            )
+        if opener is not None:
+            paired.update((openers[opener][1], i))
+            del openers[opener:]
+        elif can_open:
+            openers.append((marker, i))
+    return paired
+
+
+def _add_inline_runs(paragraph, text):
+    """Add the text to a paragraph as runs, applying bold, italic and code formatting."""
+    bold = italic = False
+    position = 0
+
+    matches = list(_INLINE.finditer(text))
+    paired = _paired_markers(text, matches)
+    for i, match in enumerate(matches):
+        if match.group("marker") is not None and i not in paired:
+            # An unpaired marker stays part of the surrounding text
+            continue
+        if match.start() > position:
+            _add_run(paragraph, text[position : match.start()], bold, italic)
+        position = match.end()
+
+        if match.group("escaped") is not None:
+            _add_run(paragraph, match.group("escaped"), bold, italic)
+        elif match.group("code") is not None:
+            _add_run(paragraph, match.group("code"), bold, italic).font.name = (
+                "Courier New"
+            )
+        elif match.group("link") is not None:
+            _add_run(paragraph, match.group("link"), bold, italic).underline = True
+        else:
+            marker = match.group("marker")
+            if len(marker) == 3:
+                bold, italic = not bold, not italic
+            elif len(marker) == 2:
+                bold = not bold
+            else:
+                italic = not italic
+
+    if position < len(text):
+        _add_run(paragraph, text[position:], bold, italic)
+
+
+def _indent_width(whitespace):
+    return len(whitespace.expandtabs(4))
+
+
+def convert_markdown_to_docx(markdown_string, output_file=None):
     """Convert a markdown string to a docx file.
 
+    The Markdown is read line by line in a single pass and python-docx
+    elements are emitted as soon as each block is complete. Headings (all
+    levels), paragraphs, nested bullet and numbered lists, block quotes,
+    fenced code, horizontal rules and inline bold, italic, code and link text
+    are supported.
+
     Args:
         markdown_string (str): The markdown string to convert.
-        output_file (str): The output docx file.
+        output_file (str, optional): The output docx file. When omitted the
+            document is written to memory instead.
+
+    Returns:
+        io.BytesIO or None: The docx file in bytes when no output file is given.
     """
+    # Imported on first use: python-docx loads lxml
+    from docx import Document
 
-    # Convert markdown to HTML
-    html_string = markdown.markdown(markdown_string)
+    doc = Document()
 
-    # Parse the HTML content
-    soup = BeautifulSoup(html_string, "html.parser")
+    # python-docx resolves a style name on every assignment, which dominates
+    # the conversion time, so resolve each style id once and set it directly
+    style_ids = {}
 
-    # Create a new Document
-    doc = Document()
+    def add_paragraph(style_name=None):
+        paragraph = doc.add_paragraph()
+        if style_name is not None:
+            if style_name not in style_ids:
+                style_ids[style_name] = doc.styles[style_name].style_id
+            paragraph._p.style = style_ids[style_name]
+        return paragraph
+
+    # The block being collected: (style, lines) or None
+    pending = None
+    list_indents = []
+    in_fence = False
+
+    def flush():
+        nonlocal pending
+        if pending is not None:
+            style_name, lines = pending
+            paragraph = add_paragraph(style_name)
+            _add_inline_runs(paragraph, " ".join(lines))
+            pending = None
+
+    for line in markdown_string.splitlines():
+        if in_fence:
+            if _FENCE.match(line):
+                in_fence = False
+            else:
+                run = add_paragraph("No Spacing").add_run(line)
+                run.font.name = "Courier New"
+            continue
+
+        if not line.strip():
+            flush()
+            continue
+
+        if _FENCE.match(line):
+            flush()
+            list_indents = []
+            in_fence = True
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            flush()
+            list_indents = []
+            paragraph = add_paragraph(f"Heading {len(heading.group(1))}")
+            _add_inline_runs(paragraph, heading.group(2))
+            continue
+
+        if _RULE.match(line):
+            flush()
+            list_indents = []
+            add_paragraph()
+            continue
+
+        item = _LIST_ITEM.match(line)
+        if item:
+            flush()
+            indent = _indent_width(item.group(1))
+            while list_indents and indent < list_indents[-1]:
+                list_indents.pop()
+            if not list_indents or indent > list_indents[-1]:
+                list_indents.append(indent)
+            level = min(len(list_indents), len(_BULLET_STYLES)) - 1
+            list_styles = _BULLET_STYLES if item.group(2) in "-*+" else _NUMBER_STYLES
+            pending = (list_styles[level], [item.group(3).strip()])
+            continue
+
+        quote = _QUOTE.match(line)
+        if quote:
+            if pending is None or pending[0] != "Quote":
+                flush()
+                list_indents = []
+                pending = ("Quote", [])
+            pending[1].append(quote.group(1).strip())
+            continue
+
+        # Indented lines continue a list item; other lines continue or start a paragraph
+        in_list_item = pending is not None and pending[0] in _LIST_STYLES
+        if pending is not None and (not in_list_item or line[:1].isspace()):
+            pending[1].append(line.strip())
+        else:
+            flush()
+            list_indents = []
+            pending = (None, [line.strip()])
 
-    # Convert HTML to docx
-    for element in soup:
-        if element.name == "h1":
-            doc.add_heading(element.text, level=1)
-        elif element.name == "h2":
-            doc.add_heading(element.text, level=2)
-        elif element.name == "p":
-            doc.add_paragraph(element.text)
-        elif element.name == "ul":
-            for li in element.find_all("li"):
-                doc.add_paragraph(li.text, style="ListBullet")
-        elif element.name in ["strong", "b"]:
-            p = doc.add_paragraph()
-            p.add_run(element.text).bold = True
-        elif element.name in ["em", "i"]:
-            p = doc.add_paragraph()
-            p.add_run(element.text).italic = True
+    flush()
 
     # Save the document
-    doc.save(output_file)
+    if output_file is not None:
+        doc.save(output_file)
+        return None
+
+    docx_buffer = io.BytesIO()
+    doc.save(docx_buffer)
+    docx_buffer.seek(0)
+    return docx_buffer
+
+
+def get_docx_bytes(markdown_string, cache):
+    """
+    Return the docx bytes for a markdown string, converting only on a cache miss.
+
+    Args:
+        markdown_string (str): The markdown string to convert.
+        cache (dict): Markdown hash -> docx bytes, e.g. kept in the session state.
+            Only the most recent `MAX_CACHED_ARTIFACTS` entries are kept.
+
+    Returns:
+        bytes: The docx file.
+    """
+    key = hashlib.sha256(markdown_string.encode("utf-8")).hexdigest()
+    docx_bytes = cache.get(key)
+    if docx_bytes is None:
+        with span("docx.convert", chars=len(markdown_string)):
+            docx_bytes = convert_markdown_to_docx(markdown_string).getvalue()
+        cache[key] = docx_bytes
+        while len(cache) > MAX_CACHED_ARTIFACTS:
+            del cache[next(iter(cache))]
+    return docx_bytes
+
+
+if __name__ == "__main__":
+    pass
@@ -1,19 +1,547 @@
-import pdfplumber
+import io
+import logging
+import os
 import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import pdfplumber
+from PyPDF2 import PdfReader
+
+from modules.llm_pipeline import estimate_tokens
+from modules.resume_parser import detect_resume_sections
+from modules.tracing import current_span, span
+
+logger = logging.getLogger(__name__)
+
+# Uploads above these limits are rejected before any page is parsed.
+MAX_PDF_PAGES = 50
+MAX_PDF_BYTES = 20 * 1024 * 1024
+
+# Extraction tiers, cheapest first
+TIER_FAST = "pypdf2"
+TIER_LAYOUT = "pdfplumber"
+
+# Quality thresholds a fast-tier page must meet to be kept
+MIN_PAGE_CHARS = 20
+MAX_GARBLED_RATIO = 0.05
+MAX_RUN_ON_RATIO = 0.1
+
+# Pages of the extracted text are separated by form feeds until it is cleaned
+PAGE_SEPARATOR = "\f"
+
+# Normalization passes of `clean_extracted_text`, in the order they apply:
+#   page_furniture: Running headers and footers repeated on most pages, and page numbers.
+#   invisible: Soft hyphens, zero-width characters and byte order marks.
+#   ligatures: Typographic ligatures such as "ﬁ", spelled out.
+#   hyphenation: Words hyphenated across a line break, joined again with the hyphen kept.
+#   bullets: Bullet glyphs as "-", and icon-font glyphs dropped or, between words, a space.
+#   whitespace: Runs of spaces, indentation, trailing spaces and blank lines.
+NORMALIZATION_PASSES = (
+    "page_furniture",
+    "invisible",
+    "ligatures",
+    "hyphenation",
+    "bullets",
+    "whitespace",
+)
+
+# Comma-separated passes the app applies; empty only unifies page separators
+DEFAULT_NORMALIZATION_PASSES = tuple(
+    name.strip()
+    for name in os.environ.get(
+        "TEXT_NORMALIZATION_PASSES", ",".join(NORMALIZATION_PASSES)
+    ).split(",")
+    if name.strip()
+)
+
+# Non-blank lines at the top and bottom of a page checked for headers and footers
+PAGE_EDGE_LINES = 2
+MAX_FURNITURE_CHARS = 100
+_PAGE_NUMBER = re.compile(
+    r"(?:page\s*)?\d{1,3}(?:\s*(?:of|/)\s*\d{1,3})?|-\s*\d{1,3}\s*-", re.IGNORECASE
+)
+
+_PAGE_REFERENCE = re.compile(r"\bpage\s*\d", re.IGNORECASE)
+
+# A page number at the end of a header or footer line, e.g. "Jane Doe | Page 2",
+# "Jane Doe 2/3" or "Jane Doe | 2". A bare trailing number only counts after
+# a "|" or bullet separator, so lines like "Python 3" or "2019 - 21" keep it.
+_TRAILING_PAGE_NUMBER = re.compile(
+    r"(?<!\S)(?:page\s*\d{1,3}(?:\s*(?:of|/)\s*\d{1,3})?"
+    r"|\d{1,3}\s*(?:of|/)\s*\d{1,3}|-\s*\d{1,3}\s*-)$"
+    r"|(?<=[|\u2022\u00b7])\s*\d{1,3}$",
+    re.IGNORECASE,
+)
+
+# Lines repeated at the page edges are only taken for running headers and
+# footers in documents of at least this many pages, since on fewer pages
+# content such as a date range repeats by chance.
+MIN_FURNITURE_PAGES = 3
+
+_LIGATURES = {
+    "\ufb00": "ff",
+    "\ufb01": "fi",
+    "\ufb02": "fl",
+    "\ufb03": "ffi",
+    "\ufb04": "ffl",
+    "\ufb05": "st",
+    "\ufb06": "st",
+}
+# Includes the Symbol and Wingdings bullets that extract as private-use characters
+_BULLET_GLYPHS = "•●▪■□◦○►▸▹➢➤✓✔∙·◆◇❖⦁\uf0a7\uf0b7\uf076\uf0d8\uf0fc"
+_PRIVATE_USE = "\ue000-\uf8ff"
+_SPACES = " \t\u00a0\u2000-\u200a\u202f\u205f\u3000"
+
+# Pass -> (group name, pattern, replacement) alternatives of the combined
+# pattern. A replacement is a string or a function of the matched text.
+# Every alternative starts with a character class, which lets the regex
+# engine skip ahead to the next candidate character instead of trying each
+# alternative at every position; line starts are matched by their "\n".
+_PASS_RULES = {
+    "invisible": [("invisible", r"[\u00ad\u200b-\u200d\u2060\ufeff]", "")],
+    "ligatures": [("ligatures", r"[\ufb00-\ufb06]", lambda text: _LIGATURES[text])],
+    # The hyphen is kept: a line break cannot tell "self-motivated" from a
+    # word split for layout, and dropping a real hyphen changes the word
+    "hyphenation": [
+        ("hyphenation", rf"-(?<=[a-z]-)[{_SPACES}]*\n[{_SPACES}]*(?=[a-z])", "-")
+    ],
+    "bullets": [
+        (
+            "bullets__leading",
+            rf"\n[{_SPACES}]*(?:[{_BULLET_GLYPHS}][{_SPACES}]*)+",
+            "\n- ",
+        ),
+        # Other icon-font glyphs are dropped with the spaces after them at
+        # the start or end of a line or after a space. Between two words, as
+        # in "Python\uf0b7 SQL", they become a single space instead.
+        (
+            "bullets__icons",
+            rf"(?<![^\n{_SPACES}])(?:[{_PRIVATE_USE}][{_SPACES}]*)+"
+            rf"|(?:[{_PRIVATE_USE}][{_SPACES}]*)+(?=\n|\Z)",
+            "",
+        ),
+        ("bullets__separators", rf"(?:[{_PRIVATE_USE}][{_SPACES}]*)+", " "),
+    ],
+    "whitespace": [
+        ("whitespace__blank_lines", rf"\n[{_SPACES}]*(?=\n)", ""),
+        ("whitespace__leading", rf"\n[{_SPACES}]+", "\n"),
+        ("whitespace__trailing", rf"[{_SPACES}]+(?=\n|\Z)", ""),
+        (
+            "whitespace__runs",
+            rf"[{_SPACES}]{{2,}}|[\t\u00a0\u2000-\u200a\u202f\u205f\u3000]",
+            " ",
+        ),
+    ],
+}
+
+# The characters a match of each pass can start with. Python's regex engine
+# tries every alternative of a combined pattern at every position; a
+# lookahead on these characters lets it skip the positions no rule can match.
+_PASS_FIRST_CHARS = {
+    "invisible": r"\u00ad\u200b-\u200d\u2060\ufeff",
+    "ligatures": r"\ufb00-\ufb06",
+    "hyphenation": r"\-",
+    "bullets": rf"\n{_PRIVATE_USE}",
+    "whitespace": rf"\n{_SPACES}",
+}
+
+
+class PDFTooLargeError(ValueError):
+    """Raised when a PDF exceeds the configured page-count or byte-size limit."""
+
+
+def _read_pdf_bytes(pdf_file):
+    """Return the raw bytes of a PDF given as a path, bytes or a file-like object."""
+    if isinstance(pdf_file, (bytes, bytearray)):
+        return bytes(pdf_file)
+    if isinstance(pdf_file, str):
+        with open(pdf_file, "rb") as f:
+            return f.read()
+    if hasattr(pdf_file, "getvalue"):
+        return pdf_file.getvalue()
+    position = pdf_file.tell()
+    data = pdf_file.read()
+    pdf_file.seek(position)
+    return data
+
 
+def _check_byte_size(data, max_bytes):
+    if max_bytes is not None and len(data) > max_bytes:
+        raise PDFTooLargeError(
+            f"The PDF is {len(data)} bytes; at most {max_bytes} are supported."
+        )
 
-def extract_pdf_text(pdf_file):
-    """Extract text from a PDF using pdfplumber."""
-    text = ""
-    with pdfplumber.open(pdf_file) as pdf:
+
+def _check_page_count(page_count, max_pages):
+    if max_pages is not None and page_count > max_pages:
+        raise PDFTooLargeError(
+            f"The PDF has {page_count} pages; at most {max_pages} are supported."
+        )
+
+
+def iter_pdf_pages(pdf_file, max_pages=MAX_PDF_PAGES, max_bytes=MAX_PDF_BYTES):
+    """
+    Yield the text of each page of a PDF as soon as it is parsed.
+
+    Args:
+        pdf_file: The PDF as a path, bytes or a file-like object.
+        max_pages (int or None): Maximum number of pages accepted.
+        max_bytes (int or None): Maximum file size accepted.
+
+    Yields:
+        str: The text of the next page ("" for pages without text).
+
+    Raises:
+        PDFTooLargeError: If the PDF exceeds one of the limits.
+    """
+    data = _read_pdf_bytes(pdf_file)
+    _check_byte_size(data, max_bytes)
+
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        _check_page_count(len(pdf.pages), max_pages)
         for page in pdf.pages:
-            text += page.extract_text()
-    return text
+            yield page.extract_text() or ""
+
+
+def _extract_pages(pdf_bytes, page_numbers):
+    """Extract the text of the given pages with pdfplumber, e.g. in a worker process."""
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return [pdf.pages[number].extract_text() or "" for number in page_numbers]
+
+
+def _extract_pages_in_pool(pdf_bytes, page_numbers, workers):
+    """Extract the given pages with pdfplumber, spreading contiguous runs across a process pool."""
+    if workers <= 1 or len(page_numbers) <= 1:
+        return _extract_pages(pdf_bytes, page_numbers)
+
+    # One run of pages per worker keeps the per-process parse overhead low
+    step = -(-len(page_numbers) // workers)
+    batches = [page_numbers[i : i + step] for i in range(0, len(page_numbers), step)]
+
+    with ProcessPoolExecutor(max_workers=len(batches)) as pool:
+        futures = [pool.submit(_extract_pages, pdf_bytes, batch) for batch in batches]
+        return [text for future in futures for text in future.result()]
+
+
+def extract_pdf_pages_parallel(
+    pdf_file, workers=4, max_pages=MAX_PDF_PAGES, max_bytes=MAX_PDF_BYTES
+):
+    """
+    Extract the text of every page, spreading page ranges across a process pool.
+
+    Args:
+        pdf_file: The PDF as a path, bytes or a file-like object.
+        workers (int): Number of worker processes.
+        max_pages (int or None): Maximum number of pages accepted.
+        max_bytes (int or None): Maximum file size accepted.
+
+    Returns:
+        list: The text of each page, in page order.
+
+    Raises:
+        PDFTooLargeError: If the PDF exceeds one of the limits.
+    """
+    data = _read_pdf_bytes(pdf_file)
+    _check_byte_size(data, max_bytes)
+
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        page_count = len(pdf.pages)
+    _check_page_count(page_count, max_pages)
+
+    return _extract_pages_in_pool(data, list(range(page_count)), workers)
+
+
+def page_needs_fallback(text):
+    """
+    Decide whether fast-tier page text is too poor to keep.
+
+    A page fails when it is (nearly) empty, when too many characters are
+    replacement, control or private-use glyphs, or when too many words are
+    run-on tokens, which happens when the fast extractor drops spaces.
+
+    Args:
+        text (str): The text extracted from one page.
+
+    Returns:
+        bool: True if the page should be re-extracted with pdfplumber.
+    """
+    stripped = text.strip()
+    if len(stripped) < MIN_PAGE_CHARS:
+        return True
+
+    garbled = sum(
+        1
+        for char in stripped
+        if char == "\ufffd"
+        or "\ue000" <= char <= "\uf8ff"
+        or (ord(char) < 32 and char not in "\n\t\r")
+    )
+    if garbled / len(stripped) > MAX_GARBLED_RATIO:
+        return True
+
+    words = stripped.split()
+    run_on = sum(1 for word in words if len(word) > 25)
+    return run_on / len(words) > MAX_RUN_ON_RATIO
+
+
+def extract_pdf_pages_tiered(
+    pdf_file, workers=1, max_pages=MAX_PDF_PAGES, max_bytes=MAX_PDF_BYTES
+):
+    """
+    Extract every page with PyPDF2 and re-extract only the poor pages with pdfplumber.
+
+    If no resume section header is found in the fast-tier text at all, every
+    page is re-extracted, since the fast extractor likely scrambled the layout.
+
+    Args:
+        pdf_file: The PDF as a path, bytes or a file-like object.
+        workers (int): Number of worker processes for the pdfplumber tier.
+        max_pages (int or None): Maximum number of pages accepted.
+        max_bytes (int or None): Maximum file size accepted.
+
+    Returns:
+        list: (page text, tier) pairs in page order, where tier is
+            `TIER_FAST` or `TIER_LAYOUT`.
+
+    Raises:
+        PDFTooLargeError: If the PDF exceeds one of the limits.
+    """
+    data = _read_pdf_bytes(pdf_file)
+    _check_byte_size(data, max_bytes)
+
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        _check_page_count(len(reader.pages), max_pages)
+        fast_pages = [page.extract_text() or "" for page in reader.pages]
+    except PDFTooLargeError:
+        raise
+    except Exception:
+        logger.warning("Fast PDF extraction failed; using pdfplumber", exc_info=True)
+        with pdfplumber.open(io.BytesIO(data)) as pdf:
+            page_count = len(pdf.pages)
+        _check_page_count(page_count, max_pages)
+        fast_pages = [""] * page_count
+
+    if detect_resume_sections("\n".join(fast_pages)):
+        fallback = [i for i, text in enumerate(fast_pages) if page_needs_fallback(text)]
+    else:
+        fallback = list(range(len(fast_pages)))
+
+    pages = [(text, TIER_FAST) for text in fast_pages]
+    if fallback:
+        for number, text in zip(
+            fallback, _extract_pages_in_pool(data, fallback, workers)
+        ):
+            pages[number] = (text, TIER_LAYOUT)
+
+    tiers = Counter(tier for _, tier in pages)
+    current_span().set(
+        pages=len(pages), fast_pages=tiers[TIER_FAST], layout_pages=tiers[TIER_LAYOUT]
+    )
+    logger.info(
+        "Extracted %d pages: %d with %s, %d with %s",
+        len(pages),
+        tiers[TIER_FAST],
+        TIER_FAST,
+        tiers[TIER_LAYOUT],
+        TIER_LAYOUT,
+    )
+    return pages
+
+
+def extract_pdf_text(
+    pdf_file, workers=1, max_pages=MAX_PDF_PAGES, max_bytes=MAX_PDF_BYTES, tiered=True
+):
+    """
+    Extract text from a PDF.
+
+    Args:
+        pdf_file: The PDF as a path, bytes or a file-like object.
+        workers (int): Number of worker processes for pdfplumber; 1 parses the pages in this process.
+        max_pages (int or None): Maximum number of pages accepted.
+        max_bytes (int or None): Maximum file size accepted.
+        tiered (bool): Try the fast PyPDF2 extractor first and use pdfplumber
+            only for pages that fail the quality checks. False always uses pdfplumber.
+
+    Returns:
+        str: The text of all pages, separated by `PAGE_SEPARATOR` so that
+            `clean_extracted_text` can tell running headers and footers apart.
+
+    Raises:
+        PDFTooLargeError: If the PDF exceeds one of the limits.
+    """
+    with span("pdf.extract", tiered=tiered, workers=workers):
+        if tiered:
+            pages = [
+                text
+                for text, _ in extract_pdf_pages_tiered(
+                    pdf_file, workers, max_pages, max_bytes
+                )
+            ]
+        elif workers > 1:
+            pages = extract_pdf_pages_parallel(pdf_file, workers, max_pages, max_bytes)
+        else:
+            pages = iter_pdf_pages(pdf_file, max_pages, max_bytes)
+        return PAGE_SEPARATOR.join(pages)
+
+
+@lru_cache(maxsize=None)
+def _compile_passes(passes):
+    """Combine the rules of the character-level passes into one pattern."""
+    rules = [rule for name in passes for rule in _PASS_RULES.get(name, ())]
+    if not rules:
+        return None, {}
+    first_chars = "".join(
+        _PASS_FIRST_CHARS[name] for name in passes if name in _PASS_RULES
+    )
+    alternatives = "|".join(f"(?P<{group}>{regex})" for group, regex, _ in rules)
+    pattern = re.compile(f"(?=[{first_chars}])(?:{alternatives})")
+    return pattern, {group: replacement for group, _, replacement in rules}
+
+
+def _furniture_key(line):
+    """Return what a header or footer line has in common across pages: its text without a trailing page number."""
+    return _TRAILING_PAGE_NUMBER.sub("#", line.strip().lower())
+
+
+def _edge_lines(lines):
+    """Return the indexes of the first and last `PAGE_EDGE_LINES` non-blank lines."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return set(filled[:PAGE_EDGE_LINES] + filled[-PAGE_EDGE_LINES:])
+
+
+def strip_page_furniture(pages):
+    """
+    Remove running headers, footers and page numbers from the pages of a document.
+
+    A line near the top or bottom of a page is a header or footer when the
+    same line, ignoring a trailing page number, is near the top or bottom of
+    at least half of the pages of a document with `MIN_FURNITURE_PAGES` or
+    more, or of two pages when it refers to a page number, like
+    "Jane Doe - Page 2". Its first copy is kept, since a running header
+    usually repeats the name and contact line of the resume, unless it
+    refers to a page number. Lines that only hold a page number are always
+    removed from the page edges.
+
+    Args:
+        pages (list): The text of each page.
+
+    Returns:
+        tuple: The pages without furniture and the number of characters removed.
+    """
+    page_lines = [page.split("\n") for page in pages]
+    edges = [_edge_lines(lines) for lines in page_lines]
+
+    pages_with_key = Counter()
+    for lines, edge in zip(page_lines, edges):
+        pages_with_key.update(
+            {
+                _furniture_key(lines[i])
+                for i in edge
+                if len(lines[i].strip()) <= MAX_FURNITURE_CHARS
+            }
+        )
+    threshold = max(MIN_FURNITURE_PAGES, -(-len(pages) // 2))
+    furniture = {key for key, count in pages_with_key.items() if count >= threshold}
+    numbered = {key for key, count in pages_with_key.items() if count >= 2}
+
+    kept_pages = []
+    removed = 0
+    seen = set()
+    for lines, edge in zip(page_lines, edges):
+        kept = []
+        for i, line in enumerate(lines):
+            if i in edge:
+                key = _furniture_key(line)
+                has_page_number = bool(
+                    _PAGE_REFERENCE.search(line) or key != line.strip().lower()
+                )
+                if (
+                    _PAGE_NUMBER.fullmatch(line.strip())
+                    or (key in furniture and key in seen)
+                    or (key in numbered and has_page_number)
+                ):
+                    removed += len(line) + 1
+                    continue
+                seen.add(key)
+            kept.append(line)
+        kept_pages.append("\n".join(kept))
+    return kept_pages, removed
+
+
+def normalize_text(text, passes=NORMALIZATION_PASSES):
+    """
+    Normalize extracted text with the given passes and report what each pass removed.
+
+    Pages separated by `PAGE_SEPARATOR` are joined with newlines. All
+    character-level passes run as one compiled pattern in a single scan of
+    the text, so adding a pass does not add another pass over the text.
+
+    Args:
+        text (str): The extracted text.
+        passes (iterable): Names from `NORMALIZATION_PASSES` to apply.
+
+    Returns:
+        tuple: The normalized text and a dict of pass name ->
+            {"chars_removed", "tokens_removed"} for the applied passes.
+    """
+    passes = tuple(name for name in NORMALIZATION_PASSES if name in set(passes))
+    removed = dict.fromkeys(passes, 0)
+
+    pages = text.split(PAGE_SEPARATOR)
+    if "page_furniture" in removed and len(pages) > 1:
+        pages, removed["page_furniture"] = strip_page_furniture(pages)
+    text = "\n".join(pages)
+
+    pattern, replacements = _compile_passes(passes)
+    if pattern is not None:
+
+        def _replace(match):
+            group = match.lastgroup
+            replacement = replacements[group]
+            if callable(replacement):
+                replacement = replacement(match.group())
+            removed[group.split("__")[0]] += len(match.group()) - len(replacement)
+            return replacement
+
+        # The leading newline lets the line-start rules match the first line
+        text = pattern.sub(_replace, "\n" + text)[1:]
+
+    if "whitespace" in removed:
+        stripped = text.strip()
+        removed["whitespace"] += len(text) - len(stripped)
+        text = stripped
+
+    report = {
+        name: {"chars_removed": chars, "tokens_removed": round(chars / 4)}
+        for name, chars in removed.items()
+    }
+    return text, report
+
+
+def clean_extracted_text(text, passes=DEFAULT_NORMALIZATION_PASSES):
+    """
+    Clean extracted text before it is sent to the LLM.
 
+    Args:
+        text (str): The text from `extract_pdf_text`.
+        passes (iterable): The normalization passes to apply, see `NORMALIZATION_PASSES`.
 
-def clean_extracted_text(text):
-    """Clean extracted text by removing extra spaces and newlines."""
-    cleaned_text = re.sub(r"\n{2,}", "\n", text)
+    Returns:
+        str: The cleaned text.
+    """
+    with span("text.normalize") as normalize_span:
+        cleaned_text, report = normalize_text(text, passes)
+        normalize_span.set(
+            chars_removed=len(text) - len(cleaned_text),
+            tokens_removed=estimate_tokens(text) - estimate_tokens(cleaned_text),
+            **{
+                f"{name}_tokens_removed": removed["tokens_removed"]
+                for name, removed in report.items()
+            },
+        )
     return cleaned_text
 
 
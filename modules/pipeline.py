@@ -0,0 +1,218 @@
+from modules.pdf_utils import extract_pdf_text, clean_extracted_text
+from modules.resume_parser import (
+    clean_rewrite,
+    fill_section_guides,
+    fill_section_responses,
+    process_full_resume,
+    resume_sections,
+    reuse_section_results,
+    stream_full_resume,
+)
+from modules.tracing import span
+
+
+class ResumePipeline:
+    """
+    The resume rewrite pipeline expressed as a small graph of lazily evaluated stages.
+
+    Callers ask for the outputs they need with `run` (or `get`); only those
+    stages and the stages they depend on are executed, and each stage result
+    is memoized for the lifetime of the pipeline, i.e. one request. With a
+    `section_memo` from the user's previous run, sections whose text did not
+    change reuse their guidelines, feedback and rewrites.
+
+    Stages:
+        extract: The cleaned resume text extracted from the PDF.
+        sections: (title, content) pairs detected in the resume text.
+        retrieve: The guideline text retrieved for each section.
+        feedback: Section title -> feedback.
+        section_rewrite: Section title -> rewritten section in Markdown.
+        full_rewrite: The rewritten full resume.
+    """
+
+    DEPENDENCIES = {
+        "extract": (),
+        "sections": ("extract",),
+        "retrieve": ("sections",),
+        "feedback": ("sections", "retrieve"),
+        "section_rewrite": ("sections", "retrieve"),
+        "full_rewrite": ("extract", "feedback"),
+    }
+
+    def __init__(
+        self,
+        feedback_chain,
+        rewrite_chain,
+        full_rewrite_chain,
+        map_rewrite_chain,
+        vector_store,
+        pdf_file=None,
+        resume_text=None,
+        max_concurrency=1,
+        on_stage=None,
+        section_memo=None,
+        guide_filter=None,
+    ):
+        """
+        Args:
+            feedback_chain: The LLM chain for feedback.
+            rewrite_chain: The LLM chain for rewriting sections.
+            full_rewrite_chain: The LLM chain for rewriting the full resume.
+            map_rewrite_chain: The LLM chain that rewrites one section from its
+                feedback, for resumes too long to rewrite in one call.
+            vector_store: The vector store for retrieval.
+            pdf_file: The uploaded PDF. Not needed when `resume_text` is given.
+            resume_text (str, optional): Already extracted resume text; skips the extract stage.
+            max_concurrency (int): Maximum number of LLM calls in flight at once.
+            on_stage (callable, optional): Called as on_stage(stage, status) with
+                "running" before and "done" after a stage executes, e.g. `Job.stage`.
+            section_memo (dict, optional): Section results of the user's previous
+                run, updated in place with this run's; see `reuse_section_results`.
+            guide_filter (dict, optional): Metadata filter of the guide chunks to
+                retrieve from, e.g. {"guide": "harvard_resume_guide"}.
+        """
+        if pdf_file is None and resume_text is None:
+            raise ValueError("Either pdf_file or resume_text is required.")
+
+        self.feedback_chain = feedback_chain
+        self.rewrite_chain = rewrite_chain
+        self.full_rewrite_chain = full_rewrite_chain
+        self.map_rewrite_chain = map_rewrite_chain
+        self.vector_store = vector_store
+        self.pdf_file = pdf_file
+        self.max_concurrency = max_concurrency
+        self.on_stage = on_stage
+        self.section_memo = section_memo
+        self.guide_filter = guide_filter
+        self._entries = None
+        self._results = {}
+        if resume_text is not None:
+            self._results["extract"] = resume_text
+
+    def get(self, stage):
+        """
+        Return the result of a stage, running it and its dependencies if needed.
+
+        Args:
+            stage (str): One of the keys of `DEPENDENCIES`.
+
+        Returns:
+            The stage result.
+        """
+        if stage not in self.DEPENDENCIES:
+            raise KeyError(f"Unknown pipeline stage: {stage}")
+
+        if stage not in self._results:
+            inputs = [self.get(dependency) for dependency in self.DEPENDENCIES[stage]]
+            self._report(stage, "running")
+            with span(f"stage.{stage}"):
+                self._results[stage] = getattr(self, f"_run_{stage}")(*inputs)
+            self._report(stage, "done")
+        return self._results[stage]
+
+    def _report(self, stage, status):
+        if self.on_stage is not None:
+            self.on_stage(stage, status)
+
+    def run(self, *stages):
+        """
+        Return the results of the requested stages.
+
+        Args:
+            *stages (str): The stages whose outputs the caller needs.
+
+        Returns:
+            dict: Stage name -> result.
+        """
+        return {stage: self.get(stage) for stage in stages}
+
+    def stream_full_rewrite(self):
+        """
+        Yield the full rewrite as it is generated instead of waiting for all of it.
+
+        The dependencies run as usual. Once the stream is exhausted the joined
+        text is memoized as the result of the full_rewrite stage.
+
+        Yields:
+            str: The next piece of the rewritten resume.
+        """
+        if "full_rewrite" in self._results:
+            yield self._results["full_rewrite"]
+            return
+
+        feedback = self.get("feedback")
+        resume_text = self.get("extract")
+        chunks = []
+        self._report("full_rewrite", "running")
+        with span("stage.full_rewrite", streamed=True):
+            for chunk in stream_full_resume(
+                feedback,
+                resume_text,
+                self.full_rewrite_chain,
+                self.max_concurrency,
+                section_memo=self.section_memo,
+                map_rewrite_chain=self.map_rewrite_chain,
+            ):
+                chunks.append(chunk)
+                yield chunk
+        self._results["full_rewrite"] = "".join(chunks)
+        self._report("full_rewrite", "done")
+
+    def completed_stages(self):
+        """Return the names of the stages that have run so far."""
+        return list(self._results)
+
+    def _run_extract(self):
+        return clean_extracted_text(extract_pdf_text(self.pdf_file))
+
+    def _run_sections(self, resume_text):
+        return resume_sections(resume_text)
+
+    def _run_retrieve(self, sections):
+        # Per-section results, prefilled for the sections unchanged since the
+        # previous run; the feedback and section_rewrite stages fill them in
+        self._entries = reuse_section_results(
+            sections, self.section_memo, self.guide_filter
+        )
+        fill_section_guides(
+            sections, self._entries, self.vector_store, self.guide_filter
+        )
+        return [entry["guide"] for entry in self._entries]
+
+    def _run_feedback(self, sections, guides):
+        fill_section_responses(
+            sections,
+            self._entries,
+            {"feedback": self.feedback_chain},
+            self.max_concurrency,
+        )
+        return {
+            title: entry["feedback"]
+            for (title, _), entry in zip(sections, self._entries)
+        }
+
+    def _run_section_rewrite(self, sections, guides):
+        fill_section_responses(
+            sections,
+            self._entries,
+            {"rewrite": self.rewrite_chain},
+            self.max_concurrency,
+        )
+        return {
+            title: f"### {title}\n{clean_rewrite(title, entry['rewrite'])}"
+            for (title, _), entry in zip(sections, self._entries)
+        }
+
+    def _run_full_rewrite(self, resume_text, feedback):
+        return process_full_resume(
+            feedback,
+            resume_text,
+            self.full_rewrite_chain,
+            self.max_concurrency,
+            section_memo=self.section_memo,
+            map_rewrite_chain=self.map_rewrite_chain,
+        )
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,402 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from modules.tracing import current_span
+
+# Gemini quota of the API key, shared by every session of the server process.
+# Set a limit to 0 to disable it.
+DEFAULT_REQUESTS_PER_MINUTE = int(os.environ.get("LLM_RPM", "15"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.environ.get("LLM_TPM", "1000000"))
+
+# Retries of a call rejected with HTTP 429 before the error is raised
+DEFAULT_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+
+# Retries of a call that failed with a server error, a timeout or a dropped
+# connection, as many as the Gemini client makes on its own
+DEFAULT_MAX_TRANSIENT_RETRIES = 2
+
+# Exception class names of transient failures raised by google-api-core,
+# httpx and requests
+_TRANSIENT_ERRORS = (
+    "InternalServerError",
+    "BadGateway",
+    "ServiceUnavailable",
+    "GatewayTimeout",
+    "DeadlineExceeded",
+    "ReadTimeout",
+    "ConnectTimeout",
+    "ConnectError",
+    "RemoteProtocolError",
+)
+
+_current_session = contextvars.ContextVar("rate_limit_session", default="default")
+
+# E.g. "Please retry in 12.5s" or "retry_delay { seconds: 12 }"
+_RETRY_HINT = re.compile(r"retry\D{0,20}?(\d+(?:\.\d+)?)", re.IGNORECASE)
+
+
+class TokenBucket:
+    """
+    A token bucket that refills continuously at `rate` per `period` seconds, up to `rate`.
+
+    The level may go negative when more was used than reserved; later
+    requests then wait until the debt is paid back.
+    """
+
+    def __init__(self, rate, period=60.0):
+        self.capacity = rate
+        self.refill_per_second = rate / period
+        self.level = float(rate)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.level = min(self.capacity, self.level + elapsed * self.refill_per_second)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Return the seconds until `amount` can be taken, 0 if it can be taken now."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_per_second
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount, now):
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+def is_rate_limit_error(error):
+    """Return True if an exception is an HTTP 429 / quota exhausted response."""
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    for value in (
+        getattr(error, "status_code", None),
+        getattr(error, "code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        if value == 429 or str(value) == "429":
+            return True
+    message = str(error)
+    return re.search(r"\b429\b", message) is not None or "RESOURCE_EXHAUSTED" in message
+
+
+def is_transient_error(error):
+    """Return True if an exception is an HTTP 5xx response, a timeout or a dropped connection."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _TRANSIENT_ERRORS:
+        return True
+    for value in (
+        getattr(error, "status_code", None),
+        getattr(getattr(error, "response", None), "status_code", None),
+    ):
+        if str(value) in ("500", "502", "503", "504"):
+            return True
+    return False
+
+
+def retry_after(error):
+    """
+    Return the retry delay the server suggested for a rate limit error, if any.
+
+    Looks at a `retry_after` attribute, a Retry-After response header and
+    hints such as "retry in 12.5s" or "retry_delay { seconds: 12 }" in the message.
+    """
+    hint = getattr(error, "retry_after", None)
+    if hint is None:
+        headers = getattr(getattr(error, "response", None), "headers", None) or {}
+        hint = headers.get("Retry-After") or headers.get("retry-after")
+    if hint is None:
+        match = _RETRY_HINT.search(str(error))
+        hint = match and match.group(1)
+    try:
+        return float(hint) if hint is not None else None
+    except ValueError:
+        return None
+
+
+@contextlib.contextmanager
+def rate_limit_session(session_id):
+    """
+    Attribute the LLM calls made inside the block to a session for fair queueing.
+
+    Worker threads started with a copy of the context inherit the session.
+    """
+    token = _current_session.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+class RateLimiter:
+    """
+    A process-wide admission controller for LLM calls.
+
+    Calls wait for a requests-per-minute and a tokens-per-minute bucket.
+    Waiting calls are admitted round-robin across sessions, so one session
+    with many queued calls cannot starve the others. A call rejected with
+    HTTP 429 pauses admission for everyone for the server's retry hint, or a
+    jittered exponential backoff, and is then retried.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        max_transient_retries=DEFAULT_MAX_TRANSIENT_RETRIES,
+        base_delay=1.0,
+        max_delay=60.0,
+        period=60.0,
+    ):
+        """
+        Args:
+            requests_per_minute (int): Request quota; 0 disables the bucket.
+            tokens_per_minute (int): Prompt plus completion token quota; 0 disables the bucket.
+            max_retries (int): Retries of a call rejected with HTTP 429.
+            max_transient_retries (int): Retries of a call that failed with a
+                server error, a timeout or a dropped connection.
+            base_delay (float): Backoff of the first retry without a hint, in seconds.
+            max_delay (float): Upper bound of a backoff, in seconds.
+            period (float): Length of a quota "minute" in seconds; tests shorten it.
+        """
+        self.max_retries = max_retries
+        self.max_transient_retries = max_transient_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._buckets = {}
+        if requests_per_minute:
+            self._buckets["requests"] = TokenBucket(requests_per_minute, period)
+        if tokens_per_minute:
+            self._buckets["tokens"] = TokenBucket(tokens_per_minute, period)
+        self._blocked_until = 0.0
+        self._queues = OrderedDict()
+        self._condition = threading.Condition()
+
+        self._queue_depth = 0
+        self._max_queue_depth = 0
+        self._admitted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._throttled = 0
+        self._retries = 0
+
+    def _delay(self, tokens, now):
+        delays = [self._blocked_until - now]
+        if "requests" in self._buckets:
+            delays.append(self._buckets["requests"].delay(1, now))
+        if "tokens" in self._buckets and tokens:
+            delays.append(self._buckets["tokens"].delay(tokens, now))
+        return max(delays)
+
+    def _is_next(self, session, ticket):
+        # The head of the queue of the session whose turn it is
+        return (
+            next(iter(self._queues)) == session and self._queues[session][0] is ticket
+        )
+
+    def acquire(self, tokens=0, session=None):
+        """
+        Block until a call reserving `tokens` may be made.
+
+        Args:
+            tokens (int): Estimated prompt plus completion tokens of the call.
+            session (str, optional): Defaults to the session set with `rate_limit_session`.
+
+        Returns:
+            float: The seconds spent waiting.
+        """
+        session = session if session is not None else _current_session.get()
+        ticket = object()
+        start = time.monotonic()
+        with self._condition:
+            self._queues.setdefault(session, deque()).append(ticket)
+            self._queue_depth += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._queue_depth)
+            try:
+                while True:
+                    if not self._is_next(session, ticket):
+                        self._condition.wait()
+                        continue
+                    now = time.monotonic()
+                    delay = self._delay(tokens, now)
+                    if delay <= 0:
+                        if "requests" in self._buckets:
+                            self._buckets["requests"].take(1, now)
+                        if "tokens" in self._buckets and tokens:
+                            self._buckets["tokens"].take(tokens, now)
+                        break
+                    self._condition.wait(delay)
+            finally:
+                queue = self._queues[session]
+                queue.remove(ticket)
+                if queue:
+                    # Let the other sessions go first
+                    self._queues.move_to_end(session)
+                else:
+                    del self._queues[session]
+                self._queue_depth -= 1
+                self._condition.notify_all()
+
+            waited = time.monotonic() - start
+            self._admitted += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+
+        current_span().add("rate_limit_wait_ms", round(waited * 1000, 2))
+        return waited
+
+    def settle(self, reserved, used):
+        """Return the unused part of a token reservation, or charge the overrun."""
+        if "tokens" in self._buckets and reserved != used:
+            with self._condition:
+                self._buckets["tokens"].give(reserved - used, time.monotonic())
+                self._condition.notify_all()
+
+    def backoff(self, attempt, hint=None):
+        """
+        Return the delay before retry number `attempt` (counting from 0).
+
+        A server hint is honored, with up to `base_delay` of jitter added so
+        the waiting calls do not all retry at the same instant. Without a
+        hint the delay doubles per attempt, with half of it randomized.
+        """
+        if hint is not None:
+            return hint + random.uniform(0, self.base_delay)
+        delay = min(self.max_delay, self.base_delay * 2**attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _throttle(self, delay):
+        with self._condition:
+            self._throttled += 1
+            self._retries += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            self._condition.notify_all()
+        current_span().add("retries")
+
+    def _retry_delay(self, error, attempts):
+        """
+        Decide whether a failed call is retried, and record the retry.
+
+        A 429 pauses admission for every session (see `_throttle`); a
+        transient error only delays the call that hit it.
+
+        Args:
+            error (Exception): What the call raised.
+            attempts (dict): Retries so far per kind, updated in place.
+
+        Returns:
+            float or None: Seconds the call sleeps before it queues again, or
+                None when the error is to be raised.
+        """
+        if is_rate_limit_error(error):
+            if attempts["rate_limit"] >= self.max_retries:
+                return None
+            self._throttle(self.backoff(attempts["rate_limit"], retry_after(error)))
+            attempts["rate_limit"] += 1
+            return 0.0
+        if is_transient_error(error):
+            if attempts["transient"] >= self.max_transient_retries:
+                return None
+            delay = self.backoff(attempts["transient"])
+            attempts["transient"] += 1
+            with self._condition:
+                self._retries += 1
+            current_span().add("retries")
+            return delay
+        return None
+
+    def call(self, fn, tokens=0, session=None):
+        """
+        Call `fn()` once admitted, retrying it after HTTP 429 and transient errors.
+
+        Args:
+            fn (callable): Makes the LLM call.
+            tokens (int): Estimated prompt plus completion tokens of the call.
+            session (str, optional): Defaults to the session set with `rate_limit_session`.
+
+        Every attempt reserves `tokens`. A failed attempt returns its
+        reservation before it is retried or its error is raised, so only the
+        successful attempt's reservation is left for the caller to `settle`.
+
+        Returns:
+            The result of `fn`.
+        """
+        attempts = {"rate_limit": 0, "transient": 0}
+        while True:
+            self.acquire(tokens, session)
+            try:
+                return fn()
+            except BaseException as error:
+                self.settle(tokens, 0)
+                if not isinstance(error, Exception):
+                    raise
+                delay = self._retry_delay(error, attempts)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def acall(self, fn, tokens=0, session=None):
+        """Asyncio variant of `call`; `fn()` returns an awaitable."""
+        attempts = {"rate_limit": 0, "transient": 0}
+        while True:
+            await asyncio.to_thread(self.acquire, tokens, session)
+            try:
+                return await fn()
+            except BaseException as error:
+                self.settle(tokens, 0)
+                if not isinstance(error, Exception):
+                    raise
+                delay = self._retry_delay(error, attempts)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        """Return the queue depth, wait time and throttling counters."""
+        with self._condition:
+            return {
+                "queue_depth": self._queue_depth,
+                "max_queue_depth": self._max_queue_depth,
+                "waiting_sessions": len(self._queues),
+                "admitted": self._admitted,
+                "mean_wait_ms": (
+                    round(self._total_wait / self._admitted * 1000, 2)
+                    if self._admitted
+                    else 0.0
+                ),
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                "throttled": self._throttled,
+                "retries": self._retries,
+            }
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the process-wide rate limiter shared by all sessions."""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            _default_limiter = RateLimiter()
+        return _default_limiter
+
+
+if __name__ == "__main__":
+    pass
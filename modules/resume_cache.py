@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+# Memory budget of the process-wide cache, in MiB
+DEFAULT_MAX_MB = int(os.environ.get("RESUME_CACHE_MB", "64"))
+
+
+def _size_of(value):
+    """Approximate the memory held by a cached value, counting the UTF-8 size of its strings."""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, dict):
+        return sum(_size_of(k) + _size_of(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_size_of(item) for item in value)
+    return 64
+
+
+class ResumeCache:
+    """
+    A process-wide LRU cache of per-PDF results, keyed by the SHA-256 of the uploaded bytes.
+
+    Each entry is a dict that can hold the cleaned extracted text and,
+    optionally, the finished feedback and full rewrite. Least recently used
+    entries are evicted once the entries together exceed `max_bytes`.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(pdf_bytes):
+        """Return the cache key of an uploaded PDF."""
+        return hashlib.sha256(pdf_bytes).hexdigest()
+
+    def get(self, key):
+        """Return a copy of the entry for the key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry)
+
+    def put(self, key, **fields):
+        """
+        Add fields to the entry for the key, evicting least recently used entries over budget.
+
+        Args:
+            key (str): The cache key from `key_for`.
+            **fields: E.g. resume_text, feedback and full_resume.
+        """
+        with self._lock:
+            entry = dict(self._entries.get(key, {}))
+            entry.update(fields)
+            size = _size_of(entry)
+            if size > self.max_bytes:
+                # Too large to ever fit; don't evict everything else for it
+                return
+
+            self._total_bytes += size - self._sizes.get(key, 0)
+            self._entries[key] = entry
+            self._sizes[key] = size
+            self._entries.move_to_end(key)
+
+            while self._total_bytes > self.max_bytes:
+                evicted, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(evicted)
+
+    def stats(self):
+        """Return the hit/miss counters, entry count and memory in use."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_resume_cache():
+    """Return the process-wide resume cache shared by all sessions."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResumeCache()
+        return _default_cache
+
+
+if __name__ == "__main__":
+    pass
@@ -1,35 +1,359 @@
+import asyncio
+import contextvars
+import hashlib
 import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
+from modules.llm_pipeline import (
+    FULL_REWRITE_MAX_OUTPUT_TOKENS,
+    MAX_PROMPT_TOKENS,
+    arun_chain,
+    estimate_tokens,
+    run_chain,
+    stream_chain,
+)
+from modules.tracing import current_span
+from modules.vectorstore_utils import batch_similarity_search
 
-def detect_resume_sections(text):
-    """Detect and split resume sections based on common headers."""
-    section_headers = [
-        "Education",
+# Expected length of a rewrite relative to the original text
+REWRITE_EXPANSION = 1.2
+
+# Where a line too long for one map-reduce piece is split first
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+
+# Canonical section title -> header variants recognised at the start of a line.
+SECTION_HEADERS = {
+    "Education": ["Education", "Academic Background", "Education and Training"],
+    "Work Experience": [
         "Work Experience",
+        "Professional Experience",
+        "Employment History",
+        "Work History",
         "Experience",
-        "Skills",
-        "Certifications",
-        "Hobbies",
-        "Interests",
-        "Projects",
-        "Awards",
-    ]
+    ],
+    "Research Experience": ["Research Experience", "Research"],
+    "Leadership Experience": ["Leadership Experience", "Leadership"],
+    "Volunteer Experience": ["Volunteer Experience", "Volunteering"],
+    "Skills": ["Skills", "Technical Skills", "Core Competencies"],
+    "Certifications": ["Certifications", "Certificates", "Licenses and Certifications"],
+    "Hobbies": ["Hobbies"],
+    "Interests": ["Interests"],
+    "Projects": ["Projects", "Personal Projects"],
+    "Awards": ["Awards", "Honors and Awards", "Honors"],
+}
+
+
+def _normalize_header(header):
+    return " ".join(header.lower().split())
+
+
+@lru_cache(maxsize=8)
+def _compile_section_headers(header_items):
+    """Compile the line-anchored header pattern and the variant -> title lookup."""
+    lookup = {}
+    for title, variants in header_items:
+        for variant in variants:
+            lookup[_normalize_header(variant)] = title
+
+    # Longest variants first, so "Work Experience" wins over "Experience"
+    alternatives = "|".join(
+        r"[ \t]+".join(map(re.escape, variant.split()))
+        for variant in sorted(lookup, key=len, reverse=True)
+    )
+    pattern = re.compile(
+        rf"^[ \t]*(?P<header>{alternatives})[ \t]*(?::|$)",
+        re.IGNORECASE | re.MULTILINE,
+    )
+    return pattern, lookup
+
 
-    # Build regex to match any of the section headers, ignoring case
-    regex = (
-        r"(?i)(\b(?:"
-        + "|".join(map(re.escape, section_headers))
-        + r")\b.*?)(?=\b(?:"
-        + "|".join(map(re.escape, section_headers))
-        + r")\b|$)"
+def _section_matches(text, headers):
+    """Yield (title, header_start, body_start, end) for every section in one pass."""
+    header_items = tuple(
+        (title, tuple(variants))
+        for title, variants in (headers or SECTION_HEADERS).items()
     )
+    pattern, lookup = _compile_section_headers(header_items)
+
+    previous = None
+    for match in pattern.finditer(text):
+        if previous is not None:
+            yield previous + (match.start(),)
+        title = lookup[_normalize_header(match.group("header"))]
+        previous = (title, match.start(), match.end())
+    if previous is not None:
+        yield previous + (len(text),)
+
+
+def index_resume_sections(text, headers=None):
+    """
+    Locate resume sections by their headers without copying any text.
+
+    A header is one of the known variants at the start of a line, either
+    alone on the line or followed by a colon. Text before the first header
+    (e.g. contact details) does not belong to any section.
+
+    Args:
+        text (str): The resume text.
+        headers (dict, optional): Canonical title -> header variants.
+            Defaults to `SECTION_HEADERS`.
+
+    Returns:
+        list: (title, start, end) triples in document order, where title is the
+            canonical section title and text[start:end] is the section body
+            following the header.
+    """
+    return [
+        (title, body_start, end)
+        for title, _, body_start, end in _section_matches(text, headers)
+    ]
 
-    sections = re.findall(regex, text, re.DOTALL)
 
+def detect_resume_sections(text, headers=None):
+    """Detect and split resume sections based on common headers."""
+    return [
+        text[header_start:end].strip()
+        for _, header_start, _, end in _section_matches(text, headers)
+    ]
+
+
+def resume_sections(text, headers=None):
+    """
+    Return the (title, content) pairs of a resume's sections.
+
+    Titles are canonical; a title that occurs more than once gets a numeric
+    suffix so that every section keeps its own feedback.
+
+    Args:
+        text (str): The resume text.
+        headers (dict, optional): Canonical title -> header variants.
+
+    Returns:
+        list: (title, content) pairs in document order.
+    """
+    sections = []
+    seen = Counter()
+    for title, start, end in index_resume_sections(text, headers):
+        seen[title] += 1
+        if seen[title] > 1:
+            title = f"{title} ({seen[title]})"
+        sections.append((title, text[start:end].strip()))
     return sections
 
 
-def process_resume(resume_text, feedback_chain, rewrite_chain, vector_store):
+def _guideline_query(title):
+    """Build the vector store query for a resume section title."""
+    return f"How to write an impactful {title.lower()} section in a resume."
+
+
+def retrieve_guidelines(vector_store, title, k=3, guide_filter=None):
+    """Retrieve the guideline text relevant to a resume section title."""
+    return retrieve_guidelines_batch(
+        vector_store, [title], k=k, guide_filter=guide_filter
+    )[0]
+
+
+def retrieve_guidelines_batch(vector_store, titles, k=3, guide_filter=None):
+    """
+    Retrieve the guideline text for several section titles at once.
+
+    All queries are embedded in one call and searched in one FAISS call.
+
+    Args:
+        vector_store: The vector store for retrieval.
+        titles (list): The section titles.
+        k (int): Number of guideline chunks per section.
+        guide_filter (dict, optional): Metadata filter of the chunks to search,
+            e.g. {"guide": "harvard_resume_guide"}; see `batch_similarity_search`.
+
+    Returns:
+        list: The guideline text for each title, in the order of `titles`.
+
+    Raises:
+        ValueError: If no guideline is found for a title, e.g. because the
+            filter matches no chunk, so the LLM is never prompted without one.
+    """
+    results = batch_similarity_search(
+        vector_store,
+        [_guideline_query(title) for title in titles],
+        k=k,
+        filter=guide_filter,
+    )
+    guides = ["\n".join([doc.page_content for doc in docs]) for docs in results]
+    for title, guide_text in zip(titles, guides):
+        if not guide_text.strip():
+            raise ValueError(
+                f"No guidelines found for the {title!r} section"
+                + (f" with the filter {guide_filter!r}." if guide_filter else ".")
+            )
+    return guides
+
+
+def clean_rewrite(title, rewrite_response):
+    """Remove a duplicated section header from a rewritten section."""
+    first_line = rewrite_response.split("\n")[0].strip()
+    if first_line.lower().startswith(title.lower()):
+        # If the first line is the same as the title, remove it
+        rewrite_response = "\n".join(rewrite_response.split("\n")[1:]).strip()
+    return rewrite_response
+
+
+def run_chain_calls(calls, max_concurrency=1):
+    """
+    Run LLM chain calls on a thread pool and return their results in order.
+
+    Args:
+        calls (list): (chain, inputs) pairs.
+        max_concurrency (int): Maximum number of calls in flight at once.
+            1 runs the calls one after another on the calling thread.
+
+    Returns:
+        list: The chain outputs, in the same order as `calls`.
+    """
+    if max_concurrency <= 1 or len(calls) <= 1:
+        return [run_chain(chain, inputs) for chain, inputs in calls]
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(calls))) as pool:
+        # Each call runs in a copy of the caller's context so tracing spans
+        # recorded on the worker threads attach to the current request
+        futures = [
+            pool.submit(contextvars.copy_context().run, run_chain, chain, inputs)
+            for chain, inputs in calls
+        ]
+        return [future.result() for future in futures]
+
+
+async def arun_chain_calls(calls, max_concurrency=4):
+    """
+    Run LLM chain calls concurrently on the event loop and return their results in order.
+
+    Args:
+        calls (list): (chain, inputs) pairs.
+        max_concurrency (int): Maximum number of calls in flight at once.
+
+    Returns:
+        list: The chain outputs, in the same order as `calls`.
+    """
+    semaphore = asyncio.Semaphore(max(max_concurrency, 1))
+
+    async def _call(chain, inputs):
+        async with semaphore:
+            return await arun_chain(chain, inputs)
+
+    return await asyncio.gather(*(_call(chain, inputs) for chain, inputs in calls))
+
+
+def _digest(*parts):
+    """Return a short stable digest of some text parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def reuse_section_results(sections, section_memo=None, guide_filter=None):
+    """
+    Return a result entry per section, reusing the previous run's results for unchanged sections.
+
+    A section is unchanged when its title and content match a section of
+    the previous run; its entry then starts out with the stored retrieved
+    guide text and LLM responses. Entries of changed sections start empty.
+    The memo is updated to hold exactly this run's entries, so filling the
+    entries also records them for the next run.
+
+    Args:
+        sections (list): (title, content) pairs from `resume_sections`.
+        section_memo (dict, optional): Results of the previous run of the same
+            user, updated in place. None disables reuse.
+        guide_filter (dict, optional): The retrieval filter of this run;
+            results retrieved with another filter are not reused.
+
+    Returns:
+        list: One dict per section with the keys filled so far, e.g.
+            "guide", "feedback" and "rewrite".
+    """
+    previous = section_memo.get("sections", {}) if section_memo is not None else {}
+    filter_parts = [repr(sorted(guide_filter.items()))] if guide_filter else []
+    keys = [_digest(title, content, *filter_parts) for title, content in sections]
+    entries = [dict(previous.get(key, {})) for key in keys]
+    if section_memo is not None:
+        section_memo["sections"] = dict(zip(keys, entries))
+
+    reused = sum(1 for entry in entries if entry)
+    current_span().set(sections_reused=reused, sections_changed=len(entries) - reused)
+    return entries
+
+
+def fill_section_guides(sections, entries, vector_store, guide_filter=None):
+    """Retrieve the guideline text for the sections whose entries do not have it yet."""
+    missing = [i for i, entry in enumerate(entries) if "guide" not in entry]
+    if missing:
+        guides = retrieve_guidelines_batch(
+            vector_store, [sections[i][0] for i in missing], guide_filter=guide_filter
+        )
+        for i, guide_text in zip(missing, guides):
+            entries[i]["guide"] = guide_text
+
+
+def _missing_section_calls(sections, entries, chains):
+    """Build the calls for the responses the entries lack, interleaved per section."""
+    targets = []
+    calls = []
+    for i, (_, content) in enumerate(sections):
+        inputs = {"resume_section": content, "guide_section": entries[i]["guide"]}
+        for field, chain in chains.items():
+            if field not in entries[i]:
+                targets.append((i, field))
+                calls.append((chain, inputs))
+    return targets, calls
+
+
+def fill_section_responses(sections, entries, chains, max_concurrency=1):
+    """
+    Call the LLM for the section responses the entries do not have yet.
+
+    Args:
+        sections (list): (title, content) pairs.
+        entries (list): The entries from `reuse_section_results`, with guides filled.
+        chains (dict): Entry field -> chain, e.g. {"feedback": feedback_chain}.
+        max_concurrency (int): Maximum number of LLM calls in flight at once.
+    """
+    targets, calls = _missing_section_calls(sections, entries, chains)
+    for (i, field), response in zip(targets, run_chain_calls(calls, max_concurrency)):
+        entries[i][field] = response
+
+
+async def afill_section_responses(sections, entries, chains, max_concurrency=4):
+    """Asyncio variant of `fill_section_responses`."""
+    targets, calls = _missing_section_calls(sections, entries, chains)
+    responses = await arun_chain_calls(calls, max_concurrency)
+    for (i, field), response in zip(targets, responses):
+        entries[i][field] = response
+
+
+def _collect_results(sections, entries):
+    """Assemble the feedback and improved resume dictionaries in section order."""
+    feedback = {}
+    improved_resume = {}
+    for (title, _), entry in zip(sections, entries):
+        feedback[title] = entry["feedback"]
+        rewrite_response = clean_rewrite(title, entry["rewrite"])
+        improved_resume[title] = f"### {title}\n{rewrite_response}"
+    return feedback, improved_resume
+
+
+def process_resume(
+    resume_text,
+    feedback_chain,
+    rewrite_chain,
+    vector_store,
+    max_concurrency=1,
+    section_memo=None,
+    guide_filter=None,
+):
     """
     Process the user's resume, generate both feedback and improvements for each section, and return them separately.
 
@@ -38,80 +362,361 @@ def process_resume(resume_text, feedback_chain, rewrite_chain, vector_store):
         feedback_chain: The LLM chain for feedback.
         rewrite_chain: The LLM chain for rewriting sections.
         vector_store: The vector store for retrieval.
+        max_concurrency (int): Maximum number of LLM calls in flight at once.
+            Sections, and the feedback and rewrite calls within a section,
+            run in parallel on a thread pool. 1 keeps the calls sequential.
+        section_memo (dict, optional): Results of the user's previous run,
+            updated in place. Sections whose text did not change reuse their
+            retrieved guidelines, feedback and rewrite; only changed
+            sections are sent to the LLM.
+        guide_filter (dict, optional): Metadata filter of the guide chunks to
+            retrieve from, e.g. {"guide": "harvard_resume_guide"}.
 
     Returns:
         dict: Two dictionaries, one with feedback and one with improved resume sections.
     """
 
-    # Step 1: Parse the resume into sections
-    resume_sections = detect_resume_sections(resume_text)
+    # Step 1: Parse the resume into sections and retrieve relevant guidelines
+    sections = resume_sections(resume_text)
+    entries = reuse_section_results(sections, section_memo, guide_filter)
+    fill_section_guides(sections, entries, vector_store, guide_filter)
 
-    # Dictionaries to store feedback and rewritten resume sections
-    feedback = {}
-    improved_resume = {}
+    # Step 2: Generate feedback and rewrites for each changed section
+    fill_section_responses(
+        sections,
+        entries,
+        {"feedback": feedback_chain, "rewrite": rewrite_chain},
+        max_concurrency,
+    )
 
-    # Step 2: Process each section
-    for section in resume_sections:
-        lines = section.split("\n")
-        title = lines[0].strip()  # Section title
-        content = "\n".join(lines[1:]).strip()  # Section content
+    # Step 3: Return both the feedback and the improved resume
+    return _collect_results(sections, entries)
 
-        # Query the vector store to retrieve relevant guidelines for this section
-        query = f"How to write an impactful {title.lower()} section in a resume."
-        relevant_docs = vector_store.similarity_search(query, k=3)
-        guide_text = "\n".join([doc.page_content for doc in relevant_docs])
 
-        # Generate feedback
-        feedback_response = feedback_chain.run(
-            {"resume_section": content, "guide_section": guide_text}
-        )
-        feedback[title] = feedback_response
+async def aprocess_resume(
+    resume_text,
+    feedback_chain,
+    rewrite_chain,
+    vector_store,
+    max_concurrency=4,
+    section_memo=None,
+    guide_filter=None,
+):
+    """
+    Asyncio variant of `process_resume`.
 
-        # Rewriting the resume section
-        rewrite_response = rewrite_chain.run(
-            {"resume_section": content, "guide_section": guide_text}
-        )
+    Args:
+        resume_text (str): The user's current resume text.
+        feedback_chain: The LLM chain for feedback.
+        rewrite_chain: The LLM chain for rewriting sections.
+        vector_store: The vector store for retrieval.
+        max_concurrency (int): Maximum number of LLM calls in flight at once.
+        section_memo (dict, optional): Results of the user's previous run, updated in place.
+        guide_filter (dict, optional): Metadata filter of the guide chunks to retrieve from.
 
-        # Remove duplicated section headers
-        first_line = rewrite_response.split("\n")[0].strip()
-        if first_line.lower().startswith(title.lower()):
-            # If the first line is the same as the title, remove it
-            rewrite_response = "\n".join(rewrite_response.split("\n")[1:]).strip()
+    Returns:
+        dict: Two dictionaries, one with feedback and one with improved resume sections.
+    """
+    sections = resume_sections(resume_text)
+    entries = reuse_section_results(sections, section_memo, guide_filter)
+    fill_section_guides(sections, entries, vector_store, guide_filter)
+    await afill_section_responses(
+        sections,
+        entries,
+        {"feedback": feedback_chain, "rewrite": rewrite_chain},
+        max_concurrency,
+    )
+    return _collect_results(sections, entries)
 
-        # Store the rewritten resume section
-        improved_resume[title] = f"### {title}\n{rewrite_response}"
 
-    # Step 3: Return both the feedback and the improved resume
-    return feedback, improved_resume
+def _feedback_text(feedback):
+    """Combine the feedback of all sections into a single string."""
+    return "\n\n".join(
+        [f"{section}:\n{content}" for section, content in feedback.items()]
+    )
+
+
+def _full_rewrite_inputs(feedback, full_resume_text):
+    """Build the full-rewrite chain inputs from the section feedback and the original resume."""
+    # The feedback is used as guidelines for the full rewrite
+    return {
+        "resume_section": full_resume_text,
+        "guide_section": _feedback_text(feedback),
+    }
+
 
+def _prompt_tokens(rewrite_chain, inputs):
+    """Estimate the prompt tokens of a chain call: the template plus the inputs."""
+    prompt = getattr(rewrite_chain, "prompt", None)
+    template_tokens = estimate_tokens(prompt.template) if prompt is not None else 0
+    return template_tokens + sum(estimate_tokens(value) for value in inputs.values())
 
-def process_full_resume(feedback, full_resume_text, rewrite_chain):
+
+def plan_full_rewrite(
+    feedback,
+    full_resume_text,
+    rewrite_chain=None,
+    max_output_tokens=FULL_REWRITE_MAX_OUTPUT_TOKENS,
+    max_prompt_tokens=MAX_PROMPT_TOKENS,
+):
+    """
+    Decide whether the full resume can be rewritten in one call.
+
+    The rewrite is assumed to be about as long as the original resume, plus
+    `REWRITE_EXPANSION` for formatting. When the expected output would be cut
+    off at `max_output_tokens`, or the prompt would exceed `max_prompt_tokens`,
+    the plan switches to map-reduce.
+
+    Args:
+        feedback (dict): Feedback from the LLM for each section.
+        full_resume_text (str): The original resume text.
+        rewrite_chain (optional): The full-rewrite chain, to include its template.
+        max_output_tokens (int): The output token limit of the full-rewrite LLM.
+        max_prompt_tokens (int): The prompt token budget of a single call.
+
+    Returns:
+        dict: "mode" ("single" or "map_reduce"), "prompt_tokens" and "output_tokens".
+    """
+    inputs = _full_rewrite_inputs(feedback, full_resume_text)
+    prompt_tokens = _prompt_tokens(rewrite_chain, inputs)
+    output_tokens = int(estimate_tokens(full_resume_text) * REWRITE_EXPANSION)
+    fits = prompt_tokens <= max_prompt_tokens and output_tokens <= max_output_tokens
+    return {
+        "mode": "single" if fits else "map_reduce",
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+    }
+
+
+def _split_line(line, max_tokens):
+    """
+    Split a line longer than `max_tokens` into parts that fit.
+
+    The line is split into sentences, and a sentence that is still too long at
+    the last space that fits, or mid-word if it has no space.
+    """
+    max_chars = max(max_tokens * 4 - 4, 1)
+    parts = []
+    for sentence in _SENTENCE_END.split(line):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 1, max_chars + 1)
+            if cut <= 0:
+                cut = max_chars
+            parts.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if sentence:
+            parts.append(sentence)
+    return parts
+
+
+def _split_to_budget(content, max_tokens):
+    """
+    Split section content into pieces of at most `max_tokens`.
+
+    Pieces end at line boundaries where possible; a line that alone exceeds
+    the budget, as in text extracted without line breaks, is split at
+    sentences or spaces.
+    """
+    pieces = []
+    current = []  # (separator, text) of the parts in the current piece
+    current_tokens = 0
+    for line in content.split("\n"):
+        parts = [line]
+        if estimate_tokens(line) + 1 > max_tokens:
+            parts = _split_line(line, max_tokens)
+        for i, part in enumerate(parts):
+            part_tokens = estimate_tokens(part) + 1
+            if current and current_tokens + part_tokens > max_tokens:
+                pieces.append(_join_parts(current))
+                current, current_tokens = [], 0
+            current.append(("\n" if i == 0 else " ", part))
+            current_tokens += part_tokens
+    if current:
+        pieces.append(_join_parts(current))
+    return pieces
+
+
+def _join_parts(parts):
+    """Join (separator, text) parts, dropping the separator of the first one."""
+    return parts[0][1] + "".join(separator + text for separator, text in parts[1:])
+
+
+def _map_reduce_rewrite(
+    feedback,
+    full_resume_text,
+    map_rewrite_chain,
+    max_concurrency,
+    max_output_tokens,
+    section_memo=None,
+):
+    """
+    Rewrite each section (or piece of a long section) separately and stitch the results.
+
+    A resume without recognised section headers is split into pieces as a
+    whole and rewritten with the feedback of all sections. Pieces whose text
+    and feedback did not change since the previous run reuse that run's
+    rewrite from `section_memo`.
+    """
+    matches = list(_section_matches(full_resume_text, None))
+    preamble = full_resume_text[: matches[0][1]].strip() if matches else ""
+    sections = resume_sections(full_resume_text) or [("", full_resume_text.strip())]
+
+    # Each call rewrites one piece that fits the output budget
+    piece_budget = max(int(max_output_tokens / REWRITE_EXPANSION), 1)
+    units = []
+    for title, content in sections:
+        section_feedback = (
+            feedback.get(title, "") if title else _feedback_text(feedback)
+        )
+        for piece in _split_to_budget(content, piece_budget):
+            units.append(
+                (
+                    title,
+                    {
+                        "section_title": title or "Resume",
+                        "resume_section": piece,
+                        "guide_section": section_feedback,
+                    },
+                )
+            )
+
+    previous = section_memo.get("rewrites", {}) if section_memo is not None else {}
+    keys = [
+        _digest(
+            inputs["section_title"], inputs["resume_section"], inputs["guide_section"]
+        )
+        for _, inputs in units
+    ]
+    missing = [i for i, key in enumerate(keys) if key not in previous]
+    current_span().set(pieces_reused=len(units) - len(missing))
+    fresh = run_chain_calls(
+        [(map_rewrite_chain, units[i][1]) for i in missing], max_concurrency
+    )
+    rewrites = {key: previous[key] for key in keys if key in previous}
+    rewrites.update((keys[i], response) for i, response in zip(missing, fresh))
+    if section_memo is not None:
+        section_memo["rewrites"] = rewrites
+    responses = [rewrites[key] for key in keys]
+
+    # Stitch without another LLM call: the original contact block, then every
+    # rewritten section under its heading, in the original order
+    stitched = {}
+    for (title, _), response in zip(units, responses):
+        response = response.strip()
+        stitched.setdefault(title, []).append(
+            clean_rewrite(title, response) if title else response
+        )
+    parts = [preamble] if preamble else []
+    parts.extend(
+        f"### {title}\n" + "\n".join(pieces) if title else "\n".join(pieces)
+        for title, pieces in stitched.items()
+    )
+    return "\n\n".join(parts)
+
+
+def process_full_resume(
+    feedback,
+    full_resume_text,
+    rewrite_chain,
+    max_concurrency=1,
+    max_output_tokens=FULL_REWRITE_MAX_OUTPUT_TOKENS,
+    max_prompt_tokens=MAX_PROMPT_TOKENS,
+    section_memo=None,
+    map_rewrite_chain=None,
+):
     """
     Generate a rewritten full resume based on feedback from all sections.
 
+    Resumes whose rewrite would not fit the token budget are rewritten
+    section by section in parallel and stitched together (see `plan_full_rewrite`).
+
     Args:
         feedback (dict): Feedback from the LLM for each section.
         full_resume_text (str): The original resume text.
         rewrite_chain: The LLM chain for rewriting the full resume.
+        max_concurrency (int): Maximum number of LLM calls in flight in map-reduce mode.
+        max_output_tokens (int): The output token limit of the full-rewrite LLM.
+        max_prompt_tokens (int): The prompt token budget of a single call.
+        section_memo (dict, optional): Results of the user's previous run,
+            updated in place. In map-reduce mode unchanged sections reuse
+            their rewrite; a single-call rewrite always covers the whole resume.
+        map_rewrite_chain (optional): The LLM chain that rewrites one section
+            from its feedback in map-reduce mode; defaults to `rewrite_chain`.
 
     Returns:
         str: The rewritten full resume based on the feedback.
     """
-    # Combine all feedback into a single string
-    feedback_text = "\n\n".join(
-        [f"{section}:\n{content}" for section, content in feedback.items()]
+    plan = plan_full_rewrite(
+        feedback, full_resume_text, rewrite_chain, max_output_tokens, max_prompt_tokens
     )
+    current_span().set(rewrite_mode=plan["mode"])
+    if plan["mode"] == "map_reduce":
+        return _map_reduce_rewrite(
+            feedback,
+            full_resume_text,
+            map_rewrite_chain or rewrite_chain,
+            max_concurrency,
+            max_output_tokens,
+            section_memo,
+        )
 
     # Rewrite the full resume based on the feedback
-    rewrite_response = rewrite_chain.run(
-        {
-            "resume_section": full_resume_text,
-            "guide_section": feedback_text,  # The feedback is used as guidelines for the full rewrite
-        }
+    rewrite_response = run_chain(
+        rewrite_chain, _full_rewrite_inputs(feedback, full_resume_text)
     )
 
     return rewrite_response
 
 
+def stream_full_resume(
+    feedback,
+    full_resume_text,
+    rewrite_chain,
+    max_concurrency=1,
+    max_output_tokens=FULL_REWRITE_MAX_OUTPUT_TOKENS,
+    max_prompt_tokens=MAX_PROMPT_TOKENS,
+    section_memo=None,
+    map_rewrite_chain=None,
+):
+    """
+    Streaming variant of `process_full_resume`.
+
+    In map-reduce mode the stitched resume is yielded in one piece once all
+    sections are rewritten.
+
+    Args:
+        feedback (dict): Feedback from the LLM for each section.
+        full_resume_text (str): The original resume text.
+        rewrite_chain: The LLM chain for rewriting the full resume.
+        max_concurrency (int): Maximum number of LLM calls in flight in map-reduce mode.
+        max_output_tokens (int): The output token limit of the full-rewrite LLM.
+        max_prompt_tokens (int): The prompt token budget of a single call.
+        section_memo (dict, optional): Results of the user's previous run, updated in place.
+        map_rewrite_chain (optional): The LLM chain that rewrites one section
+            from its feedback in map-reduce mode; defaults to `rewrite_chain`.
+
+    Yields:
+        str: The next piece of the rewritten resume as it is generated.
+    """
+    plan = plan_full_rewrite(
+        feedback, full_resume_text, rewrite_chain, max_output_tokens, max_prompt_tokens
+    )
+    current_span().set(rewrite_mode=plan["mode"])
+    if plan["mode"] == "map_reduce":
+        yield _map_reduce_rewrite(
+            feedback,
+            full_resume_text,
+            map_rewrite_chain or rewrite_chain,
+            max_concurrency,
+            max_output_tokens,
+            section_memo,
+        )
+        return
+
+    yield from stream_chain(
+        rewrite_chain, _full_rewrite_inputs(feedback, full_resume_text)
+    )
+
+
 if __name__ == "__main__":
     pass
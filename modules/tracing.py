@@ -0,0 +1,256 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Tracing is off unless AI_RESUME_TRACING=1; spans then cost a single flag check.
+_enabled = os.environ.get("AI_RESUME_TRACING") == "1"
+
+# Span attributes that count work and are totalled in the request summary.
+# Other numeric attributes, such as pages, workers or chunks, describe a
+# single span and would be meaningless when added up across spans.
+COUNTER_ATTRIBUTES = frozenset(
+    {
+        "prompt_tokens",
+        "completion_tokens",
+        "retries",
+        "rate_limit_wait_ms",
+        "retrieval_memo_hits",
+        "sections_reused",
+        "sections_changed",
+        "pieces_reused",
+        "chars_removed",
+        "tokens_removed",
+    }
+)
+COUNTER_SUFFIXES = ("_tokens_removed",)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    """The span handed out while tracing is disabled; every operation does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, name, amount=1):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed stage of a request with free-form attributes such as token counts and cache hits."""
+
+    __slots__ = (
+        "trace",
+        "name",
+        "span_id",
+        "parent_id",
+        "start",
+        "duration_ms",
+        "attributes",
+        "_token",
+    )
+
+    def __init__(self, trace, name, parent_id, attributes):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:8]
+        self.parent_id = parent_id
+        self.start = None
+        self.duration_ms = None
+        self.attributes = attributes
+        self._token = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        self.trace._finish(self)
+        return False
+
+    def set(self, **attributes):
+        """Set attributes on the span."""
+        self.attributes.update(attributes)
+
+    def add(self, name, amount=1):
+        """Add to a numeric attribute, e.g. a retry or cache-hit counter."""
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "offset_ms": round((self.start - self.trace.start) * 1000, 3),
+            "duration_ms": round(self.duration_ms, 3),
+            **self.attributes,
+        }
+
+
+class Trace:
+    """The spans recorded for one request."""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000
+        _current_trace.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        logger.info(json.dumps(self.summary(), default=str))
+        return False
+
+    def _finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+        logger.info(json.dumps(span.to_dict(), default=str))
+
+    def summary(self):
+        """
+        Return the request-level record.
+
+        Returns:
+            dict: The total time, the totals of the counter attributes of all
+                spans (see `COUNTER_ATTRIBUTES`), and the number of spans that
+                were answered from a cache ("cache_hits") or not ("cache_misses").
+        """
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            for name, value in span.attributes.items():
+                if name == "cache_hit":
+                    name = "cache_hits" if value else "cache_misses"
+                    totals[name] = totals.get(name, 0) + 1
+                elif (
+                    name in COUNTER_ATTRIBUTES or name.endswith(COUNTER_SUFFIXES)
+                ) and isinstance(value, (int, float)):
+                    totals[name] = totals.get(name, 0) + value
+        return {
+            "trace_id": self.trace_id,
+            "trace": self.name,
+            "duration_ms": round(self.duration_ms or 0.0, 3),
+            "spans": len(spans),
+            **self.attributes,
+            **totals,
+        }
+
+    def rows(self):
+        """Return the finished spans as dicts, in start order."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return [span.to_dict() for span in spans]
+
+
+def tracing_enabled():
+    """Return whether spans are being recorded."""
+    return _enabled
+
+
+def set_tracing_enabled(enabled):
+    """Switch tracing on or off for the whole process."""
+    global _enabled
+    _enabled = bool(enabled)
+    if _enabled and not logger.handlers and not logging.getLogger().handlers:
+        # Make the JSON records visible when the application configured no logging
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+
+
+def start_trace(name, **attributes):
+    """
+    Start recording the spans of one request.
+
+    Use as a context manager; on exit a summary record is logged. While
+    tracing is disabled the no-op span is returned instead.
+
+    Args:
+        name (str): The request name, e.g. "rewrite_resume".
+        **attributes: Attributes of the request.
+
+    Returns:
+        Trace or the no-op span.
+    """
+    if not _enabled:
+        return NOOP_SPAN
+    return Trace(name, attributes)
+
+
+def span(name, **attributes):
+    """
+    Time a stage of the current request.
+
+    Use as a context manager. Outside of a trace, or while tracing is
+    disabled, the shared no-op span is returned.
+
+    Args:
+        name (str): The stage name, e.g. "stage.feedback" or "llm.call".
+        **attributes: Attributes recorded with the span.
+
+    Returns:
+        Span or the no-op span.
+    """
+    if not _enabled:
+        return NOOP_SPAN
+    trace = _current_trace.get()
+    if trace is None:
+        return NOOP_SPAN
+    parent = _current_span.get()
+    return Span(trace, name, parent.span_id if parent else None, attributes)
+
+
+def current_span():
+    """Return the innermost active span, or the no-op span."""
+    if not _enabled:
+        return NOOP_SPAN
+    return _current_span.get() or NOOP_SPAN
+
+
+if _enabled:
+    set_tracing_enabled(True)
+
+
+if __name__ == "__main__":
+    pass
@@ -40,3 +40,52 @@ def display_rewritten_resume(full_resume):
     st.header("✨ Full Rewritten Resume (Markdown format)", divider="red")
     st.markdown(full_resume)
     st.divider()  # Add a divider at the end
+
+
+def display_timing_panel(summary, rows):
+    """
+    Display the timings of the last request in the sidebar.
+
+    Args:
+        summary (dict): The request-level record from `Trace.summary`.
+        rows (list): The span records from `Trace.rows`.
+    """
+    with st.expander("⏱ Timings of the last rewrite"):
+        st.metric("Total", f"{summary['duration_ms'] / 1000:.2f} s")
+        st.caption(
+            f"Prompt tokens: {summary.get('prompt_tokens', 0)} · "
+            f"Completion tokens: {summary.get('completion_tokens', 0)} · "
+            f"Retries: {summary.get('retries', 0)} · "
+            f"Cache hits: {summary.get('cache_hits', 0)}"
+        )
+        st.dataframe(
+            [
+                {
+                    "span": row["span"],
+                    "ms": row["duration_ms"],
+                    "tokens in": row.get("prompt_tokens"),
+                    "tokens out": row.get("completion_tokens"),
+                    "cache hit": row.get("cache_hit"),
+                    "queued ms": row.get("rate_limit_wait_ms"),
+                }
+                for row in rows
+            ],
+            hide_index=True,
+        )
+
+
+def display_job_progress(job):
+    """
+    Display the progress of a background rewrite job.
+
+    Args:
+        job (dict): The job snapshot from `JobManager.get`.
+    """
+    icons = {"pending": "⏳", "running": "🔄", "done": "✅"}
+    st.subheader("⚙️ Rewriting your resume...")
+    for stage, status in job["stages"].items():
+        st.write(f"{icons.get(status, '•')} {stage.replace('_', ' ').capitalize()}")
+    if job["partial"]:
+        st.divider()
+        st.header("✨ Full Rewritten Resume (Markdown format)", divider="red")
+        st.markdown(job["partial"])
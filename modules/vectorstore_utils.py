@@ -1,14 +1,59 @@
-import faiss
-from langchain.embeddings import HuggingFaceEmbeddings
-import numpy as np
-from langchain_community.docstore import InMemoryDocstore
-from langchain_community.vectorstores import FAISS as FAISS_LangChain
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+# faiss, numpy and LangChain are imported on first use, so importing this
+# module (and starting the app) does not pay for them.
+from modules.embeddings import (
+    DEFAULT_EMBEDDING_MODEL,
+    embedding_model_spec,
+    get_embeddings,
+    split_model_spec,
+)
+from modules.tracing import current_span, span
+
+DEFAULT_INDEX_CACHE_DIR = os.path.join(".cache", "vectorstore")
+
+# Index type picked by `choose_index_type`: exact search up to FLAT_MAX_CHUNKS
+# vectors, an HNSW graph up to HNSW_MAX_CHUNKS and an inverted file beyond.
+FLAT_MAX_CHUNKS = 2_000
+HNSW_MAX_CHUNKS = 50_000
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 64
+IVF_NPROBE = 32
+
+# Filters that select at most this many vectors are searched exactly over
+# just those vectors, so the cost depends on the size of the selection and
+# approximate indexes cannot miss matches hidden behind filtered-out ones.
+EXACT_FILTER_MAX = 4_096
+
+# Per vector store memo of (query, k, filter) -> documents, dropped with the
+# store. Each store keeps its most recently used SEARCH_MEMO_MAX_ENTRIES.
+SEARCH_MEMO_MAX_ENTRIES = 4_096
+_search_memo = weakref.WeakKeyDictionary()
+_search_memo_lock = threading.Lock()
+
+# Vector stores loaded or built by this process, by index directory, so that
+# all requests share one instance and its search memo. Only the most
+# recently used MAX_LOADED_STORES are kept.
+MAX_LOADED_STORES = 4
+_loaded_stores = OrderedDict()
+_loaded_stores_lock = threading.Lock()
+_store_locks = {}
+
+# Per vector store memo of filter -> `_FilterSelection`, dropped with the store.
+_filter_selections = weakref.WeakKeyDictionary()
 
 
 def split_text(text, chunk_size=500, chunk_overlap=50):
     """Split text into chunks for vectorization."""
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size, chunk_overlap=chunk_overlap
     )
@@ -16,23 +61,122 @@ def split_text(text, chunk_size=500, chunk_overlap=50):
     return chunks
 
 
-def create_vector_store(chunks):
-    """Create a FAISS vector store from text chunks."""
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+def with_backend(model_name, backend=None):
+    """
+    Return the model spec for running `model_name` on an embedding backend.
+
+    Args:
+        model_name (str): The embedding model name or spec.
+        backend (str, optional): "torch", "int8" or "onnx"; None keeps the
+            backend of `model_name`, i.e. EMBEDDING_BACKEND for the default.
+
+    Returns:
+        str: The model spec to pass to `get_embeddings`.
+    """
+    if backend is None:
+        return model_name
+    return embedding_model_spec(split_model_spec(model_name)[0], backend)
+
+
+def choose_index_type(num_vectors):
+    """Return "flat", "hnsw" or "ivf": the FAISS index type for a corpus of this size."""
+    if num_vectors <= FLAT_MAX_CHUNKS:
+        return "flat"
+    if num_vectors <= HNSW_MAX_CHUNKS:
+        return "hnsw"
+    return "ivf"
+
+
+def build_index(vectors, index_type="auto"):
+    """
+    Build a FAISS L2 index over the vectors.
+
+    Args:
+        vectors (numpy.ndarray): float32 vectors, one row per chunk.
+        index_type (str): "flat", "hnsw", "ivf" or "auto" to pick by the number of vectors.
+
+    Returns:
+        faiss.Index: The index, with row i of `vectors` stored under id i.
+    """
+    import faiss
+
+    num_vectors, dimension = vectors.shape
+    if index_type == "auto":
+        index_type = choose_index_type(num_vectors)
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif index_type == "ivf":
+        # About 4 * sqrt(n) lists, each trained with at least 39 vectors
+        nlist = max(1, min(int(4 * num_vectors**0.5), num_vectors // 39))
+        index = faiss.index_factory(dimension, f"IVF{nlist},Flat")
+        index.train(vectors)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    index.add(vectors)
+    tune_index(index)
+    return index
+
+
+def tune_index(index):
+    """Set the search-time parameters of an index, e.g. after loading it from disk."""
+    import faiss
+
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = IVF_NPROBE
+        # Exact filtered search reconstructs vectors by id
+        ivf.make_direct_map()
+
+
+def create_vector_store(
+    chunks,
+    model_name=DEFAULT_EMBEDDING_MODEL,
+    backend=None,
+    metadatas=None,
+    index_type="auto",
+):
+    """
+    Create a FAISS vector store from text chunks.
+
+    Args:
+        chunks (list): The chunk texts.
+        model_name (str): The embedding model name.
+        backend (str, optional): The embedding backend, see `with_backend`.
+        metadatas (list, optional): One metadata dict per chunk, used by the
+            `filter` of `batch_similarity_search`.
+        index_type (str): "flat", "hnsw", "ivf" or "auto", see `build_index`.
+
+    Returns:
+        FAISS: The LangChain FAISS vector store.
+    """
+    import numpy as np
+    from langchain_community.docstore import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS as FAISS_LangChain
+    from langchain_core.documents import Document
+
+    embeddings = get_embeddings(with_backend(model_name, backend))
 
     # Create embeddings for all chunks
     chunk_embeddings = embeddings.embed_documents(chunks)
-    dimension = len(chunk_embeddings[0])
 
     # Initialize FAISS index
-    index = faiss.IndexFlatL2(dimension)
-    index.add(np.array(chunk_embeddings))
+    index = build_index(np.array(chunk_embeddings, dtype="float32"), index_type)
+    current_span().set(index_type=type(index).__name__)
 
     # Create a docstore to store the chunks
+    metadatas = metadatas or [{} for _ in chunks]
     docstore = InMemoryDocstore(
-        {i: Document(page_content=chunk) for i, chunk in enumerate(chunks)}
+        {
+            i: Document(page_content=chunk, metadata=metadata)
+            for i, (chunk, metadata) in enumerate(zip(chunks, metadatas))
+        }
     )
 
     # Map index to docstore IDs
@@ -49,5 +193,299 @@ def create_vector_store(chunks):
     return vector_store
 
 
+def vector_store_cache_key(
+    text, chunk_size=500, chunk_overlap=50, model_name=DEFAULT_EMBEDDING_MODEL
+):
+    """
+    Build the cache key for a persisted vector store.
+
+    Args:
+        text (str): The source text that gets chunked and embedded.
+        chunk_size (int): Chunk size passed to the splitter.
+        chunk_overlap (int): Chunk overlap passed to the splitter.
+        model_name (str): The embedding model name.
+
+    Returns:
+        str: A hex digest that changes whenever any of the inputs change.
+    """
+    digest = hashlib.sha256()
+    for part in (text, str(chunk_size), str(chunk_overlap), model_name):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_or_create_vector_store(
+    text,
+    chunk_size=500,
+    chunk_overlap=50,
+    model_name=DEFAULT_EMBEDDING_MODEL,
+    cache_dir=DEFAULT_INDEX_CACHE_DIR,
+    backend=None,
+):
+    """
+    Load a FAISS vector store for the text from disk, building and saving it on a miss.
+
+    The index, docstore and id map are stored under a directory named after
+    `vector_store_cache_key`, so editing the text, the chunk parameters, the
+    embedding model or its backend results in a rebuild.
+
+    Args:
+        text (str): The source text, e.g. the Harvard resume guide.
+        chunk_size (int): Chunk size passed to `split_text`.
+        chunk_overlap (int): Chunk overlap passed to `split_text`.
+        model_name (str): The embedding model name.
+        cache_dir (str): The directory that holds the persisted indexes.
+        backend (str, optional): The embedding backend, see `with_backend`.
+
+    Returns:
+        FAISS: The LangChain FAISS vector store.
+    """
+    model_name = with_backend(model_name, backend)
+    key = vector_store_cache_key(text, chunk_size, chunk_overlap, model_name)
+
+    def build():
+        chunks = split_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        return create_vector_store(chunks, model_name=model_name), len(chunks)
+
+    return load_or_build_vector_store(key, build, model_name, cache_dir)
+
+
+def load_or_build_vector_store(
+    key, build, model_name, cache_dir=DEFAULT_INDEX_CACHE_DIR
+):
+    """
+    Load the vector store persisted under a cache key, or build and persist it.
+
+    The store is loaded once per process: later calls with the same key
+    return the same instance, so searches memoized for one request are
+    reused by the next. Concurrent callers wait for the load in progress.
+
+    Args:
+        key (str): The cache key, e.g. from `vector_store_cache_key`.
+        build (callable): Returns (vector store, number of chunks) on a miss.
+        model_name (str): The embedding model spec the store was built with.
+        cache_dir (str): The directory that holds the persisted indexes.
+
+    Returns:
+        FAISS: The LangChain FAISS vector store.
+    """
+    index_dir = os.path.join(cache_dir, key)
+
+    with _loaded_stores_lock:
+        lock = _store_locks.setdefault(index_dir, threading.Lock())
+    with lock:
+        with _loaded_stores_lock:
+            vector_store = _loaded_stores.get(index_dir)
+            if vector_store is not None:
+                _loaded_stores.move_to_end(index_dir)
+                return vector_store
+
+        vector_store = _load_or_build(index_dir, build, model_name, cache_dir)
+
+        with _loaded_stores_lock:
+            _loaded_stores[index_dir] = vector_store
+            while len(_loaded_stores) > MAX_LOADED_STORES:
+                _loaded_stores.popitem(last=False)
+        return vector_store
+
+
+def _load_or_build(index_dir, build, model_name, cache_dir):
+    """Load the vector store in `index_dir`, or build it and save it there."""
+    if os.path.isdir(index_dir):
+        from langchain_community.vectorstores import FAISS as FAISS_LangChain
+
+        embeddings = get_embeddings(model_name)
+        with span("vector_store.load", cache_hit=True):
+            vector_store = FAISS_LangChain.load_local(
+                index_dir, embeddings, allow_dangerous_deserialization=True
+            )
+            tune_index(vector_store.index)
+            return vector_store
+
+    with span("vector_store.build", cache_hit=False) as build_span:
+        vector_store, num_chunks = build()
+        build_span.set(chunks=num_chunks)
+
+    # Write into a temporary directory first so a concurrent reader never sees
+    # a half-written index, then move it into place.
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir)
+    try:
+        vector_store.save_local(tmp_dir)
+        os.replace(tmp_dir, index_dir)
+    except OSError:
+        # Another process won the race; its index is just as good as ours.
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return vector_store
+
+
+def clear_search_memo(vector_store=None):
+    """Forget memoized search results for one vector store, or for all of them."""
+    with _search_memo_lock:
+        if vector_store is None:
+            _search_memo.clear()
+        else:
+            _search_memo.pop(vector_store, None)
+
+
+def _filter_key(filter):
+    """Return a hashable form of a metadata filter, or None for no filter."""
+    if not filter:
+        return None
+    return tuple(
+        sorted(
+            (field, tuple(sorted(map(str, _allowed_values(value)))))
+            for field, value in filter.items()
+        )
+    )
+
+
+def _allowed_values(value):
+    return value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+
+class _FilterSelection:
+    """
+    The documents of a vector store that match a metadata filter, prepared for searching.
+
+    Small selections keep a copy of their vectors and are searched exactly;
+    larger ones keep a bitmap of their ids that restricts the index search.
+    """
+
+    def __init__(self, vector_store, filter):
+        import numpy as np
+
+        allowed = {
+            field: set(_allowed_values(value)) for field, value in filter.items()
+        }
+        ids = []
+        for i, docstore_id in vector_store.index_to_docstore_id.items():
+            metadata = vector_store.docstore.search(docstore_id).metadata
+            if all(metadata.get(field) in values for field, values in allowed.items()):
+                ids.append(i)
+        self.ids = np.array(sorted(ids), dtype="int64")
+
+        index = vector_store.index
+        self.ntotal = index.ntotal
+        self.vectors = None
+        self.bitmap = None
+        if 0 < len(self.ids) <= EXACT_FILTER_MAX:
+            self.vectors = index.reconstruct_batch(self.ids)
+        elif len(self.ids) > EXACT_FILTER_MAX:
+            mask = np.zeros(self.ntotal, dtype=bool)
+            mask[self.ids] = True
+            self.bitmap = np.packbits(mask, bitorder="little")
+
+    def search(self, index, query_embeddings, k):
+        """Return the index ids of the top k selected documents per query, -1 padded."""
+        import faiss
+        import numpy as np
+
+        if len(self.ids) == 0:
+            return np.full((len(query_embeddings), k), -1, dtype="int64")
+
+        if self.vectors is not None:
+            _, positions = faiss.knn(
+                query_embeddings, self.vectors, min(k, len(self.ids))
+            )
+            return self.ids[positions]
+
+        selector = faiss.IDSelectorBitmap(self.ntotal, faiss.swig_ptr(self.bitmap))
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+        elif isinstance(index, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(
+                sel=selector, efSearch=max(index.hnsw.efSearch, k)
+            )
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        _, indices = index.search(query_embeddings, k, params=params)
+        return indices
+
+
+def _filter_selection(vector_store, filter):
+    """Return the memoized `_FilterSelection` of a filter on a vector store."""
+    key = _filter_key(filter)
+    with _search_memo_lock:
+        selection = _filter_selections.setdefault(vector_store, {}).get(key)
+    if selection is None:
+        # Built outside the lock; concurrent builds of the same selection agree
+        selection = _FilterSelection(vector_store, filter)
+        with _search_memo_lock:
+            _filter_selections[vector_store][key] = selection
+    return selection
+
+
+def batch_similarity_search(vector_store, queries, k=4, filter=None):
+    """
+    Run several similarity searches with one embedding call and one FAISS search.
+
+    Results are memoized per vector store, query and filter, so repeated
+    queries cost nothing; each store keeps its `SEARCH_MEMO_MAX_ENTRIES` most
+    recently used results. The memo assumes the store is not modified after
+    it is built.
+
+    Args:
+        vector_store (FAISS): The LangChain FAISS vector store.
+        queries (list): The query strings.
+        k (int): Number of documents to return per query.
+        filter (dict, optional): Metadata field -> allowed value or list of
+            values. Only documents matching every field are searched, e.g.
+            {"guide": "harvard_resume_guide"}.
+
+    Returns:
+        list: One list of Documents per query, in the order of `queries`.
+
+    Raises:
+        ValueError: If `filter` matches no document of the store.
+    """
+    filter_key = _filter_key(filter)
+    results = {}
+    with _search_memo_lock:
+        memo = _search_memo.setdefault(vector_store, OrderedDict())
+        for query in queries:
+            key = (query, k, filter_key)
+            if key in memo:
+                memo.move_to_end(key)
+                results[query] = memo[key]
+        missing = [query for query in dict.fromkeys(queries) if query not in results]
+
+    current_span().add("retrieval_memo_hits", len(results))
+    if missing:
+        import faiss
+        import numpy as np
+
+        query_embeddings = np.array(
+            vector_store.embedding_function.embed_documents(missing), dtype="float32"
+        )
+        if getattr(vector_store, "_normalize_L2", False):
+            faiss.normalize_L2(query_embeddings)
+
+        if filter_key is None:
+            _, indices = vector_store.index.search(query_embeddings, k)
+        else:
+            selection = _filter_selection(vector_store, filter)
+            if len(selection.ids) == 0:
+                raise ValueError(f"No documents match the filter {filter!r}.")
+            indices = selection.search(vector_store.index, query_embeddings, k)
+
+        for query, row in zip(missing, indices):
+            results[query] = [
+                vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+                for i in row
+                if i != -1
+            ]
+        with _search_memo_lock:
+            for query in missing:
+                memo[(query, k, filter_key)] = results[query]
+            while len(memo) > SEARCH_MEMO_MAX_ENTRIES:
+                memo.popitem(last=False)
+
+    return [results[query] for query in queries]
+
+
 if __name__ == "__main__":
     pass